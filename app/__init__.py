@@ -1,21 +1,46 @@
 from flask import Flask
 from flask_graphql import GraphQLView
 
+from jamdb.globals import DB_FILE
 from jamdb.graphene import GrapheneSQLSession
 
+from .instrumentation import graphql_middleware, init_metrics, init_profiling, init_sql_stats
 
-def init_app(config_filename=None):
+
+def init_app(config_filename=None, db_file=None):
+    # `db_file` (or `DB_FILE` in the config file) points the app at another DB, e.g., a synthetic one
     app = Flask(__name__, instance_relative_config=True)
+    app.config["DB_FILE"] = DB_FILE
+    # Set `OBJECT_GRAPH = True` to serve queries from an in-memory copy of the DB, see
+    # `jamdb.object_graph`, instead of through SQLAlchemy
+    app.config["OBJECT_GRAPH"] = False
+    # Serve the detail pages from the documents built at ingest, see `jamdb.documents`, if there
+    # are any.  Set `ENTITY_DOCS = False` to always build them per request.
+    app.config["ENTITY_DOCS"] = True
     if config_filename is not None:
         app.config.from_pyfile(config_filename)
+    if db_file is not None:
+        app.config["DB_FILE"] = db_file
+    init_profiling(app)
+    init_sql_stats(app)
+    init_metrics(app)
 
-    graphene_session = GrapheneSQLSession.from_sqlite_file()
+    graphene_session = GrapheneSQLSession.from_sqlite_file(
+        app.config["DB_FILE"], middleware=graphql_middleware(app),
+        object_graph=app.config["OBJECT_GRAPH"]
+    )
+    if graphene_session.graph_store is not None:
+        # load the graph now, rather than on the first request, and share it with the routes
+        graphene_session.graph_store.current()
+        app.extensions["jamdb_object_graph"] = graphene_session.graph_store
+        app.extensions["jamdb_graphene_sessions"] = {str(app.config["DB_FILE"]): graphene_session}
     
     graphql_view = GraphQLView.as_view(
         "graphql",
         schema=graphene_session.schema,
         graphiql=True,
-        get_context=lambda: {'session': graphene_session.session}
+        middleware=graphql_middleware(app),
+        get_context=graphene_session.context
     )
     app.add_url_rule("/graphql", view_func=graphql_view, methods=["GET", "POST", "PUT", "DELETE"])
     
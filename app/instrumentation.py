@@ -0,0 +1,216 @@
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from flask import Response, g, request
+from graphql.execution.middleware import MiddlewareManager
+
+from jamdb.metrics import MetricsRegistry, ResolverTimingMiddleware
+from jamdb.profiling import DEFAULT_INTERVAL, SamplingProfiler
+from jamdb.sqlstats import start_sql_tracking, stop_sql_tracking
+
+# Requests with this header get their SQL stats in the response:  under `extensions` for GraphQL,
+# in a `Server-Timing` header otherwise.
+SQL_STATS_HEADER = "X-Debug-SQL"
+# Requests running more statements than this are logged as warnings, they are likely an N+1
+SQL_STATS_WARN_STATEMENTS = 200
+# With `PROFILING = True` in the app config, requests with this header are profiled
+PROFILE_HEADER = "X-Profile"
+
+
+def _header_set(header):
+    return request.headers.get(header, "").lower() not in ("", "0", "false")
+
+
+def _add_server_timing(response, **durations):
+    # durations in seconds
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    if response.headers.get("Server-Timing"):
+        timings.insert(0, response.headers["Server-Timing"])
+    response.headers["Server-Timing"] = ", ".join(timings)
+
+
+def _add_graphql_extensions(response, stats):
+    if response.mimetype != "application/json":
+        return
+    body = json.loads(response.get_data())
+    if not isinstance(body, dict):
+        # batched queries share one set of stats, so there is nowhere sensible to put them
+        return
+    body.setdefault("extensions", {})["sql"] = stats.to_dict()
+    response.set_data(json.dumps(body))
+
+
+def init_sql_stats(app):
+    """
+    Count the statements, DB time, rows fetched and duplicate statements of every request.
+
+    The stats are logged for each request, and returned to the client when it sends the
+    `SQL_STATS_HEADER` header.  Set `SQL_STATS = False` in the app config to turn this off.
+    """
+    app.config.setdefault("SQL_STATS", True)
+    app.config.setdefault("SQL_STATS_WARN_STATEMENTS", SQL_STATS_WARN_STATEMENTS)
+
+    @app.before_request
+    def _start_sql_stats():
+        if app.config["SQL_STATS"]:
+            g.sql_stats, g.sql_stats_token = start_sql_tracking()
+
+    @app.after_request
+    def _report_sql_stats(response):
+        stats = g.get("sql_stats")
+        if stats is None:
+            return response
+
+        message = f"{request.method} {request.full_path.rstrip('?')}:  {stats.summary()}"
+        if stats.statements > app.config["SQL_STATS_WARN_STATEMENTS"]:
+            top = stats.top_statements(1)
+            if top:
+                message += f", most repeated ({top[0]['count']}x):  {top[0]['statement']}"
+            app.logger.warning(message)
+        else:
+            app.logger.info(message)
+
+        if _header_set(SQL_STATS_HEADER):
+            if request.endpoint == "graphql":
+                _add_graphql_extensions(response, stats)
+            else:
+                _add_server_timing(response, db=stats.db_time)
+        return response
+
+    @app.teardown_request
+    def _stop_sql_stats(exc):
+        token = g.pop("sql_stats_token", None)
+        if token is not None:
+            stop_sql_tracking(token)
+
+    return app
+
+
+def _cache_stats(app):
+    # caches kept in `app.extensions` report their own hits and misses
+    return {
+        name.removeprefix("jamdb_"): ext.cache_stats()
+        for name, ext in list(app.extensions.items())
+        if hasattr(ext, "cache_stats")
+    }
+
+
+def graphql_middleware(app):
+    # graphene middleware for the app's GraphQL queries, see `init_metrics`
+    return app.extensions.get("jamdb_graphql_middleware")
+
+
+def init_metrics(app):
+    """
+    Serve Prometheus metrics on `/metrics`:  the latency of each route, the time spent in each
+    GraphQL resolver (i.e., in each `Type.field`), and the hit ratios of the app's caches.
+
+    Set `METRICS = False` in the app config to turn this off, or `RESOLVER_METRICS = False` to
+    keep the metrics, but not time the resolvers.
+    """
+    app.config.setdefault("METRICS", True)
+    app.config.setdefault("RESOLVER_METRICS", True)
+    if not app.config["METRICS"]:
+        return app
+
+    registry = MetricsRegistry()
+    app.extensions["jamdb_metrics"] = registry
+    if app.config["RESOLVER_METRICS"]:
+        # by default, every resolver's result is wrapped in a promise, which doubles the time of
+        # big queries.  Our resolvers are all synchronous, so there is no need.
+        app.extensions["jamdb_graphql_middleware"] = MiddlewareManager(
+            ResolverTimingMiddleware(registry), wrap_in_promise=False
+        )
+
+    request_seconds = registry.histogram(
+        "jamdb_request_seconds", "Time to handle each request", ["endpoint", "method", "status"]
+    )
+    registry.collected(
+        "jamdb_cache_requests_total", "Cache lookups, by result", "counter", ["cache", "result"],
+        lambda: {
+            (name, result): count
+            for name, stats in _cache_stats(app).items() for result, count in stats.items()
+        }
+    )
+    registry.collected(
+        "jamdb_cache_hit_ratio", "Fraction of cache lookups that were hits", "gauge", ["cache"],
+        lambda: {
+            (name,): stats["hits"] / max(stats["hits"] + stats["misses"], 1)
+            for name, stats in _cache_stats(app).items()
+        }
+    )
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request_time(response):
+        start = g.get("request_start")
+        if start is not None:
+            request_seconds.observe(
+                time.perf_counter() - start,
+                str(request.endpoint), request.method, str(response.status_code)
+            )
+        return response
+
+    def metrics():
+        return Response(registry.render(), content_type="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+    return app
+
+
+def init_profiling(app):
+    """
+    Profile the requests sent with the `PROFILE_HEADER` header, when `PROFILING = True` in the app
+    config.  Profiling is off by default, since anyone who can reach the app can send the header.
+
+    Each profile is written to `PROFILE_DIR` (default `<instance path>/profiles`), named by the
+    time, endpoint and wall time of the request, as a speedscope file, collapsed stacks for flame
+    graph tools, and a summary of the time spent in GraphQL parsing, execution, ORM loading,
+    Python post-processing and Jinja rendering.  Those are also returned in a `Server-Timing`
+    header.
+
+    Call it before the other `init_*`, so the profile covers their hooks, too.
+    """
+    app.config.setdefault("PROFILING", False)
+    app.config.setdefault("PROFILE_DIR", Path(app.instance_path) / "profiles")
+    app.config.setdefault("PROFILE_INTERVAL", DEFAULT_INTERVAL)
+
+    @app.before_request
+    def _start_profiler():
+        if app.config["PROFILING"] and _header_set(PROFILE_HEADER):
+            g.profiler = SamplingProfiler(interval=app.config["PROFILE_INTERVAL"]).start()
+
+    @app.after_request
+    def _write_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.stop()
+
+        name = (
+            f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.endpoint}"
+            f"-{profiler.wall_time * 1000:.0f}ms"
+        )
+        summary_file = profiler.write(
+            app.config["PROFILE_DIR"], name,
+            endpoint=request.endpoint, method=request.method, path=request.full_path.rstrip("?"),
+            status=response.status_code
+        )
+        app.logger.info(f"Profile of {request.full_path.rstrip('?')} written to {summary_file}")
+        response.headers["X-Profile"] = name
+        _add_server_timing(response, total=profiler.wall_time, **profiler.phases())
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        # `after_request` is skipped if the request raises, e.g., when exceptions are propagated
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+
+    return app
@@ -0,0 +1,96 @@
+"""
+The GraphQL queries run by the views in `routes.py`, kept here so they can also be run on their
+own, e.g., by the benchmarks.
+"""
+
+# The queries of the detail pages and the nav index, built into documents at ingest
+from jamdb.documents import (  # noqa: F401
+    DETAIL_EVENT_OCC,
+    DETAIL_EVENT_SERIES,
+    DETAIL_PERFORMED_SONG,
+    DETAIL_PLAYER,
+    DETAIL_SONG,
+    DETAIL_VENUE,
+    INDEX,
+)
+
+OVERVIEW_EVENT_OCCS = """
+query {
+  eventOccs {
+    id, name, date, venue { id, venue },
+    songPerforms { id, song { id, song } }
+    players { person { id, publicName } }
+    eventgen { name }
+  }
+}
+"""
+
+OVERVIEW_EVENT_SERIES = """
+query {
+  eventGens {
+    id, name, genre { genre }, time, date, venue { id, venue },
+    person { id, publicName }, eventOccs { id, name }
+  }
+}
+"""
+
+OVERVIEW_PLAYERS = """
+query {
+  persons {
+    id, combinedName, instrumentList,
+    eventsAttended {id, name}, songPerforms {id, song { song } }
+  }
+}
+"""
+
+OVERVIEW_SONGS = """
+query {
+  songs {
+    id, song, key { keyName }, subgenre { subgenreName }
+    songPerforms { id, eventocc { name } }
+  }
+}
+"""
+
+# The ids of all rows of the paged overviews, in page order, in one SQL query, so that only the
+# rows of the page are resolved through GraphQL
+OVERVIEW_PERFORMANCE_VIDEOS_ORDER_SQL = """
+SELECT v.id
+FROM PerformanceVideo v
+    JOIN SongPerform sp ON sp.id = v.song_perform_id
+    JOIN Song s ON s.id = sp.song_id
+    JOIN EventOcc e ON e.id = sp.event_occ_id
+ORDER BY py_lower(s.song), py_lower(e.date), v.rowid
+"""
+
+OVERVIEW_PERFORMANCE_VIDEOS = """
+query getPerformanceVideos ($ids: [ID]) {
+  performanceVideos (ids: $ids) {
+    id, sourceId, link, embeddableLink,
+    songperform {
+      id, song { song }, eventocc { id, name, date },
+      players { person {id, publicName}, instrumentList }
+    }
+  }
+}
+"""
+
+OVERVIEW_PERFORMED_SONGS_ORDER_SQL = """
+SELECT sp.id
+FROM SongPerform sp
+    JOIN Song s ON s.id = sp.song_id
+    JOIN EventOcc e ON e.id = sp.event_occ_id
+ORDER BY py_lower(s.song), py_lower(e.date), sp.rowid
+"""
+
+OVERVIEW_PERFORMED_SONGS = """
+query getSongPerforms ($ids: [ID]) {
+  songPerforms (ids: $ids) {
+    id, songPerformName, song { id, song }, eventocc { id, name, date },
+    players { person {id, publicName}, instrumentList },
+    performanceVideos {
+      id, songPerformId, sourceId, linksource {rank}, link, embeddableLink, displayName
+    }
+  }
+}
+"""
@@ -1,24 +1,91 @@
-from collections import defaultdict
-import base64
+from pathlib import Path
+import sqlalchemy
 from flask import current_app as app
-from flask import Flask, render_template
-
-from jamdb.globals import ME_ID, DATA_DIR, DB_FILE
+from flask import (
+    Flask, abort, make_response, redirect, render_template, request, send_from_directory, url_for
+)
+
+from jamdb.assets import ASSET_MANIFEST_FILE, AssetManifest
+from jamdb.db import DBHandler
+from jamdb.documents import DOC_KINDS, sort_links
+from jamdb.entity_docs import EntityDocStore
+from jamdb.globals import DATA_DIR
 from jamdb.graphene import GrapheneSQLSession
+from jamdb.thumbnails import ThumbnailCache, read_thumbnail_source
 
-REDACT_PRIVATE = True     # this should be an env var
+from . import queries
+from .instrumentation import graphql_middleware
 
-def sort_links(links):
-    links = sorted(links, key=lambda row: row["linksource"]["rank"])
-    return links
+REDACT_PRIVATE = True     # this should be an env var
+# Derived media and fingerprinted assets never change content, so they can be cached forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# A row's thumbnail, or its lack of one, only changes with its link, so browsers can keep it a while
+THUMBNAIL_MAX_AGE = 24 * 60 * 60
+PICTURE_VARIANT = "web"
+# Rows per page of the overview pages that embed players
+PER_PAGE = 25
+MAX_PER_PAGE = 200
+
+
+def paginate(rows):
+    """
+    The rows of the page given by the `page` and `per_page` request args, plus what the pager
+    in `_macros.html` needs.
+    """
+    per_page = min(max(request.args.get("per_page", PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    num_pages = max((len(rows) + per_page - 1) // per_page, 1)
+    page = min(max(request.args.get("page", 1, type=int), 1), num_pages)
+    start = (page - 1) * per_page
+    pager = {
+        "page": page, "per_page": per_page, "num_pages": num_pages, "num_rows": len(rows),
+        "first_row": start + 1, "last_row": min(start + per_page, len(rows))
+    }
+    return rows[start:start + per_page], pager
 
 
 def init_graphene_session():
-    return GrapheneSQLSession.from_sqlite_file(DB_FILE)
+    if not app.config["OBJECT_GRAPH"]:
+        return GrapheneSQLSession.from_sqlite_file(
+            app.config["DB_FILE"], middleware=graphql_middleware(app)
+        )
+    # with the object graph, one session per DB serves all requests, and keeps its graph current
+    sessions = app.extensions.setdefault("jamdb_graphene_sessions", {})
+    db_file = str(app.config["DB_FILE"])
+    if db_file not in sessions:
+        sessions[db_file] = GrapheneSQLSession.from_sqlite_file(
+            db_file, middleware=graphql_middleware(app), object_graph=True
+        )
+        app.extensions["jamdb_object_graph"] = sessions[db_file].graph_store
+    return sessions[db_file]
+
+
+def entity_doc_store():
+    # one per DB, as for the graphene sessions
+    stores = app.extensions.setdefault("jamdb_entity_doc_stores", {})
+    db_file = str(app.config["DB_FILE"])
+    if db_file not in stores:
+        stores[db_file] = EntityDocStore(db_file)
+        app.extensions["jamdb_entity_docs"] = stores[db_file]
+    return stores[db_file]
+
+
+def entity_doc(kind, id_="", graphene_session=None):
+    """
+    The document of `kind`, see `jamdb.documents`, as materialized at ingest, or, if there is none
+    (yet), built now.  404 for entities that do not exist.
+    """
+    doc = entity_doc_store().get(kind, id_) if app.config["ENTITY_DOCS"] else None
+    if doc is None:
+        _, build = DOC_KINDS[kind]
+        doc = build(graphene_session or init_graphene_session(), id_)
+    if doc is None:
+        abort(404)
+    return doc
 
 
 def my_render_template(graphene_session, page_name, **kwargs):
-    index = _create_index(graphene_session)
+    # `graphene_session` is only needed if the index document has to be built
+    index = entity_doc("index", graphene_session=graphene_session)
     nav_page_has_my_table = {
         entity["pages"]["overview"]["nav_page"]
         for entity in index.values()
@@ -30,37 +97,114 @@ def my_render_template(graphene_session, page_name, **kwargs):
     return render_template(f"{page_name}.html", **kwargs)
 
 
-def convert_image_to_base64(image_path):
-    """Converts an image to base64 encoding."""
-
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    return encoded_string        
+def asset_manifest():
+    if "jamdb_asset_manifest" not in app.extensions:
+        app.extensions["jamdb_asset_manifest"] = AssetManifest(
+            Path(app.static_folder) / ASSET_MANIFEST_FILE
+        )
+    return app.extensions["jamdb_asset_manifest"]
+
+
+@app.template_global()
+def asset_url(link):
+    # Fingerprinted URL for files in the asset manifest, plain static URL otherwise.
+    fingerprint = asset_manifest().fingerprint(link)
+    if fingerprint is None:
+        return url_for("static", filename=link)
+    return url_for("fingerprinted_asset", fingerprint=fingerprint, link=link)
+
+
+@app.route("/assets/<string:fingerprint>/<path:link>")
+def fingerprinted_asset(fingerprint, link):
+    current_fingerprint = asset_manifest().fingerprint(link)
+    if current_fingerprint is None:
+        abort(404)
+    if current_fingerprint != fingerprint:
+        # stale URL, e.g., from a page cached before the file changed
+        return redirect(url_for("fingerprinted_asset", fingerprint=current_fingerprint, link=link))
+
+    # `conditional` adds ETag / Last-Modified and handles Range requests (e.g. paging through
+    # pdfs).  Set `USE_X_SENDFILE` in the app config to hand the file off to the front end server.
+    response = send_from_directory(
+        app.static_folder, link, max_age=IMMUTABLE_MAX_AGE, conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def picture_src(picture, variant=PICTURE_VARIANT):
+    for picture_variant in picture.get("variants", []):
+        if picture_variant["variant"] == variant:
+            derived_dir = Path(picture_variant["link"]).parts[0]
+            filename = Path(picture_variant["link"]).relative_to(derived_dir)
+            return url_for("derived_media", filename=filename.as_posix())
+    # no derivative (yet), fall back to the original
+    return asset_url(picture["link"])
+
+
+def db_handler():
+    # one per DB, for the routes that read a row or two, without GraphQL
+    handlers = app.extensions.setdefault("jamdb_db_handlers", {})
+    db_file = str(app.config["DB_FILE"])
+    if db_file not in handlers:
+        handlers[db_file] = DBHandler.from_db_file(db_file)
+    return handlers[db_file]
+
+
+def ordered_ids(sql):
+    # the ids `sql` selects, in its order
+    with db_handler().engine.connect() as conn:
+        return [row[0] for row in conn.execute(sqlalchemy.text(sql))]
+
+
+def thumbnail_cache():
+    if "jamdb_thumbnail_cache" not in app.extensions:
+        app.extensions["jamdb_thumbnail_cache"] = ThumbnailCache(
+            app.static_folder, logger=app.logger
+        )
+    return app.extensions["jamdb_thumbnail_cache"]
+
+
+@app.route("/thumbnail/<string:table_name>/<string:row_id>")
+def thumbnail(table_name, row_id):
+    # Poster image for the player of the row's link, see `jamdb.thumbnails.THUMBNAIL_TABLES`.
+    # Fetched on first request, then served from the cache.
+    with db_handler().engine.connect() as conn:
+        source = read_thumbnail_source(conn, table_name, row_id)
+    thumbnail_link = None if source is None else thumbnail_cache().get(*source)
+    if thumbnail_link is None:
+        response = make_response("No thumbnail", 404)
+    else:
+        filename = thumbnail_link.relative_to(thumbnail_link.parts[0])
+        response = redirect(url_for("derived_media", filename=filename.as_posix()))
+    # so pages with many dead links do not ask again on every view
+    response.cache_control.public = True
+    response.cache_control.max_age = THUMBNAIL_MAX_AGE
+    return response
+
+
+@app.route("/derived/<path:filename>")
+def derived_media(filename):
+    response = send_from_directory(
+        Path(app.static_folder) / "derived", filename, max_age=IMMUTABLE_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route('/', methods=["GET", "POST"])
 def index():
     page_name = "index"
-    g_session = init_graphene_session()    
-    return my_render_template(g_session, page_name)
+    return my_render_template(None, page_name)
 
 
 @app.route("/overview-event-occs/", methods=["GET"])
 def overview_event_occs():
     page_name = "overview_event_occs"
     g_session = init_graphene_session()
-    summaries = g_session.execute(
-        """
-        query {
-          eventOccs {
-            id, name, date, venue { id, venue },
-            songPerforms { id, song { id, song } }
-            players { person { id, publicName } }
-            eventgen { name }
-          }
-        }
-        """
-    ).data["eventOccs"]
+    summaries = g_session.execute(queries.OVERVIEW_EVENT_OCCS).data["eventOccs"]
     summaries = sorted(
         summaries,
         key=lambda x: (x["eventgen"]["name"].lower(), x["date"].lower())
@@ -72,15 +216,7 @@ def overview_event_occs():
 def overview_event_series():
     page_name = "overview_event_series"
     g_session = init_graphene_session()
-    summaries = g_session.execute(
-        """
-        query {
-          eventGens {
-            id, name, genre { genre }, time, date, venue { id, venue },
-            person { id, publicName }, eventOccs { id, name }
-          }
-        }""",
-    ).data["eventGens"]
+    summaries = g_session.execute(queries.OVERVIEW_EVENT_SERIES).data["eventGens"]
     for event in summaries:
         event["host"] = event.pop("person")
     summaries = sorted(summaries, key=lambda x: x["name"].lower())
@@ -91,16 +227,7 @@ def overview_event_series():
 def overview_players():
     page_name = "overview_players"
     g_session = init_graphene_session()
-    summaries = g_session.execute(
-        """
-        query {
-          persons {
-            id, combinedName, instrumentList, 
-            eventsAttended {id, name}, songPerforms {id, song { song } }
-          }
-        }
-        """
-    ).data["persons"]
+    summaries = g_session.execute(queries.OVERVIEW_PLAYERS).data["persons"]
     summaries = sorted(summaries, key=lambda x: x["combinedName"].lower())
     return my_render_template(g_session, page_name, summaries=summaries)
 
@@ -109,16 +236,7 @@ def overview_players():
 def overview_songs():
     page_name = "overview_songs"
     g_session = init_graphene_session()
-    summaries = g_session.execute(
-        """
-        query {
-          songs {
-            id, song, key { keyName }, subgenre { subgenreName }
-            songPerforms { id, eventocc { name } }
-          }
-        }
-        """
-    ).data["songs"]
+    summaries = g_session.execute(queries.OVERVIEW_SONGS).data["songs"]
     summaries = sorted(summaries, key=lambda x: x["song"].lower())
     return my_render_template(g_session, page_name, summaries=summaries)
 
@@ -127,340 +245,78 @@ def overview_songs():
 def overview_performance_videos():
     page_name = "overview_performance_videos"
     g_session = init_graphene_session()
+    # sort in SQL, then only fetch the details of the rows on this page
+    ids, pager = paginate(ordered_ids(queries.OVERVIEW_PERFORMANCE_VIDEOS_ORDER_SQL))
     summaries = g_session.execute(
-        """
-        query {
-          performanceVideos {
-            id, link, embeddableLink,
-            songperform {
-              id, song { song }, eventocc { id, name, date },
-              players { person {id, publicName}, instrumentList }
-            }
-          }
-        }
-        """
+        queries.OVERVIEW_PERFORMANCE_VIDEOS,
+        variables={"ids": ids}
     ).data["performanceVideos"]
-    summaries = sorted(
-        summaries,
-        key=lambda x: (x["songperform"]["song"]["song"].lower(), x["songperform"]["eventocc"]["date"].lower())
-    )
-    
-    return my_render_template(g_session, page_name, summaries=summaries)
+
+    return my_render_template(g_session, page_name, summaries=summaries, pager=pager)
 
 
 @app.route("/overview-performed-songs/", methods=["GET"])
 def overview_performed_songs():
     page_name = "overview_performed_songs"
     g_session = init_graphene_session()
+    ids, pager = paginate(ordered_ids(queries.OVERVIEW_PERFORMED_SONGS_ORDER_SQL))
     summaries = g_session.execute(
-        """
-        query {
-          songPerforms {
-            id, songPerformName, song { id, song }, eventocc { id, name, date },
-            players { person {id, publicName}, instrumentList },
-            performanceVideos { songPerformId, sourceId, linksource {rank}, link, embeddableLink, displayName}
-          }
-        }"""
+        queries.OVERVIEW_PERFORMED_SONGS,
+        variables={"ids": ids}
     ).data["songPerforms"]
-    summaries = sorted(
-        summaries, key=lambda x: (x["song"]["song"].lower(), x["eventocc"]["date"].lower())
-    )
     for song in summaries:
         song["performanceVideos"] = sort_links(song["performanceVideos"])
-    return my_render_template(g_session, page_name, summaries=summaries)
+    return my_render_template(g_session, page_name, summaries=summaries, pager=pager)
 
 
 @app.route("/detail-event-occ/<string:event_occ_id>")
 def detail_event_occ(event_occ_id):
-    page_name = "detail_event_occ"    
-    g_session = init_graphene_session()
-    event = g_session.execute(
-        """
-        query getEventOcc ($id: ID) {
-          eventOcc (id: $id) {
-            id, name, date, eventgen { id, name, venue { id, venue } },
-            songPerforms { id, song { id, song } },
-            players { person {id, publicName}, instrumentList }
-          }
-        }
-        """,
-        variables={"id": event_occ_id}
-    ).data["eventOcc"]
-    return my_render_template(g_session, page_name, event=event)
+    page_name = "detail_event_occ"
+    event = entity_doc("event_occ", event_occ_id)
+    return my_render_template(None, page_name, event=event)
 
 
 @app.route("/detail-event-series/<string:event_gen_id>")
 def detail_event_series(event_gen_id):
     page_name = "detail_event_series"
-    g_session = init_graphene_session()
-    event = g_session.execute(
-        """
-        query getEventGen ($id: ID) {
-          eventGen (id: $id) {
-            id, name, genre { genre }, time, date, venue { id, venue },
-            person { id, publicName }, eventOccs { id, name }
-          }
-        }""",
-        variables={"id": event_gen_id}
-    ).data["eventGen"]
-    event["host"] = event.pop("person")
-    return my_render_template(g_session, page_name, event=event)
+    event = entity_doc("event_gen", event_gen_id)
+    return my_render_template(None, page_name, event=event)
 
 
 @app.route("/detail-performed-song/<string:song_perform_id>")
 def detail_performed_song(song_perform_id):
     page_name = "detail_performed_song"
-    g_session = init_graphene_session()
-    song = g_session.execute(
-        """
-        query getSongPerform ($id: ID) {
-          songPerform (id: $id) {
-            id, songPerformName, song { id, song }, eventocc { id, name },
-            players { person {id, publicName}, instrumentList },
-            performanceVideos { songPerformId, link, embeddableLink}
-          }
-        }""",
-        variables={"id": song_perform_id}
-    ).data["songPerform"]
-    return my_render_template(g_session, page_name, song=song)
+    song = entity_doc("song_perform", song_perform_id)
+    return my_render_template(None, page_name, song=song)
 
 
 @app.route("/detail-song/<string:song_id>")
 def detail_song(song_id):
     page_name = "detail_song"
-    g_session = init_graphene_session()
-    song = g_session.execute(
-        """
-        query getSong($id: ID) {
-          song(id: $id) {
-            id, song, key { keyName }, subgenre { subgenreName }
-            songPerforms { id, eventocc { name } }
-            charts { sourceId, linksource {rank}, link, embeddableLink, displayName }
-            refRecs { sourceId, linksource {rank}, link, embeddableLink, displayName }
-          }
-        }
-        """,
-        variables={"id": song_id}
-    ).data["song"]
-    song["charts"] = sort_links(song["charts"])
-    song["refRecs"] = sort_links(song["refRecs"])
-    return my_render_template(g_session, page_name, song=song)
+    song = entity_doc("song", song_id)
+    return my_render_template(None, page_name, song=song)
 
 
 @app.route("/detail-player/<string:person_id>")
 def detail_player(person_id):
     page_name = "detail_player"
-    g_session = init_graphene_session()
-    person = g_session.execute(
-        """
-        query getPerson($id: ID, $otherPersonId: ID) {
-          person (id: $id) {
-            id, fullName, publicName, instrumentList
-            contacts { id, contactTypeId, contacttype {displayName, rank}, link, private, displayName },
-            eventsAttended { id, name, date },
-            songsPerformedWith(otherPersonId: $otherPersonId) { id, songPerformName },
-            songsPerformedWithout(otherPersonId: $otherPersonId) { id, songPerformName },
-            personPictures { link }
-          }
-        }
-        """,
-        variables={"id": person_id, "otherPersonId": ME_ID}
-    ).data["person"]
-    
-    contacts_by_type = defaultdict(list)
-    for contact in person["contacts"]:
-        if REDACT_PRIVATE and contact["private"]:
-            continue
-        contacts_by_type[contact["contactTypeId"]].append(contact)
-
-    contacts_by_type = [
-        {
-            "contactTypeId": contact_type[0]["contactTypeId"],
-            "contactTypeDisplayName": contact_type[0]["contacttype"]["displayName"],
-            "contactTypeRank": contact_type[0]["contacttype"]["rank"],
-            "contacts": contact_type
-        }
-        for contact_type in contacts_by_type.values()
-        if len(contact_type) > 0
-    ]
-    contacts_by_type = sorted(contacts_by_type, key=lambda x: x["contactTypeRank"])
-    person["contacts_by_type"] = contacts_by_type
-
-    return my_render_template(g_session, page_name, person=person)
+    person = entity_doc("person", person_id)
+
+    if REDACT_PRIVATE:
+        for contact_type in person["contacts_by_type"]:
+            contact_type["contacts"] = [x for x in contact_type["contacts"] if not x["private"]]
+        person["contacts_by_type"] = [
+            x for x in person["contacts_by_type"] if len(x["contacts"]) > 0
+        ]
+
+    for picture in person["personPictures"]:
+        picture["src"] = picture_src(picture)
+
+    return my_render_template(None, page_name, person=person)
 
 
 @app.route("/detail-venue/<string:venue_id>")
 def detail_venue(venue_id):
     page_name = "detail_venue"
-    g_session = init_graphene_session()
-    venue = g_session.execute(
-        """
-        query getVenue ($id: ID) {
-          venue (id: $id) {
-            venue, addressString, googleMapString, web
-            hostedEventSeries { id, name }
-          }
-        }
-        """,
-        variables={"id": venue_id}
-    ).data["venue"]
-
-    return my_render_template(g_session, page_name, venue=venue)
-
-
-def _create_index(graphene_session):
-    result = graphene_session.execute("""query {
-        eventGens { id, name }
-        eventOccs { id, name, date, eventgen { name } }
-        songPerforms { id, songPerformName, eventocc { date }, song { song } }
-        persons { id, publicName }
-        songs { id, song }
-        venues { id, venue }
-    }""").data
-    result["eventGens"] = sorted(
-        result["eventGens"],
-        key=lambda x: x["name"].lower()
-    )
-    result["eventOccs"] = sorted(
-        result["eventOccs"],
-        key=lambda x: (x["eventgen"]["name"].lower(), x["date"].lower())
-    )
-    result["songPerforms"] = sorted(
-        result["songPerforms"],
-        key=lambda x: (x["song"]["song"].lower(), x["eventocc"]["date"].lower())
-    )
-    result["persons"] = sorted(
-        result["persons"],
-        key=lambda x: x["publicName"].lower()
-    )
-    result["songs"] = sorted(
-        result["songs"],
-        key=lambda x: x["song"].lower()
-    )
-    result["venues"] = sorted(
-        result["venues"], key=lambda x: x["venue"].lower()
-    )
-    result = {
-        entity_name: [list(row.values()) for row in key_vals]
-        for entity_name, key_vals in result.items()
-    }
-    
-    index = {
-        "Series": {
-            "overview": {
-                "nav_page": "overview_event_series"
-            },
-            "detail": {
-                "nav_page": "detail_event_series",
-                "id": "event_gen_id",
-                "rows": result["eventGens"]
-            }
-        },
-        "Events": {
-            "overview": {
-                "nav_page": "overview_event_occs"
-            },
-            "detail": {
-                "nav_page": "detail_event_occ",
-                "id": "event_occ_id",
-                "rows": result["eventOccs"]
-            }
-        },
-        "Performed Songs": {
-            "overview": {
-                "nav_page": "overview_performed_songs"
-            },
-            "detail": {
-                "nav_page": "detail_performed_song", 
-                "id": "song_perform_id",
-                "rows": result["songPerforms"]
-            }
-        },
-        "Players": {
-            "overview": {
-                "nav_page": "overview_players"
-            },        
-            "detail": {
-                "nav_page": "detail_player",
-                "id": "person_id",
-                "rows": result["persons"]
-            }
-        },
-        "Songs": {
-            "overview": {
-                "nav_page": "overview_songs"
-            },
-            "detail": {
-                "nav_page": "detail_song",
-                "id": "song_id",
-                "rows": result["songs"]
-            }
-        },
-        "Venues": {
-            "detail": {
-                "nav_page": "detail_venue",
-                "id": "venue_id",
-                "rows": result["venues"]
-            }
-        },
-        "Videos": {
-            "overview": {
-                "nav_page": "overview_performance_videos"
-            }
-        }    
-    }
-
-    for item in index.values():
-        if "detail" in item:
-            item["detail"]["rows"] = [
-                [{ item["detail"]["id"]: x[0]}, x[1]] for x in item["detail"]["rows"]
-            ]
-
-    index = {k: {"pages": v} for k, v in index.items()}
-    for display_name, v in index.items():
-        v["nav_pages"] = [x["nav_page"] for x in v["pages"].values()]
-        if "detail" in v["pages"]:
-            detail = v["pages"]["detail"]
-            dropdown = []
-            if "overview" in v["pages"]:
-                overview = v["pages"]["overview"]
-                dropdown.append(
-                    {
-                        "type": "header",
-                        "header_name": "Overview"
-                    }
-                )
-                dropdown.append(
-                    {
-                        "type": "ref",
-                        "nav_page": overview["nav_page"],
-                        "nav_kwargs": {},
-                        "nav_display": f"Overview {display_name}"
-                    }
-                )
-                dropdown.append(
-                    {
-                        "type": "header",
-                        "header_name": "Detail view"
-                    }
-                )
-            for row in detail["rows"]:
-                dropdown.append(
-                    {
-                        "type": "ref",
-                        "nav_page": detail["nav_page"],
-                        "nav_kwargs": row[0],
-                        "nav_display": row[1]
-                    }
-                )
-            v["dropdown"] = dropdown
-        else:
-            overview = v["pages"]["overview"]
-            v["non_dropdown"] = [
-                {
-                    "type": "ref",
-                    "nav_page": overview["nav_page"],
-                    "nav_display": display_name
-                }
-            ]
-    return index
+    venue = entity_doc("venue", venue_id)
+    return my_render_template(None, page_name, venue=venue)
@@ -0,0 +1,52 @@
+"""
+Shared fixtures for the benchmarks, which run against synthetic DBs (see `jamdb.synthetic`) at
+each of the scales in `JAMDB_BENCH_SCALES` (comma separated, default "tiny,small").
+
+Save a baseline, then compare later runs against it:
+
+    pytest benchmarks/ --benchmark-save=baseline
+    pytest benchmarks/ --benchmark-compare=0001 --benchmark-compare-fail=mean:25%
+
+Baselines are written to `benchmarks/baselines`, as JSON.
+"""
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+from jamdb.synthetic import generate_jam_db
+
+BENCHMARKS_DIR = Path(__file__).parent
+# the ingestion entry points live in scripts/, which is not a package
+sys.path.append(str(BENCHMARKS_DIR.parent / "scripts"))
+
+SCALES = os.environ.get("JAMDB_BENCH_SCALES", "tiny,small").split(",")
+
+
+def pytest_configure(config):
+    if config.getoption("benchmark_storage", None) == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BENCHMARKS_DIR / 'baselines'}"
+
+
+@pytest.fixture(scope="session", params=SCALES)
+def synthetic_db_file(request, tmp_path_factory):
+    db_file = tmp_path_factory.mktemp(f"synthetic_{request.param}") / "jamming.db"
+    generate_jam_db(db_file, scale=request.param, seed=0)
+    return db_file
+
+
+@pytest.fixture(scope="session")
+def detail_ids(synthetic_db_file):
+    # The busiest row of each table, i.e., the most expensive detail page
+    queries = {
+        "event_occ_id": "SELECT event_occ_id FROM SongPerform GROUP BY 1 ORDER BY COUNT(*) DESC",
+        "event_gen_id": "SELECT event_gen_id FROM EventOcc GROUP BY 1 ORDER BY COUNT(*) DESC",
+        "song_perform_id": "SELECT song_perform_id FROM SongPerformer GROUP BY 1 ORDER BY COUNT(*) DESC",
+        "song_id": "SELECT song_id FROM SongPerform GROUP BY 1 ORDER BY COUNT(*) DESC",
+        "person_id": "SELECT person_id FROM Contact GROUP BY 1 ORDER BY COUNT(*) DESC",
+        "venue_id": "SELECT venue_id FROM EventGen GROUP BY 1 ORDER BY COUNT(*) DESC",
+    }
+    with sqlite3.connect(synthetic_db_file) as conn:
+        return {key: conn.execute(query).fetchone()[0] for key, query in queries.items()}
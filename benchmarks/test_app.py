@@ -0,0 +1,151 @@
+"""
+Benchmark the views, the GraphQL queries they run, and building the schema.
+
+    pytest benchmarks/test_app.py
+"""
+import shutil
+
+import pytest
+
+from app import init_app, queries
+from jamdb.documents import create_index, sync_documents
+from jamdb.globals import ME_ID
+from jamdb.graphene import GrapheneSQLSession, get_graphene_schema
+from jamdb.object_graph import ObjectGraph
+
+OVERVIEW_ROUTES = [
+    "/",
+    "/overview-event-occs/",
+    "/overview-event-series/",
+    "/overview-players/",
+    "/overview-songs/",
+    "/overview-performance_videos/",
+    "/overview-performed-songs/",
+]
+DETAIL_ROUTES = {
+    "/detail-event-occ/{event_occ_id}": "event_occ_id",
+    "/detail-event-series/{event_gen_id}": "event_gen_id",
+    "/detail-performed-song/{song_perform_id}": "song_perform_id",
+    "/detail-song/{song_id}": "song_id",
+    "/detail-player/{person_id}": "person_id",
+    "/detail-venue/{venue_id}": "venue_id",
+}
+# query name -> the `detail_ids` key of its `id` variable, if any
+QUERIES = {
+    "INDEX": None,
+    "OVERVIEW_EVENT_OCCS": None,
+    "OVERVIEW_EVENT_SERIES": None,
+    "OVERVIEW_PLAYERS": None,
+    "OVERVIEW_SONGS": None,
+    "DETAIL_EVENT_OCC": "event_occ_id",
+    "DETAIL_EVENT_SERIES": "event_gen_id",
+    "DETAIL_PERFORMED_SONG": "song_perform_id",
+    "DETAIL_SONG": "song_id",
+    "DETAIL_PLAYER": "person_id",
+    "DETAIL_VENUE": "venue_id",
+}
+# Whole pages of the big overviews take seconds at the larger scales, so keep the rounds down
+ROUNDS = 3
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    # routes register on the first app only, so share one, and switch its DB per scale
+    return init_app()
+
+
+@pytest.fixture
+def client(flask_app, synthetic_db_file):
+    flask_app.config["DB_FILE"] = synthetic_db_file
+    return flask_app.test_client()
+
+
+@pytest.fixture(scope="session")
+def documents_db_file(synthetic_db_file, tmp_path_factory):
+    # a copy, so the other benchmarks still measure building the pages per request
+    db_file = tmp_path_factory.mktemp("documents") / "jamming.db"
+    shutil.copyfile(synthetic_db_file, db_file)
+    sync_documents(db_file)
+    return db_file
+
+
+@pytest.fixture(scope="session")
+def graphene_session(synthetic_db_file):
+    return GrapheneSQLSession.from_sqlite_file(synthetic_db_file)
+
+
+@pytest.fixture(scope="session")
+def object_graph_session(synthetic_db_file):
+    graphene_session = GrapheneSQLSession.from_sqlite_file(synthetic_db_file, object_graph=True)
+    graphene_session.graph_store.current()
+    return graphene_session
+
+
+def _get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+@pytest.mark.parametrize("url", OVERVIEW_ROUTES)
+def test_overview_route(benchmark, client, url):
+    benchmark.pedantic(_get, args=(client, url), rounds=ROUNDS, iterations=1)
+
+
+@pytest.mark.parametrize("url", list(DETAIL_ROUTES))
+def test_detail_route(benchmark, client, detail_ids, url):
+    url = url.format(**detail_ids)
+    benchmark.pedantic(_get, args=(client, url), rounds=ROUNDS, iterations=1)
+
+
+@pytest.mark.parametrize("url", list(DETAIL_ROUTES))
+def test_detail_route_documents(benchmark, flask_app, documents_db_file, detail_ids, url):
+    flask_app.config["DB_FILE"] = documents_db_file
+    client = flask_app.test_client()
+    url = url.format(**detail_ids)
+    benchmark.pedantic(_get, args=(client, url), rounds=ROUNDS, iterations=1)
+
+
+def test_sync_documents(benchmark, documents_db_file):
+    # nothing changed, so only the row digests are compared
+    benchmark.pedantic(sync_documents, args=(documents_db_file,), rounds=ROUNDS, iterations=1)
+
+
+def _execute_query(benchmark, graphene_session, detail_ids, query_name):
+    variables = {}
+    if QUERIES[query_name] is not None:
+        variables = {"id": detail_ids[QUERIES[query_name]], "otherPersonId": ME_ID}
+
+    def execute():
+        result = graphene_session.execute(getattr(queries, query_name), variables=variables)
+        assert result.errors is None
+        return result
+
+    benchmark.pedantic(execute, rounds=ROUNDS, iterations=1)
+
+
+@pytest.mark.parametrize("query_name", list(QUERIES))
+def test_graphql_query(benchmark, graphene_session, detail_ids, query_name):
+    _execute_query(benchmark, graphene_session, detail_ids, query_name)
+
+
+@pytest.mark.parametrize("query_name", list(QUERIES))
+def test_graphql_query_object_graph(benchmark, object_graph_session, detail_ids, query_name):
+    _execute_query(benchmark, object_graph_session, detail_ids, query_name)
+
+
+def test_load_object_graph(benchmark, object_graph_session):
+    graph_store = object_graph_session.graph_store
+    benchmark.pedantic(
+        ObjectGraph.from_engine, args=(graph_store.engine, graph_store.model_classes),
+        rounds=ROUNDS, iterations=1
+    )
+
+
+def test_create_index(benchmark, graphene_session):
+    benchmark.pedantic(create_index, args=(graphene_session,), rounds=ROUNDS, iterations=1)
+
+
+def test_get_graphene_schema(benchmark, graphene_session):
+    engine = graphene_session.session.get_bind()
+    benchmark(get_graphene_schema, engine)
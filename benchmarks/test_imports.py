@@ -0,0 +1,29 @@
+"""
+Benchmark importing the serving runtime in a fresh interpreter, i.e., what each web worker pays on
+start, versus the ingestion stack.
+
+    pytest benchmarks/test_imports.py
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).parents[1]
+ROUNDS = 5
+MODULES = ["app", "jamdb.graphene", "jamdb.db", "jamdb.transformations"]
+
+
+def _import(module):
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=REPO_ROOT, check=True)
+
+
+def test_interpreter_startup(benchmark):
+    # the floor for the imports below
+    benchmark.pedantic(_import, args=("sys",), rounds=ROUNDS, iterations=1)
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import(benchmark, module):
+    benchmark.pedantic(_import, args=(module,), rounds=ROUNDS, iterations=1)
@@ -0,0 +1,182 @@
+"""
+Benchmark the DB layer and the ingestion entry points at the synthetic scales.  Parsing the iReal
+playlist is benchmarked on its own, in `test_ireal_parser.py`.
+
+    pytest benchmarks/test_ingest.py
+"""
+import shutil
+import sqlite3
+
+import PyPDF2
+import pytest
+
+from jamdb.db import DBHandler
+from jamdb.globals import ME_ID
+from jamdb.matching import normalize_song_name
+from jamdb.synthetic import SQL_FILE
+
+import charts_from_ireal_setlist
+import initialize_db
+
+ROUNDS = 3
+NUM_CHARTS = 200
+
+
+@pytest.fixture(scope="session")
+def synthetic_tables(synthetic_db_file):
+    db_handler = DBHandler.from_db_file(synthetic_db_file)
+    return {
+        table_name: db_handler.read_table(table_name)
+        for table_name in ["Song", "SongPerform", "SongPerformer", "PerformanceVideo"]
+    }
+
+
+@pytest.fixture(scope="session")
+def song_perform_sheet(synthetic_tables):
+    # SongPerform as it is in the ODS file, i.e., with my instrument, other players and videos as
+    # columns
+    performers = synthetic_tables["SongPerformer"]
+    split = performers["person_instrument_id"].str.split(":", n=1, expand=True)
+    is_me = split[0] == ME_ID
+    mine = performers.loc[is_me].assign(instrument_id=split.loc[is_me, 1])
+    mine = mine.drop_duplicates("song_perform_id").set_index("song_perform_id")["instrument_id"]
+
+    others = performers.loc[~is_me].copy()
+    others["col"] = "other_player_" + (others.groupby("song_perform_id").cumcount() + 1).astype(str)
+    others = others.pivot(index="song_perform_id", columns="col", values="person_instrument_id")
+
+    videos = synthetic_tables["PerformanceVideo"].drop_duplicates("song_perform_id")
+    videos = videos.set_index("song_perform_id")["link"].rename("video")
+
+    sheet = synthetic_tables["SongPerform"].set_index("id")
+    sheet = sheet.join(mine).join(others).join(videos)
+    return sheet.reset_index()
+
+
+@pytest.fixture
+def db_without_performances(synthetic_db_file, tmp_path):
+    db_file = tmp_path / "jamming.db"
+    shutil.copyfile(synthetic_db_file, db_file)
+    with sqlite3.connect(db_file) as conn:
+        for table_name in ["PerformanceVideo", "SongPerformer", "SongPerform"]:
+            conn.execute(f"DELETE FROM {table_name}")
+    return db_file
+
+
+def _fresh_db(db_file):
+    if db_file.exists():
+        db_file.unlink()
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(SQL_FILE.read_text())
+    return DBHandler.from_db_file(db_file)
+
+
+def test_db_handler_insert(benchmark, synthetic_tables, tmp_path):
+    rows = synthetic_tables["Song"][["id", "song"]].to_dict(orient="records")
+
+    def setup():
+        return (_fresh_db(tmp_path / "empty.db"), "Song", rows), {}
+
+    benchmark.pedantic(DBHandler.insert, setup=setup, rounds=ROUNDS, iterations=1)
+
+
+def test_db_handler_read_table(benchmark, synthetic_db_file):
+    db_handler = DBHandler.from_db_file(synthetic_db_file)
+    df = benchmark.pedantic(db_handler.read_table, args=("SongPerformer",), rounds=ROUNDS, iterations=1)
+    assert len(df) > 0
+
+
+def test_insert_for_song_performance(benchmark, song_perform_sheet, db_without_performances):
+    def setup():
+        with sqlite3.connect(db_without_performances) as conn:
+            for table_name in ["PerformanceVideo", "SongPerformer", "SongPerform"]:
+                conn.execute(f"DELETE FROM {table_name}")
+        return (DBHandler.from_db_file(db_without_performances), song_perform_sheet), {}
+
+    counts = benchmark.pedantic(
+        initialize_db.insert_for_song_performance, setup=setup, rounds=ROUNDS, iterations=1
+    )
+    assert counts["SongPerform"] == len(song_perform_sheet)
+
+
+@pytest.fixture
+def chart_inputs(synthetic_tables, tmp_path):
+    # a playlist pdf with a (blank) page per chart, and the songs those charts match
+    songs = synthetic_tables["Song"].head(NUM_CHARTS)
+    pdf_writer = PyPDF2.PdfWriter()
+    ireal_songs_list = []
+    jam_songs = {}
+    for song_id, song_name in zip(songs["id"], songs["song"]):
+        pdf_writer.add_blank_page(width=612, height=792)
+        ireal_song = {
+            "song_name": song_name, "composers": "", "i_real_href": f"irealb://{song_id}",
+            "dirty_name": song_name, "normalized_name": normalize_song_name(song_name),
+        }
+        ireal_songs_list.append(ireal_song)
+        jam_songs[song_id] = {"from_ireal": [ireal_song]}
+    pdf_file = tmp_path / "ireal_charts.pdf"
+    with open(pdf_file, "wb") as fh:
+        pdf_writer.write(fh)
+    return pdf_file, ireal_songs_list, jam_songs, tmp_path / "charts"
+
+
+@pytest.mark.parametrize("state", ["cold", "unchanged"])
+def test_write_charts(benchmark, chart_inputs, state):
+    pdf_file, ireal_songs_list, jam_songs, charts_dir = chart_inputs
+    if state == "unchanged":
+        charts_from_ireal_setlist.write_charts(pdf_file, ireal_songs_list, jam_songs, charts_dir)
+
+    def setup():
+        if state == "cold":
+            shutil.rmtree(charts_dir, ignore_errors=True)
+        return (pdf_file, ireal_songs_list, jam_songs, charts_dir), {}
+
+    counts = benchmark.pedantic(
+        charts_from_ireal_setlist.write_charts, setup=setup, rounds=ROUNDS, iterations=1
+    )
+    assert counts["written" if state == "cold" else "skipped"] == len(ireal_songs_list)
+
+
+@pytest.fixture
+def chart_files(chart_inputs):
+    # the charts written from the playlist, as `sync_charts` finds them under `data_dir`
+    pdf_file, ireal_songs_list, jam_songs, charts_dir = chart_inputs
+    charts_from_ireal_setlist.write_charts(pdf_file, ireal_songs_list, jam_songs, charts_dir)
+    return charts_dir.parent, len(ireal_songs_list)
+
+
+@pytest.mark.parametrize("state", ["cold", "unchanged"])
+def test_plan_chart_sync(benchmark, synthetic_db_file, chart_files, state):
+    data_dir, num_charts = chart_files
+    existing_charts = DBHandler.from_db_file(synthetic_db_file).read_table("Chart")
+    manifest_file = data_dir / charts_from_ireal_setlist.CHART_MANIFEST_FILE
+    if state == "unchanged":
+        manifest, _ = charts_from_ireal_setlist.plan_chart_sync(data_dir, existing_charts)
+        manifest.save()
+
+    def setup():
+        if state == "cold":
+            manifest_file.unlink(missing_ok=True)
+        return (data_dir, existing_charts), {}
+
+    _, delta = benchmark.pedantic(
+        charts_from_ireal_setlist.plan_chart_sync, setup=setup, rounds=ROUNDS, iterations=1
+    )
+    # a pdf and an iReal link per chart
+    assert len(delta["insert"]) == 2 * num_charts
+
+
+def test_sync_charts(benchmark, synthetic_db_file, chart_files, tmp_path):
+    data_dir, num_charts = chart_files
+    db_file = tmp_path / "jamming.db"
+    manifest_file = data_dir / charts_from_ireal_setlist.CHART_MANIFEST_FILE
+
+    def setup():
+        shutil.copyfile(synthetic_db_file, db_file)
+        manifest_file.unlink(missing_ok=True)
+        return (DBHandler.from_db_file(db_file), data_dir), {}
+
+    counts = benchmark.pedantic(
+        charts_from_ireal_setlist.sync_charts, setup=setup, rounds=ROUNDS, iterations=1
+    )
+    assert counts["insert"] == 2 * num_charts
@@ -0,0 +1,103 @@
+"""
+Benchmark the streaming iReal playlist parser against the previous implementation.
+
+    pytest benchmarks/test_ireal_parser.py
+
+Peak memory of each run (from `tracemalloc`) is recorded in the benchmark's `extra_info`.
+"""
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from jamdb.ireal import IREAL_HOST, parse_ireal_playlist_html
+from jamdb.matching import normalize_song_name
+from tests.test_ireal import make_playlist_html
+
+SIZES = [1_000, 10_000]
+
+
+def legacy_parse_ireal_playlist_html(html_file):
+    # The implementation `parse_ireal_playlist_html` replaced, kept here for comparison only.
+    # `names.split(...)` copies the remaining names on every song, i.e., quadratic in songs.
+    songs = []
+    host = IREAL_HOST
+
+    content = Path(html_file).read_text()
+    content = content[content.find("<body"):]
+    content = content[:content.find("</body>")] + "</body>"
+    for br in ["<br>", "<br/>", "<br />"]:
+        content = content.replace(br, " ")
+    content = content.strip()
+
+    _, content = content.split("<h3>", 1)
+    a_href, content = content.split("</h3>")
+    _, a_href = a_href.split(host)
+    a_href = a_href.split('">')[0].strip()
+    a_hrefs = [f"{host}{href}" for href in a_href.split("===")]
+    a_hrefs = a_hrefs[:-1]
+
+    names = content.split("</p>")[0].split("<p>")[-1].strip()
+    if names.startswith("1. "):
+        names = names[3:]
+    names += f" {len(a_hrefs) + 1}. "
+
+    for idx, href in enumerate(a_hrefs):
+        split_point = f" {idx + 2}. "
+        name, names = names.split(split_point)
+        name = name.strip()
+
+        for ex_name in ["Blues", "Modal"]:
+            if name.startswith(f"{ex_name} - "):
+                name = name.replace(f"{ex_name} - ", f"{ex_name} : ")
+        try:
+            song_name, composers = name.split(" - ", 1)
+        except ValueError:
+            song_name = name.strip()
+            composers = ""
+        song_name = song_name.strip()
+        song_name = song_name.replace("(RBB)", "").strip()
+        if song_name.endswith(", The"):
+            song_name = ("The " + song_name[:-len(", The")]).strip()
+
+        songs.append(
+            {
+                "song_name": song_name,
+                "composers": composers.strip(),
+                "i_real_href": href,
+                "dirty_name": name,
+                "normalized_name": normalize_song_name(song_name)
+            }
+        )
+    return songs
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}_songs")
+def playlist_html(request, tmp_path_factory):
+    songs = [(f"Song Number {idx}", f"Composer {idx % 97}") for idx in range(request.param)]
+    html_file = tmp_path_factory.mktemp("ireal") / "ireal_charts.html"
+    html_file.write_text(make_playlist_html(songs))
+    return html_file
+
+
+def _peak_memory(parse_fnc, html_file):
+    tracemalloc.start()
+    try:
+        parse_fnc(html_file)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_same_result(playlist_html):
+    assert parse_ireal_playlist_html(playlist_html) == legacy_parse_ireal_playlist_html(playlist_html)
+
+
+@pytest.mark.parametrize(
+    "parse_fnc", [parse_ireal_playlist_html, legacy_parse_ireal_playlist_html],
+    ids=["streaming", "legacy"]
+)
+def test_parse_ireal_playlist_html(benchmark, playlist_html, parse_fnc):
+    benchmark.extra_info["peak_memory_bytes"] = _peak_memory(parse_fnc, playlist_html)
+    songs = benchmark.pedantic(parse_fnc, args=(playlist_html,), rounds=3, iterations=1)
+    assert len(songs) > 0
@@ -0,0 +1,59 @@
+"""
+Benchmark matching a batch of names against the song table with the n-gram index, versus scoring
+every song for every name.
+
+    pytest benchmarks/test_matching.py
+"""
+import random
+
+import pytest
+
+from jamdb.matching import SongNameIndex, ngrams, normalize_song_name
+
+WORDS = (
+    "blue autumn night love moon star train girl time stella body soul leaves bossa all things "
+    "you are my foolish heart there will never be another summer dream some day prince walk"
+).split()
+
+
+def _names(num, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) for _ in range(num)]
+
+
+def brute_force_lookup(song_names, song_name, k=5):
+    query = ngrams(normalize_song_name(song_name))
+    scores = []
+    for song_id, name in song_names.items():
+        grams = ngrams(normalize_song_name(name))
+        scores.append((song_id, 2 * len(query & grams) / (len(query) + len(grams))))
+    return sorted(scores, key=lambda x: (-x[1], x[0]))[:k]
+
+
+@pytest.fixture(scope="module")
+def song_names():
+    return {f"song_{idx}": name for idx, name in enumerate(_names(5_000, seed=0))}
+
+
+@pytest.fixture(scope="module")
+def queries():
+    return _names(100, seed=1)
+
+
+def test_same_result(song_names, queries):
+    index = SongNameIndex(song_names)
+    for query in queries[:20]:
+        expected = brute_force_lookup(song_names, query)
+        actual = index.lookup(query)
+        assert [round(x[1], 9) for x in actual] == [round(x[1], 9) for x in expected]
+
+
+def test_index_lookup(benchmark, song_names, queries):
+    index = SongNameIndex(song_names)
+    benchmark(lambda: [index.lookup(query) for query in queries])
+
+
+def test_brute_force_lookup(benchmark, song_names, queries):
+    benchmark.pedantic(
+        lambda: [brute_force_lookup(song_names, query) for query in queries], rounds=3, iterations=1
+    )
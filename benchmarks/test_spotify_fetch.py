@@ -0,0 +1,42 @@
+"""
+Benchmark fetching a playlist from a local Spotify stand-in with some per-request latency, the way
+`refrecs_from_spotify.py` used to (sequential pages of 50) versus `fetch_playlist_tracks`.
+
+    pytest benchmarks/test_spotify_fetch.py
+"""
+import pytest
+
+from jamdb.spotify import fetch_playlist_tracks, make_requests_session
+from tests.stub_servers import SpotifyStub, make_track
+
+NUM_TRACKS = 2_000
+LATENCY = 0.02
+
+
+def sequential_fetch(spotipy_conn, playlist_id, batch_size=50):
+    tracks = []
+    offset = 0
+    while True:
+        result = spotipy_conn.playlist_items(
+            playlist_id, limit=batch_size, offset=offset, additional_types=("track",)
+        )
+        offset += batch_size
+        tracks.extend(result["items"])
+        if result["next"] is None or offset >= result["total"]:
+            return tracks
+
+
+@pytest.fixture(scope="module")
+def stub():
+    playlist = {"snapshot_id": "snap", "tracks": [make_track(idx) for idx in range(NUM_TRACKS)]}
+    with SpotifyStub({"pl": playlist}, latency=LATENCY) as stub:
+        yield stub
+
+
+@pytest.mark.parametrize(
+    "fetch_fnc", [fetch_playlist_tracks, sequential_fetch], ids=["concurrent", "sequential"]
+)
+def test_fetch(benchmark, stub, fetch_fnc):
+    conn = stub.spotipy_conn(requests_session=make_requests_session())
+    tracks = benchmark.pedantic(fetch_fnc, args=(conn, "pl"), rounds=3, iterations=1)
+    assert len(tracks) == NUM_TRACKS
@@ -0,0 +1,96 @@
+import json
+import os
+from pathlib import Path
+
+import sqlalchemy
+
+from .build_cache import file_digest
+
+ASSET_MANIFEST_FILE = "asset_manifest.json"
+# Tables whose `link`s may point at files in the data dir
+ASSET_TABLES = ["Chart", "PersonPicture"]
+FINGERPRINT_LENGTH = 16
+
+
+def _local_links(db_handler, table_names):
+    links = set()
+    with db_handler.Session.begin() as session:
+        for table_name in table_names:
+            rows = session.execute(sqlalchemy.text(f"SELECT link FROM {table_name}")).fetchall()
+            links.update(row[0] for row in rows if row[0] and "://" not in row[0])
+    return sorted(links)
+
+
+def build_asset_manifest(db_handler, data_dir, table_names=ASSET_TABLES):
+    """
+    Write a manifest mapping each local file `link` in `table_names` to a content fingerprint.
+
+    Fingerprints of files whose size and mtime are unchanged since the previous manifest are
+    reused, so only new or changed files are hashed.
+    """
+    data_dir = Path(data_dir)
+    manifest_file = data_dir / ASSET_MANIFEST_FILE
+    try:
+        previous = json.loads(manifest_file.read_text())
+    except FileNotFoundError:
+        previous = {}
+
+    manifest = {}
+    for link in _local_links(db_handler, table_names):
+        path = data_dir / link
+        if not path.is_file():
+            print(f"    {link} not found in {data_dir}, not adding it to asset manifest")
+            continue
+        stat = path.stat()
+        entry = previous.get(link)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            entry = {
+                "fingerprint": file_digest(path)[:FINGERPRINT_LENGTH],
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        manifest[link] = entry
+
+    tmp_file = manifest_file.with_name(f"{manifest_file.name}.tmp")
+    tmp_file.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_file, manifest_file)
+    return manifest
+
+
+class AssetManifest:
+    """
+    Read side of the asset manifest, used by the app to build and resolve fingerprinted URLs.
+
+    The manifest is reloaded whenever the file changes on disk, e.g., after a re-ingest.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        self._mtime_ns = None
+        self._entries = {}
+        # lookups served from the loaded manifest, and those that had to (re)load it first
+        self.hits = 0
+        self.misses = 0
+
+    def cache_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _reload_if_changed(self):
+        try:
+            mtime_ns = self.manifest_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.misses += 1
+            self._mtime_ns = None
+            self._entries = {}
+            return
+        if mtime_ns != self._mtime_ns:
+            self.misses += 1
+            self._entries = json.loads(self.manifest_file.read_text())
+            self._mtime_ns = mtime_ns
+        else:
+            self.hits += 1
+
+    def fingerprint(self, link):
+        self._reload_if_changed()
+        entry = self._entries.get(link)
+        return None if entry is None else entry["fingerprint"]
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import sqlalchemy
+
+
+def digest(*parts):
+    sha = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        sha.update(part)
+        # separator, so ("ab", "c") and ("a", "bc") don't collide
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def tree_digest(directory):
+    directory = Path(directory)
+    parts = []
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            parts.extend([str(path.relative_to(directory)), file_digest(path)])
+    return digest(*parts)
+
+
+def schema_digest(db_handler):
+    """
+    Digest of the DB schema, i.e., the `CREATE` statements, plus the `_schema_*` table contents.
+    """
+    with db_handler.Session.begin() as session:
+        statements = session.execute(
+            sqlalchemy.text("SELECT type, name, sql FROM sqlite_master ORDER BY type, name")
+        ).fetchall()
+        descriptions = [
+            session.execute(sqlalchemy.text(f"SELECT * FROM {table_name} ORDER BY 1, 2")).fetchall()
+            for table_name in ["_schema_tables", "_schema_columns"]
+        ]
+    return digest(*[str(row) for row in statements], *[str(rows) for rows in descriptions])
+
+
+class BuildCache:
+    """
+    Remembers the inputs each derived artifact was built from.
+
+    An artifact is rebuilt only if the key of its inputs changed, or if the artifact is missing or
+    no longer matches what was built.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        try:
+            self._entries = json.loads(self.cache_file.read_text())
+        except FileNotFoundError:
+            self._entries = {}
+
+    def is_fresh(self, artifact, key):
+        artifact = Path(artifact)
+        entry = self._entries.get(str(artifact))
+        if entry is None or entry["key"] != key or not artifact.exists():
+            return False
+        return file_digest(artifact) == entry["output"]
+
+    def record(self, artifact, key):
+        self._entries[str(artifact)] = {"key": key, "output": file_digest(artifact)}
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(f"{self.cache_file.name}.tmp")
+        tmp_file.write_text(json.dumps(self._entries, indent=2))
+        os.replace(tmp_file, self.cache_file)
+
+    def build(self, artifact, key, build_fnc):
+        """
+        Call `build_fnc()` to (re)create `artifact`, unless it is fresh.  Returns whether it built.
+        """
+        if self.is_fresh(artifact, key):
+            print(f"    {artifact} is up to date")
+            return False
+        print(f"    Building {artifact}")
+        build_fnc()
+        self.record(artifact, key)
+        return True
+
+
+def _same_file(src, dest):
+    if not dest.exists():
+        return False
+    if os.path.samefile(src, dest):
+        return True
+    src_stat = src.stat()
+    dest_stat = dest.stat()
+    # copies are made with `copy2`, which preserves mtime
+    return src_stat.st_size == dest_stat.st_size and src_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def sync_tree(src_dir, dest_dir, hardlink=True):
+    """
+    Make `dest_dir` mirror `src_dir`, only touching files that changed.
+
+    New or changed files are hardlinked when possible (same file system), otherwise copied.
+    Files in `dest_dir` that are no longer in `src_dir` are removed.
+    """
+    src_dir = Path(src_dir)
+    dest_dir = Path(dest_dir)
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    src_files = {
+        path.relative_to(src_dir) for path in src_dir.rglob("*") if path.is_file()
+    }
+    for rel_path in sorted(src_files):
+        src = src_dir / rel_path
+        dest = dest_dir / rel_path
+        if _same_file(src, dest):
+            stats["unchanged"] += 1
+            continue
+
+        stats["updated" if dest.exists() else "added"] += 1
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists():
+            dest.unlink()
+        try:
+            if not hardlink:
+                raise OSError("hardlinks disabled")
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+
+    if dest_dir.exists():
+        for path in sorted(dest_dir.rglob("*"), reverse=True):
+            if path.is_file() and path.relative_to(dest_dir) not in src_files:
+                path.unlink()
+                stats["removed"] += 1
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+    return stats
+
+
+class FileManifest:
+    """
+    Per-file content digests of a directory, plus what was derived from each file.
+
+    `update` only hashes files whose size or mtime changed, and only re-derives files whose
+    content changed, so a directory of mostly unchanged files is cheap to re-scan.
+    """
+
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        try:
+            self.entries = json.loads(self.manifest_file.read_text())
+        except FileNotFoundError:
+            self.entries = {}
+
+    def derived(self):
+        return {rel_path: entry["derived"] for rel_path, entry in self.entries.items()}
+
+    def update(self, directory, derive_fnc):
+        """
+        Re-scan `directory`, calling `derive_fnc(path)` for new and changed files.
+
+        Paths are relative to `directory`.  Returns the paths that were added, changed, removed
+        or unchanged since the last update.
+        """
+        directory = Path(directory)
+        changes = {"added": [], "changed": [], "removed": [], "unchanged": []}
+        entries = {}
+        for path in sorted(directory.rglob("*")) if directory.exists() else []:
+            if not path.is_file():
+                continue
+            rel_path = str(path.relative_to(directory))
+            stat = path.stat()
+            entry = self.entries.get(rel_path)
+            if entry is not None and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                entries[rel_path] = entry
+                changes["unchanged"].append(rel_path)
+                continue
+
+            file_hash = file_digest(path)
+            if entry is not None and entry["digest"] == file_hash:
+                changes["unchanged"].append(rel_path)
+                derived = entry["derived"]
+            else:
+                changes["added" if entry is None else "changed"].append(rel_path)
+                derived = derive_fnc(path)
+            entries[rel_path] = {
+                "digest": file_hash,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "derived": derived,
+            }
+        changes["removed"] = sorted(set(self.entries) - set(entries))
+        self.entries = entries
+        return changes
+
+    def save(self):
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_name(f"{self.manifest_file.name}.tmp")
+        tmp_file.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+        os.replace(tmp_file, self.manifest_file)
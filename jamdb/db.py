@@ -1,9 +1,9 @@
-import pandas as pd
 import sqlalchemy
 from sqlalchemy.ext.automap import automap_base
 from sqlalchemy.exc import IntegrityError
 
 from .db_error_handling import _db_error_factory
+from .sqlstats import instrument_engine
 
 
 class DBHandler:
@@ -22,6 +22,14 @@ class DBHandler:
     @staticmethod
     def _fk_pragma_on_connect(dbapi_con, con_record):
         dbapi_con.execute('pragma foreign_keys=ON')
+
+    @staticmethod
+    def _functions_on_connect(dbapi_con, con_record):
+        # sqlite's lower() only folds ASCII, py_lower() sorts as python's str.lower() does
+        dbapi_con.create_function(
+            "py_lower", 1, lambda value: None if value is None else value.lower(),
+            deterministic=True
+        )
     
     @property
     def engine(self):
@@ -36,6 +44,8 @@ class DBHandler:
         # sqlite dbs do NOT enable FKs on connection by default
         # Add listener to ensure they do get set.
         sqlalchemy.event.listen(value, 'connect', self._fk_pragma_on_connect)        
+        sqlalchemy.event.listen(value, 'connect', self._functions_on_connect)
+        instrument_engine(value)
         self.__engine = value
         self.__Session = sqlalchemy.orm.sessionmaker(bind=self.__engine)    
     
@@ -64,6 +74,9 @@ class DBHandler:
         return self.__tables
 
     def read_table(self, table_name):
+        # pandas is only needed by the ingestion scripts, so is not imported by the app
+        import pandas as pd
+
         with self.Session.begin() as session:
             result = pd.DataFrame(session.execute(sqlalchemy.text(f"SELECT * FROM {table_name}")).fetchall())
         return result
@@ -77,44 +90,57 @@ class DBHandler:
             fk_constraints.append(fk)
         return fk_constraints
     
-    def insert(self, table_name, rows):
-        if len(rows) == 0:
-            return
+    def _execute(self, table_name, statement, rows, session=None, message_fnc=None):
+        # If `session` is provided, `statement` runs as part of the caller's transaction,
+        # otherwise it is committed on its own.  `message_fnc(error_class, exc)` builds the
+        # message of integrity errors, by default that of inserting `rows`.
         try:
-            with self.Session.begin() as session:
-                table = self.tables()[table_name]
-                session.execute(table.insert(), rows)
+            if session is None:
+                with self.Session.begin() as session:
+                    session.execute(statement, rows)
+            else:
+                session.execute(statement, rows)
 
         except IntegrityError as exc:
             if not isinstance(rows, list):
                 rows = [rows]
 
             error_class = _db_error_factory(exc)
-            msg = error_class.error_messages_on_insert(self, table_name, rows, exc)
+            if message_fnc is None:
+                msg = error_class.error_messages_on_insert(self, table_name, rows, exc)
+            else:
+                msg = message_fnc(error_class, exc)
 
             if isinstance(msg, list):
                 msg = "\n" + "\n".join([str(x) for x in msg])
 
             raise error_class(msg) from exc
-    
-    
-    def update(self, table, *args, **kwargs):
-        # Unclear if its worth adding our own `update` method -- won't do for now since all editing
-        # of table happens in the ODS file, not the DB.  If we do support `update` will need to
-        # to add some input cleansing and exception handling
-        
-        # with self.engine.connect() as conn:        
-        #     conn.execute(
-        #         table.update().values({"instrument_id": "trumpet"}).where(table.c.id == "paul_k:mando")    
-        #     )
-        raise NotImplementedError()
-
-    def delete(self, table, *args, **kwargs):
-        # Unclear if its worth adding our own `delete` method -- won't do for now since all editing
-        # of table happens in the ODS file, not the DB.  If we do support `delete` will need to
-        # to add some exception handling
-        # with engine.connect() as conn:
-        #     conn.execute(
-        #         table.delete().where(table.c.id == "paul_k:drums")
-        #     )
-        raise NotImplementedError()
+
+    def insert(self, table_name, rows, session=None):
+        if len(rows) == 0:
+            return
+        table = self.tables()[table_name]
+        self._execute(table_name, table.insert(), rows, session=session)
+
+    def update(self, table_name, rows, key="id", session=None):
+        # Each row is matched on its `key` column, and its other columns are overwritten.
+        # Most editing of tables happens in the ODS file, this is for scripts that sync derived
+        # rows incrementally.
+        if len(rows) == 0:
+            return
+        table = self.tables()[table_name]
+        statement = table.update().where(table.c[key] == sqlalchemy.bindparam("_key"))
+        rows = [{**row, "_key": row[key]} for row in rows]
+        self._execute(table_name, statement, rows, session=session)
+
+    def delete(self, table_name, keys, key="id", session=None):
+        keys = list(keys)
+        if len(keys) == 0:
+            return
+        table = self.tables()[table_name]
+        statement = table.delete().where(table.c[key].in_(keys))
+
+        def message_fnc(error_class, exc):
+            return error_class.error_messages_on_delete(self, table_name, key, keys, exc)
+
+        self._execute(table_name, statement, {}, session=session, message_fnc=message_fnc)
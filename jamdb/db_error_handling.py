@@ -1,10 +1,15 @@
 # LOL! half of our db code is just converting the UN-informative sqllite integretity error
 # messages into actually useful error messages.
-import pandas as pd
 
 
 class DBError(Exception):
 
+    @staticmethod
+    def _to_frame(rows):
+        # imported here, as the error messages are the only use of pandas in the DB layer
+        import pandas as pd
+        return pd.DataFrame(rows)
+
     @staticmethod
     def _index(df, cols):
         return df.apply(lambda row: tuple([row[c] for c in cols]), axis=1)
@@ -17,6 +22,10 @@ class DBError(Exception):
     def error_messages_on_insert(cls, db_handler, table_name, rows, sqlalchemy_exc):
         return "\n".join(sqlalchemy_exc.args)
 
+    @classmethod
+    def error_messages_on_delete(cls, db_handler, table_name, key, keys, sqlalchemy_exc):
+        return "\n".join([f"Deleting {table_name} rows with {key} in {keys}", *sqlalchemy_exc.args])
+
 
 class NotNullConstraintError(DBError):
 
@@ -67,7 +76,7 @@ class UniqueConstraintError(DBError):
         for constraint in constraints:
             cols = [x["col"] for x in constraint]
 
-            in_new_rows = cls._index(pd.DataFrame(rows), cols).value_counts()
+            in_new_rows = cls._index(cls._to_frame(rows), cols).value_counts()
             for k, v in in_new_rows[in_new_rows > 1].to_dict().items():
                 errors.append(
                     {
@@ -103,7 +112,7 @@ class FKConstraintError(DBError):
             referred_columns = constraint["referred_columns"]
             constrained_columns = constraint["constrained_columns"]
             allowed_values = set(cls._index(db_handler.read_table(referred_table), referred_columns))
-            provided_values = set(cls._index(pd.DataFrame(rows), constrained_columns))
+            provided_values = set(cls._index(cls._to_frame(rows), constrained_columns))
             invalid_values = provided_values.difference(allowed_values)
 
             if invalid_values:
@@ -119,6 +128,37 @@ class FKConstraintError(DBError):
                 )
         return errors
 
+    @classmethod
+    def error_messages_on_delete(cls, db_handler, table_name, key, keys, sqlalchemy_exc):
+        # the rows of other tables that still refer to the rows being deleted
+        errors = []
+        for other_table in db_handler.tables():
+            for constraint in db_handler.get_fks_for_table(other_table):
+                if constraint["referred_table"] != table_name:
+                    continue
+                if constraint["referred_columns"] != [key]:
+                    continue
+                constrained_column = constraint["constrained_columns"][0]
+                referring = db_handler.read_table(other_table)
+                if len(referring) == 0:
+                    continue
+                referred_keys = set(referring[constrained_column]).intersection(keys)
+                if referred_keys:
+                    errors.append(
+                        {
+                            "table": table_name,
+                            "key": key,
+                            "deleted_keys": sorted(referred_keys),
+                            "referred_by_table": other_table,
+                            "referred_by_columns": constraint["constrained_columns"],
+                        }
+                    )
+        if len(errors) == 0:
+            return super().error_messages_on_delete(
+                db_handler, table_name, key, keys, sqlalchemy_exc
+            )
+        return errors
+
 
 def _db_error_factory(sqlalchemy_exc):
     if any("UNIQUE" in msg for msg in sqlalchemy_exc.args):
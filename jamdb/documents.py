@@ -0,0 +1,340 @@
+# The data of the detail pages, and the nav index of all pages, as the app's routes render them,
+# less what depends on the request, e.g., redacting private contacts.
+#
+# Ingestion materializes these as documents, see `jamdb.entity_docs` and `sync_documents`, so the
+# routes serve them with one lookup, and only build them here, when there is no document yet.
+
+from collections import defaultdict
+
+from .entity_docs import sync_entity_docs
+from .globals import ME_ID
+from .graphene import GrapheneSQLSession
+
+# The GraphQL queries of the documents, `app.queries` has those of the overview pages
+DETAIL_EVENT_OCC = """
+query getEventOcc ($id: ID) {
+  eventOcc (id: $id) {
+    id, name, date, eventgen { id, name, venue { id, venue } },
+    songPerforms { id, song { id, song } },
+    players { person {id, publicName}, instrumentList }
+  }
+}
+"""
+
+DETAIL_EVENT_SERIES = """
+query getEventGen ($id: ID) {
+  eventGen (id: $id) {
+    id, name, genre { genre }, time, date, venue { id, venue },
+    person { id, publicName }, eventOccs { id, name }
+  }
+}
+"""
+
+DETAIL_PERFORMED_SONG = """
+query getSongPerform ($id: ID) {
+  songPerform (id: $id) {
+    id, songPerformName, song { id, song }, eventocc { id, name },
+    players { person {id, publicName}, instrumentList },
+    performanceVideos { songPerformId, link, embeddableLink}
+  }
+}
+"""
+
+DETAIL_SONG = """
+query getSong($id: ID) {
+  song(id: $id) {
+    id, song, key { keyName }, subgenre { subgenreName }
+    songPerforms { id, eventocc { name } }
+    charts { sourceId, linksource {rank}, link, embeddableLink, displayName }
+    refRecs { sourceId, linksource {rank}, link, embeddableLink, displayName }
+  }
+}
+"""
+
+DETAIL_PLAYER = """
+query getPerson($id: ID, $otherPersonId: ID) {
+  person (id: $id) {
+    id, fullName, publicName, instrumentList
+    contacts { id, contactTypeId, contacttype {displayName, rank}, link, private, displayName },
+    eventsAttended { id, name, date },
+    songsPerformedWith(otherPersonId: $otherPersonId) { id, songPerformName },
+    songsPerformedWithout(otherPersonId: $otherPersonId) { id, songPerformName },
+    personPictures { link, variants { variant, link, width, height } }
+  }
+}
+"""
+
+DETAIL_VENUE = """
+query getVenue ($id: ID) {
+  venue (id: $id) {
+    venue, addressString, googleMapString, web
+    hostedEventSeries { id, name }
+  }
+}
+"""
+
+INDEX = """
+query {
+        eventGens { id, name }
+        eventOccs { id, name, date, eventgen { name } }
+        songPerforms { id, songPerformName, eventocc { date }, song { song } }
+        persons { id, publicName }
+        songs { id, song }
+        venues { id, venue }
+    }
+"""
+
+
+def sort_links(links):
+    links = sorted(links, key=lambda row: row["linksource"]["rank"])
+    return links
+
+
+def _execute(graphene_session, query, variables=None):
+    result = graphene_session.execute(query, variables=variables)
+    if result.errors:
+        raise result.errors[0]
+    return result.data
+
+
+def event_occ_doc(graphene_session, event_occ_id):
+    return _execute(
+        graphene_session, DETAIL_EVENT_OCC, variables={"id": event_occ_id}
+    )["eventOcc"]
+
+
+def event_series_doc(graphene_session, event_gen_id):
+    event = _execute(
+        graphene_session, DETAIL_EVENT_SERIES, variables={"id": event_gen_id}
+    )["eventGen"]
+    if event is not None:
+        event["host"] = event.pop("person")
+    return event
+
+
+def performed_song_doc(graphene_session, song_perform_id):
+    return _execute(
+        graphene_session, DETAIL_PERFORMED_SONG, variables={"id": song_perform_id}
+    )["songPerform"]
+
+
+def song_doc(graphene_session, song_id):
+    song = _execute(graphene_session, DETAIL_SONG, variables={"id": song_id})["song"]
+    if song is not None:
+        song["charts"] = sort_links(song["charts"])
+        song["refRecs"] = sort_links(song["refRecs"])
+    return song
+
+
+def player_doc(graphene_session, person_id):
+    # with all contacts, private ones are left out per request
+    person = _execute(
+        graphene_session, DETAIL_PLAYER,
+        variables={"id": person_id, "otherPersonId": ME_ID}
+    )["person"]
+    if person is None:
+        return None
+
+    contacts_by_type = defaultdict(list)
+    for contact in person["contacts"]:
+        contacts_by_type[contact["contactTypeId"]].append(contact)
+
+    contacts_by_type = [
+        {
+            "contactTypeId": contact_type[0]["contactTypeId"],
+            "contactTypeDisplayName": contact_type[0]["contacttype"]["displayName"],
+            "contactTypeRank": contact_type[0]["contacttype"]["rank"],
+            "contacts": contact_type
+        }
+        for contact_type in contacts_by_type.values()
+        if len(contact_type) > 0
+    ]
+    contacts_by_type = sorted(contacts_by_type, key=lambda x: x["contactTypeRank"])
+    person["contacts_by_type"] = contacts_by_type
+    return person
+
+
+def venue_doc(graphene_session, venue_id):
+    return _execute(graphene_session, DETAIL_VENUE, variables={"id": venue_id})["venue"]
+
+
+def create_index(graphene_session, _id=""):
+    # the nav index shared by all pages, one document of its own
+    result = _execute(graphene_session, INDEX)
+    result["eventGens"] = sorted(
+        result["eventGens"],
+        key=lambda x: x["name"].lower()
+    )
+    result["eventOccs"] = sorted(
+        result["eventOccs"],
+        key=lambda x: (x["eventgen"]["name"].lower(), x["date"].lower())
+    )
+    result["songPerforms"] = sorted(
+        result["songPerforms"],
+        key=lambda x: (x["song"]["song"].lower(), x["eventocc"]["date"].lower())
+    )
+    result["persons"] = sorted(
+        result["persons"],
+        key=lambda x: x["publicName"].lower()
+    )
+    result["songs"] = sorted(
+        result["songs"],
+        key=lambda x: x["song"].lower()
+    )
+    result["venues"] = sorted(
+        result["venues"], key=lambda x: x["venue"].lower()
+    )
+    result = {
+        entity_name: [list(row.values()) for row in key_vals]
+        for entity_name, key_vals in result.items()
+    }
+    
+    index = {
+        "Series": {
+            "overview": {
+                "nav_page": "overview_event_series"
+            },
+            "detail": {
+                "nav_page": "detail_event_series",
+                "id": "event_gen_id",
+                "rows": result["eventGens"]
+            }
+        },
+        "Events": {
+            "overview": {
+                "nav_page": "overview_event_occs"
+            },
+            "detail": {
+                "nav_page": "detail_event_occ",
+                "id": "event_occ_id",
+                "rows": result["eventOccs"]
+            }
+        },
+        "Performed Songs": {
+            "overview": {
+                "nav_page": "overview_performed_songs"
+            },
+            "detail": {
+                "nav_page": "detail_performed_song", 
+                "id": "song_perform_id",
+                "rows": result["songPerforms"]
+            }
+        },
+        "Players": {
+            "overview": {
+                "nav_page": "overview_players"
+            },        
+            "detail": {
+                "nav_page": "detail_player",
+                "id": "person_id",
+                "rows": result["persons"]
+            }
+        },
+        "Songs": {
+            "overview": {
+                "nav_page": "overview_songs"
+            },
+            "detail": {
+                "nav_page": "detail_song",
+                "id": "song_id",
+                "rows": result["songs"]
+            }
+        },
+        "Venues": {
+            "detail": {
+                "nav_page": "detail_venue",
+                "id": "venue_id",
+                "rows": result["venues"]
+            }
+        },
+        "Videos": {
+            "overview": {
+                "nav_page": "overview_performance_videos"
+            }
+        }    
+    }
+
+    for item in index.values():
+        if "detail" in item:
+            item["detail"]["rows"] = [
+                [{ item["detail"]["id"]: x[0]}, x[1]] for x in item["detail"]["rows"]
+            ]
+
+    index = {k: {"pages": v} for k, v in index.items()}
+    for display_name, v in index.items():
+        v["nav_pages"] = [x["nav_page"] for x in v["pages"].values()]
+        if "detail" in v["pages"]:
+            detail = v["pages"]["detail"]
+            dropdown = []
+            if "overview" in v["pages"]:
+                overview = v["pages"]["overview"]
+                dropdown.append(
+                    {
+                        "type": "header",
+                        "header_name": "Overview"
+                    }
+                )
+                dropdown.append(
+                    {
+                        "type": "ref",
+                        "nav_page": overview["nav_page"],
+                        "nav_kwargs": {},
+                        "nav_display": f"Overview {display_name}"
+                    }
+                )
+                dropdown.append(
+                    {
+                        "type": "header",
+                        "header_name": "Detail view"
+                    }
+                )
+            for row in detail["rows"]:
+                dropdown.append(
+                    {
+                        "type": "ref",
+                        "nav_page": detail["nav_page"],
+                        "nav_kwargs": row[0],
+                        "nav_display": row[1]
+                    }
+                )
+            v["dropdown"] = dropdown
+        else:
+            overview = v["pages"]["overview"]
+            v["non_dropdown"] = [
+                {
+                    "type": "ref",
+                    "nav_page": overview["nav_page"],
+                    "nav_display": display_name
+                }
+            ]
+    return index
+
+
+# kind -> (the table of its entities, None for the one index, the function building a document)
+DOC_KINDS = {
+    "index": (None, create_index),
+    "event_occ": ("EventOcc", event_occ_doc),
+    "event_gen": ("EventGen", event_series_doc),
+    "song_perform": ("SongPerform", performed_song_doc),
+    "song": ("Song", song_doc),
+    "person": ("Person", player_doc),
+    "venue": ("Venue", venue_doc),
+}
+
+
+def sync_documents(db_file, force=False):
+    """
+    Build the documents of `db_file` that are missing or out of date, see `sync_entity_docs`.
+    Run by the ingestion scripts, after they change the DB.
+    """
+    graphene_session = GrapheneSQLSession.from_sqlite_file(db_file, object_graph=True, track=True)
+    try:
+        stats = sync_entity_docs(graphene_session, DOC_KINDS, force=force)
+    finally:
+        graphene_session.graph_store.engine.dispose()
+    if stats is not None:
+        print(
+            f"    Documents built: {stats['built']}, unchanged: {stats['unchanged']}, "
+            f"deleted: {stats['deleted']}"
+        )
+    return stats
@@ -0,0 +1,196 @@
+import json
+
+import sqlalchemy
+
+from .build_cache import digest
+from .sqlstats import instrument_engine
+
+# One JSON document per entity, e.g., all a detail page shows of one song, and the digests of
+# the rows they were built from, to tell which rows changed since
+ENTITY_DOC_TABLE = "_entity_doc"
+ENTITY_DOC_ROW_TABLE = "_entity_doc_row"
+ENTITY_DOC_TABLES = [ENTITY_DOC_TABLE, ENTITY_DOC_ROW_TABLE]
+ROW_DIGEST_LENGTH = 16
+
+
+def _dep_key(table_name, key):
+    # keys as JSON, so composite keys compare equal whether they come as tuples or lists;  a key
+    # of None ("null") stands for the whole table
+    return (table_name, json.dumps(key))
+
+
+def row_digests(graph):
+    # (table name, key) -> digest of the row's values, for every record of the `ObjectGraph`
+    return {
+        _dep_key(table_name, record._key()): digest(
+            repr(tuple(getattr(record, col) for col in record._columns))
+        )[:ROW_DIGEST_LENGTH]
+        for table_name, records in graph.records.items()
+        for record in records
+    }
+
+
+def affected_keys(graph, changed):
+    """
+    The keys that documents depending on any of the `changed` rows depend on:  the rows
+    themselves, their whole tables, and the rows they now refer to, since they are (now) in
+    those rows' collections.  Deleted rows were reached by the documents that had them in a
+    collection, so are among those documents' keys already.
+    """
+    affected = set(changed)
+    for table_name, key in changed:
+        affected.add(_dep_key(table_name, None))
+        key = json.loads(key)
+        record = graph.get(table_name, tuple(key) if isinstance(key, list) else key)
+        if record is None:
+            continue
+        for name in record._references:
+            target = getattr(record, name)
+            if target is not None:
+                affected.add(_dep_key(target._table, target._key()))
+    return affected
+
+
+def _has_doc_tables(engine):
+    return sqlalchemy.inspect(engine).has_table(ENTITY_DOC_TABLE)
+
+
+def _read_doc_deps(conn):
+    # (kind, id) -> the keys the document depends on
+    rows = conn.execute(sqlalchemy.text(f"SELECT kind, id, deps FROM {ENTITY_DOC_TABLE}"))
+    return {(kind, id_): {_dep_key(*dep) for dep in json.loads(deps)} for kind, id_, deps in rows}
+
+
+def _read_row_digests(conn):
+    rows = conn.execute(
+        sqlalchemy.text(f"SELECT table_name, row_key, digest FROM {ENTITY_DOC_ROW_TABLE}")
+    )
+    return {(table_name, row_key): row_digest for table_name, row_key, row_digest in rows}
+
+
+def sync_entity_docs(graphene_session, doc_kinds, force=False):
+    """
+    Bring the documents in the `_entity_doc` table up to date with the rest of the DB.
+
+    `doc_kinds` maps each kind of document to the table of its entities, one document per row,
+    (or None, for one document, with id "") and the function `build(graphene_session, id)`,
+    returning the document as a JSON-able dict.  `graphene_session` must resolve queries with a
+    tracking object graph, see `ObjectGraph.tracked`, so each document keeps the keys of the
+    records it was built from.  Only the documents of new entities, and those depending on rows
+    that changed since the last sync, are (re)built, or all of them with `force`.
+
+    Returns the counts of documents built, unchanged and deleted, and of rows changed, or None
+    for DBs without the document tables, i.e., from before they were added.
+    """
+    engine = graphene_session.graph_store.engine
+    if not _has_doc_tables(engine):
+        print(f"No {ENTITY_DOC_TABLE} table in {engine.url.database}, rebuild the DB to add it")
+        return None
+    graph = graphene_session.graph_store.current()
+
+    new_rows = row_digests(graph)
+    with engine.connect() as conn:
+        old_rows = _read_row_digests(conn)
+        old_docs = _read_doc_deps(conn)
+    changed = {
+        key for key in new_rows.keys() | old_rows.keys() if new_rows.get(key) != old_rows.get(key)
+    }
+    affected = affected_keys(graph, changed)
+
+    wanted = [
+        (kind, id_)
+        for kind, (table_name, _) in doc_kinds.items()
+        for id_ in ([""] if table_name is None else graph.indexes[table_name])
+    ]
+    to_build = [
+        doc_key for doc_key in wanted
+        if force or doc_key not in old_docs or not old_docs[doc_key].isdisjoint(affected)
+    ]
+    to_delete = old_docs.keys() - set(wanted)
+
+    docs = []
+    for kind, id_ in to_build:
+        _, build = doc_kinds[kind]
+        doc, deps = graph.tracked(build, graphene_session, id_)
+        deps = sorted(deps, key=lambda dep: _dep_key(*dep))
+        docs.append({"kind": kind, "id": id_, "doc": json.dumps(doc), "deps": json.dumps(deps)})
+
+    with engine.begin() as conn:
+        if len(to_delete) > 0:
+            conn.execute(
+                sqlalchemy.text(f"DELETE FROM {ENTITY_DOC_TABLE} WHERE kind = :kind AND id = :id"),
+                [{"kind": kind, "id": id_} for kind, id_ in to_delete]
+            )
+        if len(docs) > 0:
+            conn.execute(
+                sqlalchemy.text(
+                    f"INSERT OR REPLACE INTO {ENTITY_DOC_TABLE} (kind, id, doc, deps) "
+                    "VALUES (:kind, :id, :doc, :deps)"
+                ),
+                docs
+            )
+        removed = [key for key in changed if key not in new_rows]
+        if len(removed) > 0:
+            conn.execute(
+                sqlalchemy.text(
+                    f"DELETE FROM {ENTITY_DOC_ROW_TABLE} "
+                    "WHERE table_name = :table_name AND row_key = :row_key"
+                ),
+                [{"table_name": table_name, "row_key": row_key} for table_name, row_key in removed]
+            )
+        upserts = [key for key in changed if key in new_rows]
+        if len(upserts) > 0:
+            conn.execute(
+                sqlalchemy.text(
+                    f"INSERT OR REPLACE INTO {ENTITY_DOC_ROW_TABLE} (table_name, row_key, digest) "
+                    "VALUES (:table_name, :row_key, :digest)"
+                ),
+                [
+                    {"table_name": key[0], "row_key": key[1], "digest": new_rows[key]}
+                    for key in upserts
+                ]
+            )
+
+    return {
+        "built": len(to_build),
+        "unchanged": len(wanted) - len(to_build),
+        "deleted": len(to_delete),
+        "rows_changed": len(changed),
+    }
+
+
+class EntityDocStore:
+    """
+    Serves the documents of a DB file, one primary key lookup each.  None for documents that are
+    not there, e.g., for DBs from before the document tables were added.
+    """
+
+    def __init__(self, db_file):
+        self.engine = sqlalchemy.create_engine(
+            f'sqlite:///{db_file}',
+            connect_args={'check_same_thread': False}
+        )
+        instrument_engine(self.engine)
+        # lookups served from a document, and those that were not
+        self.hits = 0
+        self.misses = 0
+
+    def cache_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get(self, kind, id_=""):
+        query = sqlalchemy.text(
+            f"SELECT doc FROM {ENTITY_DOC_TABLE} WHERE kind = :kind AND id = :id"
+        )
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(query, {"kind": kind, "id": id_}).first()
+        except sqlalchemy.exc.OperationalError as exc:
+            if "no such table" not in str(exc):
+                raise
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
@@ -3,6 +3,8 @@ from pathlib import Path
 ME_ID = "paul_k"
 DATA_DIR = Path("data/app_data/paul_k")
 DB_FILE = DATA_DIR / "jamming.db"
+# Filled by `jamdb.linkcheck`, read by the app, so kept here, free of `requests`
+LINK_STATUS_TABLE = "_link_status"
 
 
 TEST_DATA_DIR = Path("data/app_data/testing")
@@ -3,9 +3,35 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.automap import automap_base
 import graphene
 from graphene_sqlalchemy import SQLAlchemyObjectType
+from promise import Promise
+from promise.dataloader import DataLoader
 
-from .globals import DB_FILE
-from .transformations import format_id_as_str, create_embed_link
+from .entity_docs import ENTITY_DOC_TABLES
+from .globals import DB_FILE, LINK_STATUS_TABLE
+from .object_graph import ObjectGraphStore, Record
+from .sqlstats import instrument_engine
+from .ids import format_id_as_str
+
+# SQLite limits the number of variables of a statement
+MAX_LINK_STATUS_BATCH = 500
+
+
+class LinkStatusLoader(DataLoader):
+    """
+    Loads the `LINK_STATUS_TABLE` rows of the links resolved in one query, with one SELECT per
+    batch, rather than one per link.  One per query, as it caches what it loaded.
+    """
+
+    def __init__(self, session, link_status_model):
+        super().__init__(max_batch_size=MAX_LINK_STATUS_BATCH)
+        self.session = session
+        self.link_status_model = link_status_model
+
+    def batch_load_fn(self, links):
+        model = self.link_status_model
+        rows = self.session.query(model).filter(model.link.in_(links)).all()
+        by_link = {row.link: row for row in rows}
+        return Promise.resolve([by_link.get(link) for link in links])
 
 
 def _automap_sqlalchemy_models(sqlalchemy_engine):
@@ -47,18 +73,35 @@ def _create_qraphene_objects(model_classes):
     
         return inner_function
 
-    def add_embeddable_link():
+    class LinkStatusGQL(graphene.ObjectType):
+        status = graphene.Int()
+        ok = graphene.Boolean()
+        error = graphene.String()
+        checked_at = graphene.Float()
+
+    def add_link_status():
+        # Filled by `jamdb.linkcheck`;  null until the link has been checked
+        link_status_model = model_classes.get(LINK_STATUS_TABLE)
 
         def _factory_resolver():
             def inner_func(root, info):
-                return create_embed_link(root.source_id, root.link)
+                if link_status_model is None:
+                    return None
+                graph = info.context.get("graph")
+                if graph is not None:
+                    return graph.get(LINK_STATUS_TABLE, root.link)
+                loader = info.context.get("link_status_loader")
+                if loader is None:
+                    loader = LinkStatusLoader(info.context["session"], link_status_model)
+                    info.context["link_status_loader"] = loader
+                return loader.load(root.link)
             return inner_func
-        
+
         def inner_function(cls):
-            cls._meta.fields["embeddable_link"] = graphene.Field(graphene.String)
-            setattr(cls, "resolve_embeddable_link", _factory_resolver())
+            cls._meta.fields["link_status"] = graphene.Field(LinkStatusGQL)
+            setattr(cls, "resolve_link_status", _factory_resolver())
             return cls
-            
+
         return inner_function
 
     def _personinstruments_to_instruments(personinstruments):
@@ -80,7 +123,7 @@ def _create_qraphene_objects(model_classes):
 
 
     @register_gql("chart")
-    @add_embeddable_link()
+    @add_link_status()
     class ChartGQL(SQLAlchemyObjectType):
         class Meta:
             model = model_classes["Chart"]
@@ -224,7 +267,7 @@ def _create_qraphene_objects(model_classes):
 
 
     @register_gql("performance_video")
-    @add_embeddable_link()
+    @add_link_status()
     class PerformanceVideoGQL(SQLAlchemyObjectType):
         class Meta:
             model = model_classes["PerformanceVideo"]
@@ -335,13 +378,20 @@ def _create_qraphene_objects(model_classes):
 
 
     @register_gql("person_picture")
+    @add_for_collections("variants", lambda: PersonPictureVariantGQL, "personpicturevariant")
     class PersonPictureGQL(SQLAlchemyObjectType):    
         class Meta:
             model = model_classes["PersonPicture"]
 
 
+    @register_gql("person_picture_variant")
+    class PersonPictureVariantGQL(SQLAlchemyObjectType):
+        class Meta:
+            model = model_classes["PersonPictureVariant"]
+
+
     @register_gql("ref_rec")
-    @add_embeddable_link()
+    @add_link_status()
     class RefRecGQL(SQLAlchemyObjectType):
         class Meta:
             model = model_classes["RefRec"]
@@ -458,6 +508,32 @@ def _create_qraphene_objects(model_classes):
             address_string = VenueGQL.resolve_address_string(root, info)
             return f"https://www.google.com/maps/place/{address_string}".replace(" ", "+")
 
+    # Roots are ORM objects, or the `jamdb.object_graph` records of the same table, which have
+    # the same attributes, but no SQLAlchemy mapper
+    def _factory_is_type_of(cls):
+        table_name = cls._meta.model.__table__.name
+        is_orm_type_of = cls.is_type_of
+
+        def inner_func(root, info):
+            if isinstance(root, Record) and root._table == table_name:
+                return True
+            return is_orm_type_of(root, info)
+        return inner_func
+
+    def _factory_resolve_id(resolve_orm_id):
+        def inner_func(root, info):
+            if isinstance(root, Record):
+                return root._key()
+            return resolve_orm_id(root, info)
+        return inner_func
+
+    for cls in _REGISTRY.values():
+        cls.is_type_of = _factory_is_type_of(cls)
+        # the `id` field's resolver was bound when the class was created
+        id_field = cls._meta.fields.get("id")
+        if id_field is not None:
+            id_field.resolver = _factory_resolve_id(id_field.resolver)
+
     return _REGISTRY
 
 
@@ -477,13 +553,29 @@ def _query_factory(gql_classes):
     class Query(graphene.ObjectType):
         pass
     
+    # With an `ObjectGraph` in the context, rows come from it instead of the session
     def _factory_resolver_get_all_from_table(cls):
-        def inner_func(root, info):
-            return cls.get_query(info).all()
+        # With `ids`, only those rows, in the order given, e.g., for one page of a sorted listing
+        table_name = cls._meta.model.__table__.name
+
+        def inner_func(root, info, ids=None):
+            graph = info.context.get("graph")
+            if graph is not None:
+                return graph.rows(table_name, ids)
+            if ids is None:
+                return cls.get_query(info).all()
+            model = cls._meta.model
+            rows = {row.id: row for row in cls.get_query(info).filter(model.id.in_(ids))}
+            return [rows[id] for id in ids if id in rows]
         return inner_func
 
     def _factory_resolver_get_one_from_table(cls):
+        table_name = cls._meta.model.__table__.name
+
         def inner_func(root, info, id):
+            graph = info.context.get("graph")
+            if graph is not None:
+                return graph.get(table_name, id)
             return cls.get_node(info, id)
         return inner_func
 
@@ -495,7 +587,9 @@ def _query_factory(gql_classes):
         # resolve across many objects, thus the fields must be added to the query's _meta.
         
         query_cls._meta.fields[sing] = graphene.Field(cls, id=graphene.ID())
-        query_cls._meta.fields[plural] = graphene.Field(graphene.List(cls))
+        query_cls._meta.fields[plural] = graphene.Field(
+            graphene.List(cls), ids=graphene.List(graphene.ID)
+        )
 
         # add resolvers
         setattr(query_cls, f"resolve_{sing}", _factory_resolver_get_one_from_table(cls))
@@ -509,8 +603,9 @@ def _query_factory(gql_classes):
     return Query
 
 
-def get_graphene_schema(sqlalchemy_engine):
-    sqlalchemy_models = _automap_sqlalchemy_models(sqlalchemy_engine)
+def get_graphene_schema(sqlalchemy_engine, sqlalchemy_models=None):
+    if sqlalchemy_models is None:
+        sqlalchemy_models = _automap_sqlalchemy_models(sqlalchemy_engine)
     graphene_objects = _create_qraphene_objects(sqlalchemy_models)
     graphene_query_cls = _query_factory(graphene_objects)
     graphene_schema = graphene.Schema(query=graphene_query_cls)
@@ -519,22 +614,51 @@ def get_graphene_schema(sqlalchemy_engine):
 
 class GrapheneSQLSession:
 
-    def __init__(self, session, schema):
+    def __init__(self, session, schema, middleware=None, graph_store=None):
         self.session = session
         self.schema = schema
+        # graphene middleware applied to every query, e.g., `jamdb.metrics.ResolverTimingMiddleware`
+        self.middleware = middleware
+        # if given, a `jamdb.object_graph.ObjectGraphStore` to resolve queries against, without SQL
+        self.graph_store = graph_store
 
     @classmethod
-    def from_sqlite_file(cls, sqlite_file=DB_FILE):
+    def from_sqlite_file(
+        cls, sqlite_file=DB_FILE, middleware=None, object_graph=False, track=False
+    ):
+        # `track` makes the object graph note the records each query reaches, see
+        # `ObjectGraph.tracked`
         engine = sqlalchemy.create_engine(
             f'sqlite:///{sqlite_file}',
             connect_args={'check_same_thread': False}
         )
-        schema = get_graphene_schema(engine)
+        instrument_engine(engine)
+        sqlalchemy_models = _automap_sqlalchemy_models(engine)
+        schema = get_graphene_schema(engine, sqlalchemy_models)
+        graph_store = None
+        if object_graph:
+            # the documents are built from the graph, not part of it
+            graph_models = {
+                name: model for name, model in sqlalchemy_models.items()
+                if name not in ENTITY_DOC_TABLES
+            }
+            graph_store = ObjectGraphStore(engine, graph_models, track=track)
         
         Session = sessionmaker(bind=engine)
         session = Session()
 
-        return cls(session=session, schema=schema)
+        return cls(session=session, schema=schema, middleware=middleware, graph_store=graph_store)
+
+    def context(self):
+        # The graph is fetched once per query, so a query sees one version of the DB, even if a
+        # new one is swapped in meanwhile
+        context = {'session': self.session}
+        if self.graph_store is not None:
+            context['graph'] = self.graph_store.current()
+        return context
 
     def execute(self, query, variables=None):
-        return self.schema.execute(query, variables=variables, context_value={'session': self.session})
+        return self.schema.execute(
+            query, variables=variables, context_value=self.context(),
+            middleware=self.middleware
+        )
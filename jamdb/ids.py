@@ -0,0 +1,16 @@
+# Id helpers, kept free of pandas, so the app can use them without importing it
+
+
+def id_from_name(name):
+    return name.lower().strip().replace(" ", "_")
+
+
+def format_id_as_str(x):
+    # Some ids are strs that look like nums, and pandas will cast them to float.
+    # This undoes that.
+    try:
+        x = float(x)
+        x = f"{x:.0f}"
+    except ValueError:
+        pass
+    return x
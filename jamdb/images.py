@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from PIL import Image, ImageOps
+
+from .build_cache import digest, file_digest
+
+# Longest edge, in pixels, of each derived variant
+PICTURE_VARIANTS = {"thumb": 160, "web": 800}
+# Bump when changing how derivatives are rendered, so existing ones are regenerated
+DERIVATIVE_VERSION = "1"
+DERIVED_PICTURES_DIR = Path("derived") / "pictures"
+
+
+def _render_derivative(src_file, dest_file, max_edge):
+    with Image.open(src_file) as img:
+        # phones store rotation in EXIF, bake it in since we drop EXIF
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = dest_file.with_name(f"{dest_file.name}.tmp")
+        img.save(tmp_file, format="JPEG", quality=82, optimize=True, progressive=True)
+        tmp_file.replace(dest_file)
+
+
+def make_derivative(data_dir, link, variant, max_edge):
+    """
+    Render one variant of the picture at `data_dir / link`.
+
+    Derivatives are content addressed, i.e., named by the digest of the source file and the
+    rendering settings, so one that already exists is never rendered again.
+    """
+    data_dir = Path(data_dir)
+    key = digest(file_digest(data_dir / link), str(max_edge), DERIVATIVE_VERSION)
+    derived_link = DERIVED_PICTURES_DIR / key[:2] / f"{key}.jpg"
+    dest_file = data_dir / derived_link
+
+    if not dest_file.exists():
+        _render_derivative(data_dir / link, dest_file, max_edge)
+
+    with Image.open(dest_file) as img:
+        width, height = img.size
+    return {
+        "variant": variant,
+        "source_id": "jpg",
+        "link": str(derived_link),
+        "width": width,
+        "height": height,
+    }
+
+
+def _make_derivative_job(job):
+    person_picture_id, data_dir, link, variant, max_edge = job
+    return {"person_picture_id": person_picture_id, **make_derivative(data_dir, link, variant, max_edge)}
+
+
+def prune_derivatives(data_dir, keep_links):
+    derived_dir = Path(data_dir) / DERIVED_PICTURES_DIR
+    keep_links = {str(x) for x in keep_links}
+    removed = 0
+    for path in derived_dir.rglob("*.jpg"):
+        if str(path.relative_to(data_dir)) not in keep_links:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def make_person_picture_variants(data_dir, person_pictures, variants=None, max_workers=None):
+    """
+    PersonPictureVariant rows for the `person_pictures` rows, rendering derivatives as needed.
+
+    Rendering is CPU bound, so it is spread over a process pool.  Derivatives no longer referred
+    to by any picture are removed.
+    """
+    variants = variants or PICTURE_VARIANTS
+    jobs = [
+        (row["id"], str(data_dir), row["link"], variant, max_edge)
+        for _, row in person_pictures.iterrows()
+        for variant, max_edge in variants.items()
+    ]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        rows = list(pool.map(_make_derivative_job, jobs, chunksize=4))
+
+    prune_derivatives(data_dir, [row["link"] for row in rows])
+
+    picture_variants = pd.DataFrame(
+        rows, columns=["person_picture_id", "variant", "source_id", "link", "width", "height"]
+    )
+    picture_variants.insert(
+        0, "id", picture_variants["person_picture_id"] + ":" + picture_variants["variant"]
+    )
+    return picture_variants
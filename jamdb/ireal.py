@@ -0,0 +1,183 @@
+import re
+from pathlib import Path
+
+from .matching import normalize_song_name
+
+IREAL_HOST = "irealb://"
+CHUNK_SIZE = 1 << 16
+# Longer than any token we search for, so a token split across chunks is still found
+_OVERLAP = 32
+
+# Songs in the playlist are listed as "1. Name - Composer<br>2. Name - Composer<br>...</p>".
+# Matches the separator before an item number, or the end of the list.
+_NAME_SEPARATOR = re.compile(r"(?: |<br ?/?>)(\d+)\. |</p>")
+_BR = re.compile(r"<br ?/?>")
+
+
+class _TextStream:
+    """
+    Forward only cursor over a text file.
+
+    Only the unconsumed tail of the current chunk is buffered, and searches never rescan text
+    they have already looked at, so a full pass is linear in the file size with flat memory.
+    """
+
+    def __init__(self, fh, chunk_size=CHUNK_SIZE):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.fh.read(self.chunk_size)
+        if chunk == "":
+            self.eof = True
+        # drop what has been consumed, rather than growing the buffer forever
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def _search(self, find):
+        # `find(start)` returns a match at or after `start`, or None.  Refill until it matches.
+        start = self.pos
+        while True:
+            match = find(start)
+            if match is not None or self.eof:
+                return match
+            # anything that could still start a match lies within the last few chars
+            start = max(self.pos, len(self.buf) - _OVERLAP) - self.pos
+            self._fill()
+
+    def skip_past(self, token):
+        def find(start):
+            idx = self.buf.find(token, start)
+            return None if idx < 0 else idx
+        idx = self._search(find)
+        if idx is None:
+            raise ValueError(f"{token!r} not found")
+        self.pos = idx + len(token)
+
+    def iter_split(self, sep, end):
+        """
+        Yield the pieces of the text up to `end`, split on `sep`.
+        """
+        def find(start):
+            sep_idx = self.buf.find(sep, start)
+            # only look for `end` before the next `sep`, rather than through the rest of the buffer
+            end_idx = self.buf.find(end, start, None if sep_idx < 0 else sep_idx)
+            if end_idx >= 0:
+                return end_idx
+            return None if sep_idx < 0 else sep_idx
+
+        while True:
+            idx = self._search(find)
+            if idx is None:
+                raise ValueError(f"{end!r} not found")
+            piece = self.buf[self.pos:idx]
+            if self.buf.startswith(end, idx):
+                self.pos = idx + len(end)
+                yield piece
+                return
+            self.pos = idx + len(sep)
+            yield piece
+
+    def iter_numbered(self):
+        """
+        Yield the items of a "1. x<br>2. y<br>...</p>" list.
+
+        A number only starts a new item if it is the next number in sequence, so names which
+        themselves contain e.g. " 2. " are not split.
+        """
+        expected = 2
+
+        def find(start):
+            while True:
+                match = _NAME_SEPARATOR.search(self.buf, start)
+                if match is None:
+                    return None
+                if match.group(1) is None or int(match.group(1)) == expected:
+                    return match
+                start = match.end()
+
+        while True:
+            match = self._search(find)
+            if match is None:
+                raise ValueError("End of playlist names not found")
+            item = self.buf[self.pos:match.start()]
+            self.pos = match.end()
+            yield item
+            if match.group(1) is None:
+                return
+            expected += 1
+
+
+def _song_from_entry(name, href):
+    name = _BR.sub(" ", name).strip()
+    for ex_name in ["Blues", "Modal"]:
+        if name.startswith(f"{ex_name} - "):
+            name = name.replace(f"{ex_name} - ", f"{ex_name} : ")
+    try:
+        song_name, composers = name.split(" - ", 1)
+    except ValueError as exc:
+        print(f"{name}; {exc}")
+        song_name = name.strip()
+        composers = ""
+    song_name = song_name.strip()
+    song_name = song_name.replace("(RBB)", "").strip()
+    if song_name.endswith(", The"):
+        song_name = ("The " + song_name[:-len(", The")]).strip()
+
+    return {
+        "song_name": song_name,
+        "composers": composers.strip(),
+        "i_real_href": f"{IREAL_HOST}{href}",
+        "dirty_name": name,
+        "normalized_name": normalize_song_name(song_name)
+    }
+
+
+def _iter_hrefs(fh, chunk_size):
+    stream = _TextStream(fh, chunk_size)
+    stream.skip_past("<body")
+    stream.skip_past("<h3>")
+    stream.skip_past(IREAL_HOST)
+    hrefs = stream.iter_split("===", '">')
+    previous = next(hrefs).lstrip()
+    # The last piece is not a song (it appears to be the playlist name), so always hold one back
+    for href in hrefs:
+        yield previous
+        previous = href
+
+
+def _iter_names(fh, chunk_size):
+    stream = _TextStream(fh, chunk_size)
+    stream.skip_past("<body")
+    stream.skip_past("</h3>")
+    stream.skip_past("<p>")
+    for idx, name in enumerate(stream.iter_numbered()):
+        if idx == 0:
+            name = name.lstrip()
+            if name.startswith("1. "):
+                name = name[3:]
+        yield name
+
+
+def iter_ireal_playlist_html(html_file, chunk_size=CHUNK_SIZE):
+    """
+    Yield the songs of an iReal playlist html export, one at a time.
+
+    The export holds all the `irealb://` hrefs (joined by "===") in one link, followed by the
+    numbered list of song names.  The two sections are streamed through separate cursors over
+    the file and zipped together.
+    """
+    # export playlist from iReal and save to disk to get the html file
+    html_file = Path(html_file)
+    with open(html_file) as href_fh, open(html_file) as names_fh:
+        for href, name in zip(
+            _iter_hrefs(href_fh, chunk_size), _iter_names(names_fh, chunk_size), strict=True
+        ):
+            yield _song_from_entry(name, href)
+
+
+def parse_ireal_playlist_html(html_file, chunk_size=CHUNK_SIZE):
+    return list(iter_ireal_playlist_html(html_file, chunk_size))
@@ -4,6 +4,12 @@ DROP TABLE IF EXISTS [_schema_tables];
 
 DROP TABLE IF EXISTS [_schema_columns];
 
+DROP TABLE IF EXISTS [_link_status];
+
+DROP TABLE IF EXISTS [_entity_doc];
+
+DROP TABLE IF EXISTS [_entity_doc_row];
+
 DROP TABLE IF EXISTS [Chart];
 
 DROP TABLE IF EXISTS [Composer];
@@ -30,6 +36,8 @@ DROP TABLE IF EXISTS [Person];
 
 DROP TABLE IF EXISTS [PersonPicture];
 
+DROP TABLE IF EXISTS [PersonPictureVariant];
+
 DROP TABLE IF EXISTS [PersonInstrument];
 
 DROP TABLE IF EXISTS [PerformanceVideo];
@@ -68,6 +76,32 @@ CREATE TABLE _schema_columns (
 	FOREIGN KEY (table_name) REFERENCES _schema_tables (table_name)
 );
 
+CREATE TABLE _link_status (
+	link	TEXT	NOT NULL,
+	status	INT,
+	ok	INT	NOT NULL,
+	error	TEXT	DEFAULT "",
+	etag	TEXT,
+	last_modified	TEXT,
+	checked_at	REAL	NOT NULL,
+	PRIMARY KEY	(link)
+);
+
+CREATE TABLE _entity_doc (
+	kind	TEXT	NOT NULL,
+	id	TEXT	NOT NULL,
+	doc	TEXT	NOT NULL,
+	deps	TEXT	NOT NULL,
+	PRIMARY KEY	(kind, id)
+);
+
+CREATE TABLE _entity_doc_row (
+	table_name	TEXT	NOT NULL,
+	row_key	TEXT	NOT NULL,
+	digest	TEXT	NOT NULL,
+	PRIMARY KEY	(table_name, row_key)
+);
+
 CREATE TABLE LinkSource (
     id	TEXT	NOT NULL,
 	rank	INT	NOT NULL	UNIQUE,
@@ -108,6 +142,20 @@ CREATE TABLE PersonPicture (
 	FOREIGN KEY (source_id) REFERENCES LinkSource (id)
 );
 
+CREATE TABLE PersonPictureVariant (
+	id	TEXT	NOT NULL,
+	person_picture_id	TEXT	NOT NULL,
+	variant	TEXT	NOT NULL,
+	source_id	TEXT	NOT NULL,
+	link	TEXT	NOT NULL,
+	width	INTEGER	NOT NULL,
+	height	INTEGER	NOT NULL,
+	PRIMARY KEY	(id),
+	FOREIGN KEY (person_picture_id) REFERENCES PersonPicture (id),
+	FOREIGN KEY (source_id) REFERENCES LinkSource (id),
+	UNIQUE(person_picture_id, variant)
+);
+
 CREATE TABLE ContactType (
 	id	TEXT	NOT NULL,
 	display_name	TEXT	NOT NULL	UNIQUE,
@@ -234,6 +282,7 @@ CREATE TABLE RefRec (
 	source_id	TEXT	NOT NULL,
 	link	TEXT	NOT NULL	UNIQUE,
 	display_name	TEXT	DEFAULT "",
+	embeddable_link	TEXT	DEFAULT "",
 	PRIMARY KEY	(id),
 	FOREIGN KEY (song_id) REFERENCES Song (id),
 	FOREIGN KEY (source_id) REFERENCES LinkSource (id)
@@ -245,6 +294,7 @@ CREATE TABLE Chart (
 	source_id	TEXT	NOT NULL,
 	link	TEXT	NOT NULL	UNIQUE,
 	display_name	TEXT	DEFAULT "",    
+	embeddable_link	TEXT	DEFAULT "",
 	PRIMARY KEY	(id),
 	FOREIGN KEY (song_id) REFERENCES Song (id),
 	FOREIGN KEY (source_id) REFERENCES LinkSource (id)
@@ -290,6 +340,7 @@ CREATE TABLE PerformanceVideo (
 	source_id	TEXT	NOT NULL,
 	link	TEXT	NOT NULL	UNIQUE,
 	display_name	TEXT	DEFAULT "",
+	embeddable_link	TEXT	DEFAULT "",
     PRIMARY KEY (id),
 	FOREIGN KEY (song_perform_id) REFERENCES SongPerform (id),
 	FOREIGN KEY (source_id) REFERENCES LinkSource (id)
@@ -313,6 +364,7 @@ INSERT INTO _schema_tables (table_name, description) VALUES
 	("PerformanceVideo", "Video link for a performed song."),
 	("Person", "Public Information about a person."),
 	("PersonPicture", "Links to person pictures."),
+	("PersonPictureVariant", "Links to resized, web optimized versions of person pictures, generated from `PersonPicture`."),
 	("PersonInstrument", "Which instruments are played by a given person."),
 	("RefRec", "Links to reference recordings of songs."),
 	("Setlist", "Setlist information."),
@@ -331,6 +383,7 @@ INSERT INTO _schema_columns (table_name, column, description) VALUES
 	("Chart", "source_id", "Unique ID of the chart's source, e.g., web link or ireal, etc."),
 	("Chart", "link", "Link, etc., url or uri"),
 	("Chart", "display_name", "Human readable name of link"),
+	("Chart", "embeddable_link", "Link to embed in a page, e.g., a YouTube or Spotify player, if any"),
 	("Composer", "id", "Unique ID for Composer."),
 	("Composer", "composer", "Composer name."),
 	("Contact", "id", "Unique ID for Contact info."),
@@ -370,6 +423,7 @@ INSERT INTO _schema_columns (table_name, column, description) VALUES
 	("PerformanceVideo", "source_id", "Unique ID of the recording's source, e.g., youtube or spotify, etc."),
 	("PerformanceVideo", "link", "Link, etc., url or uri"),
 	("PerformanceVideo", "display_name", "Human readable name of link"),    
+	("PerformanceVideo", "embeddable_link", "Link to embed in a page, e.g., a YouTube or Spotify player, if any"),
 	("Person", "id", "Unique ID for Person."),
 	("Person", "public_name", "Person's publicly used name, typically their first name and last initial."),
 	("Person", "full_name", "Person's full name."),
@@ -380,11 +434,19 @@ INSERT INTO _schema_columns (table_name, column, description) VALUES
 	("PersonPicture", "person_id", "ID for picture's person."),
 	("PersonPicture", "source_id", "Unique ID of photo's source, e.g, jpg vs png etc."),
 	("PersonPicture", "link", "Link to picture."),
+	("PersonPictureVariant", "id", "Unique ID for PersonPictureVariant."),
+	("PersonPictureVariant", "person_picture_id", "ID of the original PersonPicture."),
+	("PersonPictureVariant", "variant", "Name of the variant, e.g., 'thumb' or 'web'."),
+	("PersonPictureVariant", "source_id", "Unique ID of the variant's image format, e.g, jpg vs png etc."),
+	("PersonPictureVariant", "link", "Link to the variant.  Links are content addressed, so never change content."),
+	("PersonPictureVariant", "width", "Width of the variant in pixels."),
+	("PersonPictureVariant", "height", "Height of the variant in pixels."),
 	("RefRec", "id", "Unique ID of the RefRec."),
 	("RefRec", "song_id", "ID of the RefRec's song"),
 	("RefRec", "source_id", "Unique ID of the recording's source type, e.g., YouTube or Spotify, etc."),
 	("RefRec", "link", "Link, etc., url or uri"),
 	("RefRec", "display_name", "Human readable name of link"),
+	("RefRec", "embeddable_link", "Link to embed in a page, e.g., a YouTube or Spotify player, if any"),
 	("Setlist", "id", "Unique ID for SetList."),
 	("Setlist", "setlist", "Name of the SetList."),
 	("Setlist", "description", "Description of the SetList."),
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import sqlalchemy
+
+from .globals import LINK_STATUS_TABLE
+
+# Tables whose `link`s point at external sites
+LINK_TABLES = ["Chart", "RefRec", "PerformanceVideo"]
+DEFAULT_TTL = 7 * 24 * 60 * 60
+CHUNK_SIZE = 500
+# Some sites answer HEAD with one of these, even though the page is fine
+_HEAD_NOT_SUPPORTED = {403, 405, 501}
+_USER_AGENT = "jamdb-linkcheck"
+
+
+def iter_links(db_handler, table_names=LINK_TABLES, chunk_size=CHUNK_SIZE):
+    """
+    Yield chunks of the distinct http(s) links in `table_names`.
+    """
+    union = " UNION ".join(f"SELECT link FROM {table_name}" for table_name in table_names)
+    # keyset paging, each chunk starts after the last link of the one before
+    query = sqlalchemy.text(
+        f"SELECT link FROM ({union}) WHERE link LIKE 'http%' AND link > :last "
+        "ORDER BY link LIMIT :limit"
+    )
+    last = ""
+    while True:
+        with db_handler.Session.begin() as session:
+            links = [row[0] for row in session.execute(query, {"limit": chunk_size, "last": last})]
+        if len(links) == 0:
+            return
+        yield links
+        last = links[-1]
+
+
+def read_link_status(session, links):
+    if len(links) == 0:
+        return {}
+    query = sqlalchemy.text(
+        f"SELECT * FROM {LINK_STATUS_TABLE} WHERE link IN :links"
+    ).bindparams(sqlalchemy.bindparam("links", expanding=True))
+    return {row.link: dict(row._mapping) for row in session.execute(query, {"links": list(links)})}
+
+
+def write_link_status(session, results):
+    if len(results) == 0:
+        return
+    session.execute(
+        sqlalchemy.text(
+            f"""
+            INSERT OR REPLACE INTO {LINK_STATUS_TABLE}
+                (link, status, ok, error, etag, last_modified, checked_at)
+            VALUES (:link, :status, :ok, :error, :etag, :last_modified, :checked_at)
+            """
+        ),
+        results
+    )
+
+
+def check_link(http_session, link, previous=None, timeout=10):
+    """
+    Check one link, returning its `_link_status` row.
+
+    A HEAD request is tried first, falling back to GET for sites that don't support HEAD.  If the
+    link was checked before, the request is conditional, and a 304 keeps the previous status.
+    """
+    headers = {"User-Agent": _USER_AGENT}
+    if previous is not None and previous["ok"]:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    result = {"link": link, "status": None, "ok": False, "error": "", "etag": None, "last_modified": None}
+    try:
+        response = http_session.head(link, headers=headers, timeout=timeout, allow_redirects=True)
+        if response.status_code in _HEAD_NOT_SUPPORTED:
+            # stream, so we don't download the body just to throw it away
+            response = http_session.get(
+                link, headers=headers, timeout=timeout, allow_redirects=True, stream=True
+            )
+            response.close()
+    except requests.RequestException as exc:
+        result["error"] = f"{exc.__class__.__name__}: {exc}"
+        result["checked_at"] = time.time()
+        return result
+
+    if response.status_code == 304 and previous is not None:
+        result.update({x: previous[x] for x in ["status", "etag", "last_modified"]})
+        result["ok"] = True
+    else:
+        result["status"] = response.status_code
+        result["ok"] = response.status_code < 400
+        result["etag"] = response.headers.get("ETag")
+        result["last_modified"] = response.headers.get("Last-Modified")
+        if not result["ok"]:
+            result["error"] = response.reason or ""
+    result["checked_at"] = time.time()
+    return result
+
+
+class LinkChecker:
+    """
+    Checks links concurrently, caching results in the `_link_status` table.
+
+    Requests run in threads driven by asyncio, with at most `concurrency` in flight overall and
+    `per_host` in flight to any one host, so no single site gets hammered.  Links checked less
+    than `ttl` seconds ago are not checked again.
+    """
+
+    def __init__(self, db_handler, concurrency=32, per_host=4, ttl=DEFAULT_TTL, timeout=10):
+        self.db_handler = db_handler
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.ttl = ttl
+        self.timeout = timeout
+
+    def _http_session(self):
+        http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.concurrency, pool_maxsize=self.per_host
+        )
+        http_session.mount("http://", adapter)
+        http_session.mount("https://", adapter)
+        return http_session
+
+    async def _check_chunk(self, http_session, links, previous, host_limits, limit):
+        async def check(link):
+            host = urlsplit(link).netloc.lower()
+            # the host's slot first, so links waiting on a busy host do not hold global slots
+            async with host_limits[host], limit:
+                return await asyncio.to_thread(
+                    check_link, http_session, link, previous.get(link), self.timeout
+                )
+        return await asyncio.gather(*[check(link) for link in links])
+
+    async def _run(self, chunks, force):
+        stats = {"checked": 0, "cached": 0, "broken": 0}
+        limit = asyncio.Semaphore(self.concurrency)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        # the default executor would cap the number of threads below `concurrency`
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(self.concurrency))
+        http_session = self._http_session()
+
+        for links in chunks:
+            with self.db_handler.Session.begin() as session:
+                previous = read_link_status(session, links)
+            now = time.time()
+            fresh = {
+                link for link, row in previous.items()
+                if not force and now - row["checked_at"] < self.ttl
+            }
+            stats["cached"] += len(fresh)
+            to_check = [link for link in links if link not in fresh]
+
+            results = await self._check_chunk(http_session, to_check, previous, host_limits, limit)
+            with self.db_handler.Session.begin() as session:
+                write_link_status(session, results)
+            stats["checked"] += len(results)
+            stats["broken"] += sum(1 for result in results if not result["ok"])
+        return stats
+
+    def run(self, table_names=LINK_TABLES, chunk_size=CHUNK_SIZE, force=False):
+        """
+        Check all the links in `table_names`, a chunk at a time.  Returns counts of links checked,
+        skipped as still fresh in the cache, and found broken.
+        """
+        chunks = iter_links(self.db_handler, table_names, chunk_size)
+        return asyncio.run(self._run(chunks, force))
+
+
+def broken_links(db_handler, table_names=LINK_TABLES):
+    # rows whose link was found broken, with the table they are in
+    queries = [
+        f"""
+        SELECT '{table_name}' AS table_name, t.id, t.link, s.status, s.error, s.checked_at
+        FROM {table_name} t JOIN {LINK_STATUS_TABLE} s ON s.link = t.link
+        WHERE NOT s.ok
+        """
+        for table_name in table_names
+    ]
+    with db_handler.Session.begin() as session:
+        rows = session.execute(sqlalchemy.text(" UNION ALL ".join(queries) + " ORDER BY 1, 3"))
+        return [dict(row._mapping) for row in rows]
@@ -0,0 +1,198 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+
+def fk_dependency_graph(db_handler, table_names, produced_by=None):
+    """
+    Map each table to the set of tables it refers to via FKs, restricted to `table_names`.
+
+    `produced_by` maps tables whose rows are created while loading another table (e.g.,
+    `SongPerformer` rows come out of `SongPerform`) to that table.  Such tables are folded into
+    their producer, so the producer inherits their FK dependencies.
+    """
+    produced_by = produced_by or {}
+
+    def _node(table_name):
+        return produced_by.get(table_name, table_name)
+
+    nodes = {_node(table_name) for table_name in table_names}
+    graph = {node: set() for node in nodes}
+    for table_name in table_names:
+        node = _node(table_name)
+        for fk in db_handler.get_fks_for_table(table_name):
+            referred = _node(fk["referred_table"])
+            if referred in nodes and referred != node:
+                graph[node].add(referred)
+    return graph
+
+
+def topological_order(graph):
+    # Emit tables level by level, sorted within each level, so the order is deterministic.
+    sorter = TopologicalSorter(graph)
+    sorter.prepare()
+    order = []
+    while sorter.is_active():
+        ready = sorted(sorter.get_ready())
+        order.extend(ready)
+        sorter.done(*ready)
+    return order
+
+
+class LoadCheckpoint:
+    """
+    Records which tables have been committed, so a failed load can resume where it stopped.
+    """
+
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = Path(checkpoint_file)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({str(self.checkpoint_file)!r})"
+
+    def exists(self):
+        return self.checkpoint_file.exists()
+
+    def completed(self):
+        try:
+            return json.loads(self.checkpoint_file.read_text())["completed"]
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, completed):
+        # write then rename, so a crash mid-write never leaves a corrupt checkpoint behind
+        tmp_file = self.checkpoint_file.with_name(f"{self.checkpoint_file.name}.tmp")
+        tmp_file.write_text(json.dumps({"completed": completed}, indent=2))
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def start(self):
+        self._write({})
+
+    def mark_done(self, table_name, stats):
+        completed = self.completed()
+        completed[table_name] = stats
+        self._write(completed)
+
+    def clear(self):
+        if self.checkpoint_file.exists():
+            os.remove(self.checkpoint_file)
+
+
+def _timed_call(func, table_name):
+    start = time.perf_counter()
+    result = func(table_name)
+    return result, time.perf_counter() - start
+
+
+def _default_load(db_handler, table_name, df, session):
+    db_handler.insert(table_name, df.to_dict(orient="records"), session=session)
+
+
+class LoadPlanner:
+    """
+    Loads tables into the DB in FK order.
+
+    * `extract(table_name)` parses / transforms the source data for a table.  Extracts do not
+      touch the DB, so they all run concurrently in `executor_cls`.  For process pools,
+      `extract` must be picklable.
+    * `load(db_handler, table_name, data, session)` writes the extracted data.  Loads are
+      committed one table at a time, in topological order of the reflected FKs.  It may return
+      a dict of `{table_name: row_count}` when it writes to more than one table, otherwise
+      the row count is taken to be `len(data)`.
+    """
+
+    def __init__(
+        self, db_handler, extract, load=_default_load, table_names=None, produced_by=None,
+        checkpoint=None, executor_cls=ThreadPoolExecutor, max_workers=None
+    ):
+        self.db_handler = db_handler
+        self.extract = extract
+        self.load = load
+        self.produced_by = produced_by or {}
+        self.checkpoint = checkpoint
+        self.executor_cls = executor_cls
+        self.max_workers = max_workers
+
+        if table_names is None:
+            # underscore tables are not source data, e.g., `_schema_tables` is populated by the sql
+            # file itself, and `_link_status` by the link checker
+            table_names = [x for x in db_handler.tables() if not x.startswith("_")]
+        self.table_names = list(table_names)
+
+    def order(self):
+        graph = fk_dependency_graph(self.db_handler, self.table_names, self.produced_by)
+        return topological_order(graph)
+
+    def run(self, session=None):
+        """
+        Run the load, returning a list of per-table stats.
+
+        If `session` is provided, everything is written inside the caller's transaction and no
+        checkpoints are recorded, as nothing is committed until the caller commits.
+        """
+        completed = {}
+        if self.checkpoint is not None and session is None:
+            completed = self.checkpoint.completed()
+
+        stats = [
+            {"table": table_name, **table_stats, "resumed": True}
+            for table_name, table_stats in completed.items()
+        ]
+        pending = [x for x in self.order() if x not in completed]
+
+        with self.executor_cls(max_workers=self.max_workers) as pool:
+            futures = {
+                table_name: pool.submit(_timed_call, self.extract, table_name)
+                for table_name in pending
+            }
+            for table_name in pending:
+                try:
+                    data, extract_seconds = futures[table_name].result()
+                except BaseException:
+                    # no point in parsing the rest, if we can't load this table
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+
+                start = time.perf_counter()
+                if session is None:
+                    with self.db_handler.Session.begin() as table_session:
+                        rows = self.load(self.db_handler, table_name, data, table_session)
+                else:
+                    rows = self.load(self.db_handler, table_name, data, session)
+                load_seconds = time.perf_counter() - start
+
+                if rows is None:
+                    rows = {table_name: len(data)}
+                table_stats = {
+                    "rows": rows,
+                    "extract_seconds": extract_seconds,
+                    "load_seconds": load_seconds,
+                }
+                if self.checkpoint is not None and session is None:
+                    self.checkpoint.mark_done(table_name, table_stats)
+                stats.append({"table": table_name, **table_stats, "resumed": False})
+
+        return stats
+
+
+def format_load_report(stats):
+    lines = [f"{'table':<20} {'rows':>8} {'extract (s)':>12} {'load (s)':>10}"]
+    for row in stats:
+        for idx, (table_name, count) in enumerate(row["rows"].items()):
+            if idx == 0:
+                note = "  (from checkpoint)" if row["resumed"] else ""
+                lines.append(
+                    f"{table_name:<20} {count:>8} {row['extract_seconds']:>12.3f} "
+                    f"{row['load_seconds']:>10.3f}{note}"
+                )
+            else:
+                lines.append(f"  {table_name:<18} {count:>8}")
+    total_rows = sum(sum(row["rows"].values()) for row in stats)
+    total_extract = sum(row["extract_seconds"] for row in stats)
+    total_load = sum(row["load_seconds"] for row in stats)
+    lines.append(f"{'total':<20} {total_rows:>8} {total_extract:>12.3f} {total_load:>10.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,229 @@
+import math
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+# The table of each kind of id a detail page or query takes
+ID_TABLES = {
+    "event_occ": "EventOcc",
+    "event_gen": "EventGen",
+    "song_perform": "SongPerform",
+    "song": "Song",
+    "person": "Person",
+    "venue": "Venue",
+}
+# Default weight of each route, by kind, i.e., each detail page is requested twice as often as
+# each overview
+DEFAULT_WEIGHTS = {"overview": 1.0, "detail": 2.0, "graphql": 0.5}
+PERCENTILES = (50, 95, 99)
+
+
+def random_ids(db_file, num_ids=50, seed=0):
+    """
+    Up to `num_ids` random ids of each of `ID_TABLES`, read straight from the DB.
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(db_file) as conn:
+        ids = {
+            kind: [row[0] for row in conn.execute(f"SELECT id FROM {table_name} ORDER BY id")]
+            for kind, table_name in ID_TABLES.items()
+        }
+    return {kind: rng.sample(vals, min(num_ids, len(vals))) for kind, vals in ids.items()}
+
+
+def build_mix(ids, overview_routes=None, detail_routes=None, graphql_queries=None,
+              graphql_variables=None, weights=None):
+    """
+    The requests to replay, each a dict with the route `name`, `method`, `path`, `json` body (if
+    any) and `weight`.
+
+    * `overview_routes`:  route name -> path
+    * `detail_routes`:  route name -> (path with an `{id}`, kind of id), one request per id
+    * `graphql_queries`:  name -> (query, kind of its `$id`, or None), POSTed to `/graphql`, with
+      `graphql_variables` added to the variables of each
+
+    A route's weight is split evenly over its requests, e.g., over the ids of a detail page.
+    `weights` overrides the default weight by route name, or by kind, see `DEFAULT_WEIGHTS`.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    graphql_variables = graphql_variables or {}
+    routes = []
+    for name, path in (overview_routes or {}).items():
+        routes.append((name, "overview", [{"method": "GET", "path": path, "json": None}]))
+    for name, (path, kind) in (detail_routes or {}).items():
+        route_requests = [
+            {"method": "GET", "path": path.format(id=id_), "json": None}
+            for id_ in ids.get(kind, [])
+        ]
+        routes.append((name, "detail", route_requests))
+    for name, (query, kind) in (graphql_queries or {}).items():
+        if kind is None:
+            variables = [graphql_variables]
+        else:
+            variables = [{**graphql_variables, "id": id_} for id_ in ids.get(kind, [])]
+        route_requests = [
+            {"method": "POST", "path": "/graphql", "json": {"query": query, "variables": vals}}
+            for vals in variables
+        ]
+        routes.append((f"graphql:{name}", "graphql", route_requests))
+
+    mix = []
+    for name, kind, route_requests in routes:
+        weight = weights.get(name, weights[kind])
+        if weight <= 0 or len(route_requests) == 0:
+            continue
+        mix.extend(
+            {"name": name, **request, "weight": weight / len(route_requests)}
+            for request in route_requests
+        )
+    return mix
+
+
+def percentile(sorted_vals, pct):
+    # nearest-rank percentile of already sorted values
+    if len(sorted_vals) == 0:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_vals)), 1)
+    return sorted_vals[rank - 1]
+
+
+class LoadTest:
+    """
+    Replays a weighted random mix of requests (see `build_mix`) against the app at `base_url`
+    from `concurrency` threads, each with its own keep-alive connection, until `num_requests`
+    have been sent or `duration` seconds have passed, whichever comes first.
+
+    The first `warmup` requests are sent, but not counted, e.g., to fill the app's caches.
+    """
+
+    def __init__(self, base_url, mix, concurrency=4, num_requests=None, duration=None, warmup=0,
+                 timeout=60, seed=0):
+        if num_requests is None and duration is None:
+            raise ValueError("Give num_requests, duration, or both")
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.concurrency = concurrency
+        self.num_requests = num_requests
+        self.duration = duration
+        self.warmup = warmup
+        self.timeout = timeout
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._sent = 0
+
+    def _next_request_number(self):
+        # the number of the next request to send, or None once enough have been sent
+        with self._lock:
+            limit = None if self.num_requests is None else self.num_requests + self.warmup
+            if limit is not None and self._sent >= limit:
+                return None
+            self._sent += 1
+            return self._sent
+
+    def _worker(self, worker_idx, deadline, results):
+        rng = random.Random(f"{self.seed}-{worker_idx}")
+        weights = [request["weight"] for request in self.mix]
+        http_session = requests.Session()
+        while deadline is None or time.perf_counter() < deadline:
+            number = self._next_request_number()
+            if number is None:
+                break
+            request = rng.choices(self.mix, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = http_session.request(
+                    request["method"], f"{self.base_url}{request['path']}", json=request["json"],
+                    timeout=self.timeout
+                )
+                status = response.status_code
+                ok = status < 400
+            except requests.RequestException:
+                status = None
+                ok = False
+            if number > self.warmup:
+                results.append((request["name"], start, time.perf_counter(), ok, status))
+
+    def run(self):
+        """
+        Returns a report with, per route and overall, the number of requests, errors, throughput
+        (requests per second) and latency percentiles (in seconds).
+        """
+        results = []
+        start = time.perf_counter()
+        deadline = None if self.duration is None else start + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(idx, deadline, results), daemon=True)
+            for idx in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(results, self.concurrency)
+
+
+def _summarize_latencies(latencies, num_errors, elapsed):
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": num_errors,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else None,
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+    }
+    summary.update({f"p{pct}": percentile(latencies, pct) for pct in PERCENTILES})
+    return summary
+
+
+def summarize(results, concurrency):
+    """
+    Summarize `results`, the (route name, start, end, ok, status) of each request.  Throughput is
+    over the time from the first request to the end of the last, i.e., without the warmup.
+    """
+    elapsed = max(x[2] for x in results) - min(x[1] for x in results) if results else 0.0
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for name, start, end, ok, _ in results:
+        latencies[name].append(end - start)
+        errors[name] += 0 if ok else 1
+    return {
+        "elapsed": elapsed,
+        "concurrency": concurrency,
+        "total": _summarize_latencies(
+            [x[2] - x[1] for x in results], sum(errors.values()), elapsed
+        ),
+        "routes": {
+            name: _summarize_latencies(latencies[name], errors[name], elapsed)
+            for name in sorted(latencies)
+        },
+    }
+
+
+def format_report(report):
+    columns = ["requests", "errors", "throughput", "mean", *(f"p{pct}" for pct in PERCENTILES)]
+    rows = [*report["routes"].items(), ("TOTAL", report["total"])]
+    width = max(len(name) for name, _ in rows)
+    header = f"{'route':<{width}}  " + "  ".join(f"{col:>10}" for col in columns)
+    lines = [
+        f"{report['total']['requests']} requests in {report['elapsed']:.1f}s "
+        f"with concurrency {report['concurrency']} (latencies in ms, throughput in req/s)",
+        header,
+        "-" * len(header),
+    ]
+    for name, summary in rows:
+        vals = []
+        for col in columns:
+            val = summary[col]
+            if val is None:
+                vals.append(f"{'-':>10}")
+            elif col in ("requests", "errors"):
+                vals.append(f"{val:>10d}")
+            elif col == "throughput":
+                vals.append(f"{val:>10.1f}")
+            else:
+                vals.append(f"{val * 1000:>10.1f}")
+        lines.append(f"{name:<{width}}  " + "  ".join(vals))
+    return "\n".join(lines)
@@ -0,0 +1,113 @@
+import re
+from collections import Counter, defaultdict
+
+import sqlalchemy
+
+NGRAM_SIZE = 3
+# A fuzzy match is only accepted automatically if it scores at least this, and beats the runner up
+# by at least the margin.  Anything less confident is left for the name mapping files.
+AUTO_MATCH_SCORE = 0.8
+AUTO_MATCH_MARGIN = 0.1
+
+_PUNCTS = re.compile(r"""[\[\](){},.?!';:\-+="]""")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_song_name(song_name):
+    """
+    Canonical form of a song name, used to match names from iReal, Spotify, etc., to `Song.song`.
+
+    Leading articles, punctuation and case are dropped.  Words are joined by "_".
+    """
+    song_name = song_name.lower().strip()
+    for start in ["a ", "an ", "the "]:
+        if song_name.startswith(start):
+            song_name = song_name[len(start):]
+
+    song_name = _PUNCTS.sub("", song_name)
+    song_name = _WHITESPACE.sub(" ", song_name).strip()
+    song_name = song_name.replace(" ", "_")
+    return song_name
+
+
+def strip_version_suffix(song_name):
+    # Spotify appends the version to track names, e.g., "Autumn Leaves - Remastered 2009", "- Live".
+    # Only for Spotify names, elsewhere " - " can be part of the name, e.g., iReal's "X - Bb".
+    return song_name.split(" - ")[0]
+
+
+def ngrams(normalized_name, n=NGRAM_SIZE):
+    # padded, so short names still have grams, and word starts / ends weigh a bit more
+    padded = f" {normalized_name.replace('_', ' ')} "
+    return {padded[idx:idx + n] for idx in range(max(1, len(padded) - n + 1))}
+
+
+class SongNameIndex:
+    """
+    Inverted n-gram index over song names, for approximate lookup.
+
+    A lookup only visits the songs that share at least one n-gram with the query, rather than
+    every song.  Scores are the Dice coefficient of the n-gram sets, so 1.0 is an exact match
+    (after normalizing) and 0.0 means nothing in common.
+    """
+
+    def __init__(self, song_names, n=NGRAM_SIZE):
+        # `song_names` is {song id: song name}
+        self.n = n
+        self._by_name = defaultdict(list)
+        self._postings = defaultdict(list)
+        self._num_grams = {}
+        for song_id, song_name in song_names.items():
+            normalized_name = normalize_song_name(song_name)
+            self._by_name[normalized_name].append(song_id)
+            grams = ngrams(normalized_name, n)
+            self._num_grams[song_id] = len(grams)
+            for gram in grams:
+                self._postings[gram].append(song_id)
+
+    @classmethod
+    def from_db(cls, db_handler, n=NGRAM_SIZE):
+        with db_handler.Session.begin() as session:
+            rows = session.execute(sqlalchemy.text("SELECT id, song FROM Song")).fetchall()
+        return cls({row[0]: row[1] for row in rows}, n=n)
+
+    def __len__(self):
+        return len(self._num_grams)
+
+    def exact(self, song_name):
+        return list(self._by_name.get(normalize_song_name(song_name), []))
+
+    def lookup(self, song_name, k=5, min_score=0.0):
+        """
+        Top `k` `(song id, score)` pairs for `song_name`, best first.
+        """
+        normalized_name = normalize_song_name(song_name)
+        exact = self._by_name.get(normalized_name, [])
+        grams = ngrams(normalized_name, self.n)
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scores = {
+            song_id: 2 * count / (len(grams) + self._num_grams[song_id])
+            for song_id, count in shared.items()
+        }
+        # distinct names can have the same n-grams, e.g. "aaa" and "aaaa", so exact always wins
+        scores.update({song_id: 1.0 for song_id in exact})
+
+        matches = sorted(
+            ((song_id, score) for song_id, score in scores.items() if score >= min_score),
+            key=lambda x: (-x[1], x[0])
+        )
+        return matches[:k]
+
+    def match(self, song_name, min_score=AUTO_MATCH_SCORE, margin=AUTO_MATCH_MARGIN):
+        """
+        The `(song id, score)` `song_name` confidently matches, or `None`.
+        """
+        matches = self.lookup(song_name, k=2)
+        if len(matches) == 0 or matches[0][1] < min_score:
+            return None
+        if len(matches) == 2 and matches[0][1] - matches[1][1] < margin:
+            return None
+        return matches[0]
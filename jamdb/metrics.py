@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if len(pairs) == 0:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Latencies per label values, in cumulative buckets, as Prometheus histograms are.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # one count per bucket, plus +Inf, then the sum
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1] += value
+
+    def samples(self, labelvalues):
+        # (count, sum) of one series
+        with self._lock:
+            series = self._series.get(tuple(labelvalues))
+            if series is None:
+                return 0, 0.0
+            return sum(series[:-1]), series[-1]
+
+    def render(self):
+        with self._lock:
+            series_items = sorted((key, list(val)) for key, val in self._series.items())
+        lines = []
+        for labelvalues, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Collected:
+    """
+    Values read when the metrics are rendered, from `collect()`, which returns a dict of label
+    values to value.  For things that keep their own counts, e.g., caches.
+    """
+
+    def __init__(self, name, documentation, type_name, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.type_name = type_name
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(self.collect().items())
+        ]
+
+
+class MetricsRegistry:
+    """
+    Metrics of one process, rendered in the Prometheus text format.
+
+    Each worker process keeps its own, so scrape every worker, or aggregate over them.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collected(self, name, documentation, type_name, labelnames, collect):
+        return self._register(Collected(name, documentation, type_name, labelnames, collect))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ResolverTimingMiddleware:
+    """
+    Graphene middleware timing every resolver, per `Type.field`, e.g., `PersonGQL.song_performs`.
+
+    Child fields are resolved after their parent returns, so each time is the resolver's own.
+    Histogram counts are the number of times each field was resolved.
+    """
+
+    metric_name = "jamdb_resolver_seconds"
+
+    def __init__(self, registry):
+        self.histogram = registry.histogram(
+            self.metric_name, "Time spent in each GraphQL resolver", ["field"]
+        )
+
+    def resolve(self, next, root, info, **args):
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            self.histogram.observe(
+                time.perf_counter() - start, f"{info.parent_type.name}.{info.field_name}"
+            )
@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from array import array
+
+import sqlalchemy
+
+
+class Record:
+    """
+    One row of a table in an `ObjectGraph`.  Subclassed per table, with a slot per column, and a
+    property per relationship, named as on the automapped SQLAlchemy model, e.g., `song` and
+    `songperformer_collection` on `SongPerform` records, so the same resolvers work on both.
+    """
+    __slots__ = ("_pos",)
+    _table = None
+    _columns = ()
+    _primary_key = ()
+    # the names of the many-to-one relationships, e.g., `song` on `SongPerform` records
+    _references = ()
+
+    def __init__(self, pos, values):
+        self._pos = pos
+        for name, value in zip(self._columns, values):
+            setattr(self, name, value)
+
+    def _key(self):
+        # as the `ObjectGraph` indexes take it, i.e., composite keys as tuples
+        keys = [getattr(self, name) for name in self._primary_key]
+        return tuple(keys) if len(keys) > 1 else keys[0]
+
+    def __repr__(self):
+        key = ", ".join(repr(getattr(self, name)) for name in self._primary_key)
+        return f"<{self._table} {key}>"
+
+
+def _many_to_one(targets, refs, touched=None):
+    # `refs[pos]` is the position of the referred record in `targets`, -1 for none
+    def fget(self):
+        idx = refs[self._pos]
+        return None if idx < 0 else targets[idx]
+    if touched is None:
+        return property(fget)
+
+    def fget_tracked(self):
+        record = fget(self)
+        if record is not None:
+            touched.add(record)
+        return record
+    return property(fget_tracked)
+
+
+def _one_to_many(targets, offsets, idxs, touched=None):
+    # the positions of the records referring to the one at `pos` are
+    # `idxs[offsets[pos]:offsets[pos + 1]]`, as in a CSR matrix
+    def fget(self):
+        pos = self._pos
+        return [targets[idx] for idx in idxs[offsets[pos]:offsets[pos + 1]]]
+    if touched is None:
+        return property(fget)
+
+    def fget_tracked(self):
+        records = fget(self)
+        touched.update(records)
+        return records
+    return property(fget_tracked)
+
+
+def _column_keys(mapper, columns):
+    return [mapper.get_property_by_column(col).key for col in columns]
+
+
+def _collection_order(table, fk_cols):
+    """
+    The columns a collection of `table` rows referring to another row by `fk_cols` is ordered by.
+
+    SQLite looks up such rows with the unique index, if any, that starts with `fk_cols`, so they
+    come out ordered by the rest of its columns, then by rowid.  Following that, collections come
+    out as they do when lazy loaded through the ORM.
+    """
+    fk_cols = {col.key for col in fk_cols}
+    unique = (sqlalchemy.PrimaryKeyConstraint, sqlalchemy.UniqueConstraint)
+    for constraint in table.constraints:
+        if not isinstance(constraint, unique):
+            continue
+        cols = [col.key for col in constraint.columns]
+        if set(cols[:len(fk_cols)]) == fk_cols:
+            return cols[len(fk_cols):]
+    return []
+
+
+class ObjectGraph:
+    """
+    All rows of the tables of `model_classes`, the automapped SQLAlchemy models, loaded once into
+    `Record`s, with the relationships between them as integer adjacency arrays, so walking the
+    graph is plain attribute access, without SQL.
+
+    Rows are read with the models' table definitions, so column values come out as they would
+    through the ORM, and collections in the same order, see `_collection_order`.
+
+    With `track=True`, the graph also notes every record reached, see `tracked`.  That costs a
+    little on each access, so is only for building derived data, e.g., `jamdb.entity_docs`.
+    """
+
+    def __init__(self, records, indexes, touched=None):
+        # table name -> its records, and -> {primary key: position}
+        self.records = records
+        self.indexes = indexes
+        self.loaded_at = time.time()
+        # if tracking, the records reached, and the (table name, key) of other lookups
+        self._touched = touched
+
+    @classmethod
+    def from_engine(cls, engine, model_classes, track=False):
+        mappers = {
+            model.__table__.name: sqlalchemy.inspect(model) for model in model_classes.values()
+        }
+        rows = {}
+        with engine.connect() as conn:
+            for table_name, mapper in mappers.items():
+                rows[table_name] = conn.execute(mapper.local_table.select()).fetchall()
+
+        records = {table_name: [] for table_name in mappers}
+        indexes = {}
+        touched = set() if track else None
+        for table_name, mapper in mappers.items():
+            pk_keys = _column_keys(mapper, mapper.primary_key)
+            namespace = {
+                "__slots__": tuple(_column_keys(mapper, mapper.local_table.columns)),
+                "_table": table_name,
+                "_primary_key": tuple(pk_keys),
+                "_references": tuple(rel.key for rel in mapper.relationships if not rel.uselist),
+            }
+            namespace["_columns"] = namespace["__slots__"]
+            namespace.update(cls._relationships(mapper, rows, records, touched))
+            record_cls = type(mapper.class_.__name__, (Record,), namespace)
+            records[table_name].extend(
+                record_cls(pos, row) for pos, row in enumerate(rows[table_name])
+            )
+            # keyed as `session.get` takes them, i.e., composite keys as tuples
+            col_names = mapper.local_table.columns.keys()
+            pk_idxs = [col_names.index(col.key) for col in mapper.primary_key]
+            indexes[table_name] = {
+                row[pk_idxs[0]] if len(pk_idxs) == 1 else tuple(row[idx] for idx in pk_idxs): pos
+                for pos, row in enumerate(rows[table_name])
+            }
+        return cls(records, indexes, touched)
+
+    @staticmethod
+    def _relationships(mapper, rows, records, touched=None):
+        # A property per relationship of `mapper`, matching its local columns to the remote
+        # columns of the other table.  The other table's records are filled in later, the
+        # properties only hold on to its (for now, empty) list.
+        local_cols = mapper.local_table.columns.keys()
+        properties = {}
+        for rel in mapper.relationships:
+            if rel.secondary is not None:
+                raise NotImplementedError(f"Many-to-many relationship {rel} is not supported")
+            target_table = rel.mapper.local_table.name
+            target_cols = rel.mapper.local_table.columns.keys()
+            pairs = rel.local_remote_pairs
+            local_idxs = [local_cols.index(local.key) for local, _ in pairs]
+            remote_idxs = [target_cols.index(remote.key) for _, remote in pairs]
+
+            by_key = {}
+            for target_pos, row in enumerate(rows[target_table]):
+                key = tuple(row[idx] for idx in remote_idxs)
+                if None not in key:
+                    by_key.setdefault(key, []).append(target_pos)
+            if rel.uselist:
+                order_idxs = [
+                    target_cols.index(col)
+                    for col in _collection_order(rel.mapper.local_table, [r for _, r in pairs])
+                ]
+                target_rows = rows[target_table]
+                for positions in by_key.values():
+                    # NULLs first, as in SQLite
+                    positions.sort(key=lambda pos: [
+                        (target_rows[pos][idx] is not None, target_rows[pos][idx])
+                        for idx in order_idxs
+                    ])
+            matches = [
+                by_key.get(tuple(row[idx] for idx in local_idxs), [])
+                for row in rows[mapper.local_table.name]
+            ]
+
+            if rel.uselist:
+                offsets = array("l", [0])
+                idxs = array("l")
+                for positions in matches:
+                    idxs.extend(positions)
+                    offsets.append(len(idxs))
+                properties[rel.key] = _one_to_many(records[target_table], offsets, idxs, touched)
+            else:
+                refs = array("l", (positions[0] if positions else -1 for positions in matches))
+                properties[rel.key] = _many_to_one(records[target_table], refs, touched)
+        return properties
+
+    def rows(self, table_name, ids=None):
+        # All records of `table_name`, or with `ids`, only those, in the order given
+        if ids is None:
+            if self._touched is not None:
+                # any change to the table could change the result
+                self._touched.add((table_name, None))
+            return list(self.records[table_name])
+        return [self.get(table_name, id_) for id_ in ids if id_ in self.indexes[table_name]]
+
+    def get(self, table_name, key):
+        pos = self.indexes[table_name].get(key)
+        record = None if pos is None else self.records[table_name][pos]
+        if self._touched is not None:
+            # misses too, the record might be added later
+            self._touched.add((table_name, key) if record is None else record)
+        return record
+
+    def tracked(self, fnc, *args, **kwargs):
+        """
+        Call `fnc`, returning its result, and the `(table name, key)` of every record it reached,
+        in a graph built with `track=True`.  A key of None stands for the whole table, e.g., for
+        `rows` without `ids`.  Not thread safe, the graph tracks one call at a time.
+        """
+        self._touched.clear()
+        result = fnc(*args, **kwargs)
+        deps = {
+            (item._table, item._key()) if isinstance(item, Record) else item
+            for item in self._touched
+        }
+        self._touched.clear()
+        return result, deps
+
+    def num_records(self):
+        return sum(len(records) for records in self.records.values())
+
+
+class ObjectGraphStore:
+    """
+    The `ObjectGraph` of a DB file, rebuilt whenever the file changes on disk, e.g., after a
+    re-ingest.  The new graph is built aside and swapped in whole, so queries that already got the
+    old one keep a consistent view of it, and, while a rebuild runs, other threads keep getting the
+    old graph instead of waiting.
+
+    The tables and columns are those of `model_classes`, so changes to the schema need a restart.
+    """
+
+    def __init__(self, engine, model_classes, track=False):
+        self.engine = engine
+        self.model_classes = model_classes
+        self.track = track
+        self.db_file = engine.url.database
+        self._graph = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        # lookups served from the loaded graph, and those that had to (re)build it first
+        self.hits = 0
+        self.misses = 0
+
+    def cache_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _file_stamp(self):
+        stat = os.stat(self.db_file)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def current(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            self.hits += 1
+            return self._graph
+        # only one thread rebuilds;  the others keep using the old graph, if there is one
+        if not self._lock.acquire(blocking=self._graph is None):
+            self.hits += 1
+            return self._graph
+        try:
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                self.misses += 1
+                self._graph = ObjectGraph.from_engine(
+                    self.engine, self.model_classes, track=self.track
+                )
+                self._stamp = stamp
+            return self._graph
+        finally:
+            self._lock.release()
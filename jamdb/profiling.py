@@ -0,0 +1,181 @@
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+DEFAULT_INTERVAL = 0.001
+# Where a sample's time goes, by the innermost frame whose (shortened) file starts or ends with one
+# of these.  SQLAlchemy called from a resolver counts as "orm", not "graphql_execute".
+PHASE_RULES = [
+    ("orm", ("sqlalchemy/", "sqlite3/")),
+    ("graphql_parse", ("graphql/language/", "graphql/validation/")),
+    (
+        "graphql_execute",
+        ("graphql/", "graphene/", "graphene_sqlalchemy/", "promise/", "jamdb/graphene.py")
+    ),
+    ("jinja", ("jinja2/", "templates/", ".html")),
+    ("python", ("app/", "jamdb/")),
+]
+OTHER_PHASE = "other"
+_LIBRARY_PATH = re.compile(r".*/(?:site-packages|lib/python\d+\.\d+)/")
+_FRAME_NAMES = {}
+
+
+def _frame_name(code):
+    name = _FRAME_NAMES.get(code)
+    if name is None:
+        filename = code.co_filename.replace("\\", "/")
+        # keep paths short, e.g., `sqlalchemy/orm/loading.py` instead of the full site-packages
+        # path, and `app/routes.py` for our own
+        if _LIBRARY_PATH.match(filename):
+            filename = _LIBRARY_PATH.sub("", filename, count=1)
+        else:
+            filename = "/".join(filename.rsplit("/", 2)[-2:])
+        name = _FRAME_NAMES[code] = (code.co_name, filename, code.co_firstlineno)
+    return name
+
+
+def classify(stack, rules=PHASE_RULES):
+    """
+    The phase of a sample, given its stack of `(name, file, line)` frames, outermost first.
+    """
+    for _, filename, _ in reversed(stack):
+        for phase, markers in rules:
+            if filename.startswith(markers) or filename.endswith(markers):
+                return phase
+    return OTHER_PHASE
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread, every `interval` seconds.
+
+    Samples are weighted by the time since the previous one, so the weights add up to the wall
+    time even when the sampler is late, e.g., while waiting for the GIL.
+    """
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.num_samples = 0
+        self.start_time = None
+        self.end_time = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        sampler_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None and self.thread_id != sampler_id:
+                self.samples[self._sample(frame)] += now - last
+                self.num_samples += 1
+            last = now
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="jamdb-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.end_time = time.perf_counter()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def wall_time(self):
+        return self.end_time - self.start_time
+
+    def phases(self, rules=PHASE_RULES):
+        # seconds spent in each phase
+        phases = Counter()
+        for stack, weight in self.samples.items():
+            phases[classify(stack, rules)] += weight
+        return dict(phases)
+
+    def collapsed(self):
+        """
+        The samples as collapsed stacks, one `frame;frame;... microseconds` per line, as read by
+        flamegraph.pl, inferno, speedscope, and the like.
+        """
+        lines = []
+        for stack, weight in sorted(self.samples.items()):
+            frames = ";".join(
+                f"{frame_name} ({filename}:{line})" for frame_name, filename, line in stack
+            )
+            lines.append(f"{frames} {round(weight * 1e6)}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name):
+        frames = {}
+        samples = []
+        weights = []
+        for stack, weight in self.samples.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(weight)
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "jamdb",
+            "shared": {
+                "frames": [
+                    {"name": frame_name, "file": filename, "line": line}
+                    for frame_name, filename, line in frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def write(self, output_dir, name, **metadata):
+        """
+        Write `<name>.speedscope.json`, `<name>.collapsed` and, with the phases, wall time and
+        `metadata`, `<name>.json` to `output_dir`.  Returns the path of the summary.
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / f"{name}.speedscope.json").write_text(json.dumps(self.speedscope(name)))
+        (output_dir / f"{name}.collapsed").write_text(self.collapsed())
+        summary = {
+            "name": name,
+            "wall_time": self.wall_time,
+            "sampled_time": sum(self.samples.values()),
+            "num_samples": self.num_samples,
+            "phases": self.phases(),
+            **metadata,
+        }
+        summary_file = output_dir / f"{name}.json"
+        summary_file.write_text(json.dumps(summary, indent=2))
+        return summary_file
@@ -0,0 +1,177 @@
+import contextlib
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .sqlstats import track_sql
+
+RUN_REPORTS_DIR = Path("reports") / "run_reports"
+
+
+def peak_rss_mb(who="self"):
+    """
+    Peak resident memory so far, of this process, or of its largest finished child process, e.g.,
+    of a process pool.  None where not available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def file_size(*paths):
+    # total size of the files that exist, for `Stage.bytes_read`
+    return sum(Path(path).stat().st_size for path in paths if Path(path).is_file())
+
+
+class Stage:
+    """
+    One timed stage of a run.  Set `rows_in`, `rows_out` and `bytes_read` while in it, and add
+    anything else worth keeping, e.g., per table counts, to `details`.
+    """
+
+    def __init__(self, name, rows_in=None, rows_out=None, bytes_read=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.bytes_read = bytes_read
+        self.details = {}
+        self.wall_time = None
+        self.db_time = None
+        self.db_write_time = None
+        self.db_statements = None
+        self.peak_rss_mb = None
+        self.peak_children_rss_mb = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "wall_time": self.wall_time,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "db_time": self.db_time,
+            "db_write_time": self.db_write_time,
+            "db_statements": self.db_statements,
+            "peak_rss_mb": self.peak_rss_mb,
+            "peak_children_rss_mb": self.peak_children_rss_mb,
+            "error": self.error,
+            "details": self.details,
+        }
+
+
+class RunReport:
+    """
+    Where one run of an ingestion script spends its time:  the wall time, rows in and out, bytes
+    read, DB time (and how much of it was writes) and peak memory of each stage.
+
+        run_report = RunReport("initialize_db")
+        with run_report.stage("load_tables", bytes_read=file_size(ods_file)) as stage:
+            ...
+            stage.rows_out = num_rows
+        run_report.write(data_dir / RUN_REPORTS_DIR)
+
+    DB time is that of the statements run on `DBHandler` engines in the stage's thread.  Peak
+    memory is the process' peak so far, so it only goes up, stage to stage.  Reports are JSON, one
+    file per run, so runs can be compared, see `format_run_report`.
+    """
+
+    def __init__(self, name, **metadata):
+        self.name = name
+        self.metadata = metadata
+        self.stages = []
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None, rows_out=None, bytes_read=None):
+        stage = Stage(name, rows_in=rows_in, rows_out=rows_out, bytes_read=bytes_read)
+        self.stages.append(stage)
+        start = time.perf_counter()
+        try:
+            with track_sql() as sql_stats:
+                yield stage
+        except BaseException as exc:
+            stage.error = f"{exc.__class__.__name__}: {exc}"
+            raise
+        finally:
+            stage.wall_time = time.perf_counter() - start
+            stage.db_time = sql_stats.db_time
+            stage.db_write_time = sql_stats.write_time
+            stage.db_statements = sql_stats.statements
+            stage.peak_rss_mb = peak_rss_mb()
+            stage.peak_children_rss_mb = peak_rss_mb("children")
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_time": time.perf_counter() - self._start,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_children_rss_mb": peak_rss_mb("children"),
+            "metadata": self.metadata,
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def previous_report_file(self, reports_dir):
+        # the latest report of this script in `reports_dir`, if any
+        reports = sorted(Path(reports_dir).glob(f"{self.name}_*.json"))
+        return reports[-1] if reports else None
+
+    def write(self, reports_dir):
+        """
+        Write the report to `reports_dir` as `<name>_<start time>.json`, and print it, compared to
+        the previous run's report, if there is one.  Returns the report file.
+        """
+        reports_dir = Path(reports_dir)
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        previous_file = self.previous_report_file(reports_dir)
+        report = self.to_dict()
+        report_file = reports_dir / f"{self.name}_{self.started_at.strftime('%Y%m%d-%H%M%S')}.json"
+        report_file.write_text(json.dumps(report, indent=2, default=str))
+
+        previous = None if previous_file is None else json.loads(previous_file.read_text())
+        print(format_run_report(report, previous))
+        print(f"    Run report written to {report_file}")
+        return report_file
+
+
+def _fmt(val, spec):
+    return "-" if val is None else format(val, spec)
+
+
+def format_run_report(report, previous=None):
+    """
+    The report as a table, with the change in each stage's wall time since `previous`, a report of
+    an earlier run.
+    """
+    previous_times = {
+        stage["name"]: stage["wall_time"] for stage in (previous or {}).get("stages", [])
+    }
+    header = (
+        f"{'stage':<24} {'wall (s)':>9} {'vs prev':>8} {'rows in':>9} {'rows out':>9} "
+        f"{'MB read':>8} {'db (s)':>8} {'writes (s)':>10} {'peak MB':>8}"
+    )
+    lines = [f"Run report for {report['name']}", header]
+    for stage in report["stages"]:
+        prev = previous_times.get(stage["name"])
+        delta = None if prev is None else stage["wall_time"] - prev
+        mb_read = None if stage["bytes_read"] is None else stage["bytes_read"] / 1024 ** 2
+        lines.append(
+            f"{stage['name']:<24} {stage['wall_time']:>9.3f} {_fmt(delta, '+8.3f'):>8} "
+            f"{_fmt(stage['rows_in'], 'd'):>9} {_fmt(stage['rows_out'], 'd'):>9} "
+            f"{_fmt(mb_read, '.2f'):>8} {_fmt(stage['db_time'], '.3f'):>8} "
+            f"{_fmt(stage['db_write_time'], '.3f'):>10} {_fmt(stage['peak_rss_mb'], '.0f'):>8}"
+            + ("  FAILED" if stage["error"] else "")
+        )
+    lines.append(f"{'total':<24} {report['wall_time']:>9.3f}")
+    return "\n".join(lines)
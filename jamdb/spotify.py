@@ -0,0 +1,215 @@
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+from spotipy import SpotifyException
+
+# Most items the API returns per page of a playlist's tracks, and per request for track details
+SPOTIFY_PAGE_SIZE = 100
+SPOTIFY_TRACKS_BATCH_SIZE = 50
+MAX_WORKERS = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def make_requests_session(pool_size=MAX_WORKERS):
+    """
+    A `requests.Session` to hand to `spotipy.Spotify(requests_session=...)`.
+
+    Unlike spotipy's own session, it does not retry, since `call_with_retry` does (and respects
+    `Retry-After`), and its connection pool is big enough for concurrent requests.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def call_with_retry(fnc, max_retries=5, backoff=0.5, max_backoff=30, sleep=time.sleep):
+    """
+    Call `fnc()`, retrying with exponential backoff (plus jitter) while it fails with a rate limit
+    or server error.  A `Retry-After` header, if given, sets the minimum wait.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fnc()
+        except SpotifyException as exc:
+            if exc.http_status not in RETRY_STATUSES or attempt == max_retries:
+                raise
+            delay = min(max_backoff, backoff * 2 ** attempt) * (1 + random.random()) / 2
+            try:
+                delay = max(delay, float(exc.headers.get("Retry-After", 0)))
+            except ValueError:
+                pass
+            sleep(delay)
+
+
+def fetch_playlist_tracks(spotipy_conn, playlist_id, page_size=SPOTIFY_PAGE_SIZE,
+                          max_workers=MAX_WORKERS, fields=None, **retry_kwargs):
+    """
+    All the track items of a playlist.
+
+    The first page gives the `total`, then the remaining pages are requested concurrently.
+    Items are returned in playlist order.  `fields` restricts what the API returns for each page,
+    it must include `total` and `items`.
+    """
+    def fetch_page(offset):
+        return call_with_retry(
+            lambda: spotipy_conn.playlist_items(
+                playlist_id, fields=fields, limit=page_size, offset=offset,
+                additional_types=("track",)
+            ),
+            **retry_kwargs
+        )
+
+    first_page = fetch_page(0)
+    # step by what the API actually returned, in case it caps the page size below ours
+    step = len(first_page["items"]) or page_size
+    offsets = range(step, first_page["total"], step)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pages = list(pool.map(fetch_page, offsets))
+
+    tracks = list(first_page["items"])
+    for page in pages:
+        tracks.extend(page["items"])
+    return tracks
+
+
+def fetch_tracks(spotipy_conn, track_uris, max_workers=MAX_WORKERS, **retry_kwargs):
+    """
+    Track details for `track_uris`, fetched in concurrent batches.
+    """
+    batches = [
+        track_uris[idx:idx + SPOTIFY_TRACKS_BATCH_SIZE]
+        for idx in range(0, len(track_uris), SPOTIFY_TRACKS_BATCH_SIZE)
+    ]
+
+    def fetch_batch(batch):
+        return call_with_retry(lambda: spotipy_conn.tracks(batch), **retry_kwargs)["tracks"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return [track for tracks in pool.map(fetch_batch, batches) for track in tracks]
+
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS track (
+    uri TEXT NOT NULL PRIMARY KEY,
+    name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist (
+    id TEXT NOT NULL PRIMARY KEY,
+    snapshot_id TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_track (
+    playlist_id TEXT NOT NULL REFERENCES playlist (id),
+    position INTEGER NOT NULL,
+    track_uri TEXT NOT NULL REFERENCES track (uri),
+    PRIMARY KEY (playlist_id, position)
+);
+"""
+
+
+class SpotifyTrackCache:
+    """
+    Local SQLite cache of Spotify tracks, and of which tracks are in which playlists.
+
+    Tracks are keyed by URI and shared between playlists.  Syncing a playlist whose snapshot id
+    is unchanged makes no further requests.  Otherwise only the track URIs of the playlist are
+    re-listed (a much smaller response than full items), and details are fetched only for tracks
+    not already in the cache.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = Path(cache_file)
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_CACHE_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # one transaction per connection, committed on success
+        conn = sqlite3.connect(self.cache_file)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def snapshot_id(self, playlist_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT snapshot_id FROM playlist WHERE id = ?", (playlist_id,)).fetchone()
+        return None if row is None else row["snapshot_id"]
+
+    def tracks(self, playlist_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT track.uri, track.name, track.link
+                FROM playlist_track JOIN track ON track.uri = playlist_track.track_uri
+                WHERE playlist_track.playlist_id = ?
+                ORDER BY playlist_track.position
+                """,
+                (playlist_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _cached_uris(self, uris):
+        with self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE wanted (uri TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", [(uri,) for uri in uris])
+            rows = conn.execute("SELECT track.uri FROM track JOIN wanted USING (uri)").fetchall()
+        return {row["uri"] for row in rows}
+
+    def sync_playlist(self, spotipy_conn, playlist_id, **fetch_kwargs):
+        """
+        Bring the cached copy of `playlist_id` up to date, and return its tracks.
+        """
+        snapshot_id = call_with_retry(
+            lambda: spotipy_conn.playlist(playlist_id, fields="snapshot_id")
+        )["snapshot_id"]
+        if snapshot_id == self.snapshot_id(playlist_id):
+            print(f"    Playlist {playlist_id} unchanged, using cached tracks")
+            return self.tracks(playlist_id)
+
+        items = fetch_playlist_tracks(
+            spotipy_conn, playlist_id, fields="total,items(track(uri))", **fetch_kwargs
+        )
+        # local files and unavailable tracks have no (usable) track
+        uris = [
+            item["track"]["uri"] for item in items
+            if item.get("track") and not item["track"]["uri"].startswith("spotify:local:")
+        ]
+        new_uris = sorted(set(uris) - self._cached_uris(uris))
+        new_tracks = fetch_tracks(spotipy_conn, new_uris, **fetch_kwargs)
+        print(
+            f"    Playlist {playlist_id} changed:  {len(uris)} tracks, "
+            f"{len(new_uris)} fetched, {len(uris) - len(new_uris)} from cache"
+        )
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO track (uri, name, link, fetched_at) VALUES (?, ?, ?, ?)",
+                [
+                    (track["uri"], track["name"], track["external_urls"]["spotify"], now)
+                    for track in new_tracks if track is not None
+                ]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO playlist (id, snapshot_id, synced_at) VALUES (?, ?, ?)",
+                (playlist_id, snapshot_id, now)
+            )
+            conn.execute("DELETE FROM playlist_track WHERE playlist_id = ?", (playlist_id,))
+            conn.executemany(
+                "INSERT INTO playlist_track (playlist_id, position, track_uri) VALUES (?, ?, ?)",
+                [(playlist_id, position, uri) for position, uri in enumerate(uris)]
+            )
+        return self.tracks(playlist_id)
@@ -0,0 +1,185 @@
+import contextlib
+import contextvars
+import sqlite3
+import time
+from collections import Counter
+
+import sqlalchemy
+
+# Most repeated statements to report, e.g., the lazy loads of an N+1
+TOP_STATEMENTS = 5
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_current = contextvars.ContextVar("jamdb_sql_stats", default=None)
+
+
+class SQLStats:
+    """
+    Statements run while tracking:  how many, the time spent in the DB, rows fetched, and how
+    often the same statement was repeated.
+
+    A statement is a duplicate if the same SQL was already run with the same parameters.  The
+    same SQL with different parameters is not a duplicate, but shows up in `top_statements`, which
+    is how an N+1 typically looks.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.duplicates = 0
+        # the statements that change data, and their share of `db_time`, which includes the
+        # commits, as that is when SQLite writes to disk
+        self.writes = 0
+        self.write_time = 0.0
+        self.commits = 0
+        self._by_statement = Counter()
+        self._seen = set()
+
+    def record(self, statement, parameters, elapsed, executemany=False):
+        self.statements += 1
+        self.db_time += elapsed
+        self._by_statement[statement] += 1
+        if statement.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS):
+            self.writes += 1
+            self.write_time += elapsed
+        if executemany:
+            # bulk inserts are not worth comparing row by row
+            return
+        key = (statement, repr(parameters))
+        if key in self._seen:
+            self.duplicates += 1
+        self._seen.add(key)
+
+    def record_commit(self, elapsed):
+        self.commits += 1
+        self.db_time += elapsed
+        self.write_time += elapsed
+
+    def top_statements(self, num=TOP_STATEMENTS):
+        return [
+            {"statement": " ".join(statement.split()), "count": count}
+            for statement, count in self._by_statement.most_common(num)
+            if count > 1
+        ]
+
+    def to_dict(self):
+        return {
+            "statements": self.statements,
+            "dbTime": round(self.db_time, 6),
+            "rows": self.rows,
+            "duplicates": self.duplicates,
+            "writes": self.writes,
+            "writeTime": round(self.write_time, 6),
+            "commits": self.commits,
+            "topStatements": self.top_statements(),
+        }
+
+    def summary(self):
+        return (
+            f"{self.statements} statements ({self.duplicates} duplicates) in "
+            f"{self.db_time * 1000:.1f}ms, {self.rows} rows"
+        )
+
+
+def current_sql_stats():
+    # The stats being tracked in this context, if any
+    return _current.get()
+
+
+def start_sql_tracking():
+    """
+    Record the statements run on instrumented engines, in this context, into a new `SQLStats`.
+    Returns the stats, and the token to pass to `stop_sql_tracking`.
+    """
+    stats = SQLStats()
+    return stats, _current.set(stats)
+
+
+def stop_sql_tracking(token):
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def track_sql():
+    stats, token = start_sql_tracking()
+    try:
+        yield stats
+    finally:
+        stop_sql_tracking(token)
+
+
+class _CountingCursor(sqlite3.Cursor):
+    # counts rows fetched into the stats being tracked, if any
+
+    def _count(self, rows):
+        stats = _current.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        stats = _current.get()
+        if stats is not None and row is not None:
+            stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(super().fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+
+class _CountingConnection(sqlite3.Connection):
+
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        # the engine's commit event fires before the commit, so time it here
+        stats = _current.get()
+        if stats is None:
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            stats.record_commit(time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("jamdb_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("jamdb_query_start")
+    if not starts:
+        # tracking started between `before` and `after`
+        return
+    stats.record(statement, parameters, time.perf_counter() - starts.pop(), executemany)
+
+
+def _do_connect(dialect, conn_rec, cargs, cparams):
+    cparams.setdefault("factory", _CountingConnection)
+
+
+def instrument_engine(engine):
+    """
+    Have `engine` record its statements into the `SQLStats` being tracked, see `track_sql`.  When
+    nothing is tracked, the only cost is a context variable lookup per statement.
+    """
+    if sqlalchemy.event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return engine
+    sqlalchemy.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    sqlalchemy.event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    if engine.dialect.name == "sqlite":
+        # the DBAPI has no hooks for fetches or commits, so count rows and time commits with our
+        # own sqlite3 connections and cursors
+        sqlalchemy.event.listen(engine, "do_connect", _do_connect)
+    return engine
@@ -0,0 +1,394 @@
+"""
+Seeded generator of synthetic, schema-valid jam DBs, for measuring performance at scale.
+
+Activity is skewed the way real data is:  a few players are at nearly every jam, a few songs get
+called over and over, and a few event series run for years while most only run a handful of times.
+"""
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .db import DBHandler
+from .globals import ME_ID
+from .loading import fk_dependency_graph, topological_order
+from .transformations import add_embeddable_links
+
+SQL_FILE = Path(__file__).parent / "jamming.sql"
+
+# `event_occs`, `song_performs` and `performers_per_song` drive the size of the big tables:
+# SongPerform is `song_performs` rows, SongPerformer about `performers_per_song` times that.
+SCALES = {
+    "tiny": {
+        "persons": 50, "songs": 100, "event_gens": 5, "event_occs": 50, "song_performs": 500,
+    },
+    "small": {
+        "persons": 300, "songs": 1_000, "event_gens": 20, "event_occs": 500, "song_performs": 10_000,
+    },
+    "medium": {
+        "persons": 1_500, "songs": 5_000, "event_gens": 100, "event_occs": 2_500,
+        "song_performs": 50_000,
+    },
+    "large": {
+        "persons": 5_000, "songs": 20_000, "event_gens": 400, "event_occs": 10_000,
+        "song_performs": 200_000,
+    },
+}
+DEFAULT_SIZES = {
+    "performers_per_song": 5,
+    "video_fraction": 0.1,
+    "charts_per_song": 1.5,
+    "ref_recs_per_song": 1.5,
+}
+# Rows per `DBHandler.insert`, so the big tables aren't built as one huge list of dicts
+INSERT_CHUNK_SIZE = 50_000
+
+LINK_SOURCES = ["web", "youtube", "spotify", "ireal", "pdf", "jpg", "png"]
+MODES = ["major", "minor", "dorian", "mixolydian"]
+ROOTS = ["C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B"]
+GENRES = {
+    "jazz": ["bop", "swing", "ballad", "latin", "modal", "jazz_blues"],
+    "bluegrass": ["fiddle_tune", "bluegrass_standard", "gospel"],
+    "blues": ["chicago_blues", "delta_blues"],
+    "rock": ["classic_rock", "soul", "funk"],
+}
+INSTRUMENTS = [
+    "guitar", "bass", "drums", "piano", "vocals", "sax", "trumpet", "trombone", "mando", "fiddle",
+    "banjo", "dobro", "harmonica", "organ", "percussion", "clarinet", "flute", "vibes",
+]
+CONTACT_TYPES = [
+    ("web", False), ("instagram", False), ("facebook", False), ("email", True), ("phone", True),
+]
+FIRST_NAMES = [
+    "Alex", "Billie", "Charlie", "Dana", "Eddie", "Frankie", "Gene", "Harper", "Izzy", "Jo",
+    "Kim", "Lou", "Max", "Nat", "Ollie", "Pat", "Quinn", "Ray", "Sam", "Terry",
+]
+LAST_NAMES = [
+    "Adams", "Baker", "Carter", "Davis", "Evans", "Fisher", "Garcia", "Hill", "Irwin", "Jones",
+    "King", "Lopez", "Moore", "Nash", "Owens", "Parker", "Reed", "Silva", "Turner", "Young",
+]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ORDINALS = ["1st", "2nd", "3rd", "4th", "Every"]
+
+
+def zipf_weights(num, exponent=1.1, rng=None):
+    """
+    Probabilities of `num` items, the k-th most popular having weight 1 / k ** exponent.  With
+    `rng`, popularity is shuffled, so it's not tied to id order.
+    """
+    weights = 1 / np.arange(1, num + 1) ** exponent
+    if rng is not None:
+        rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+class SyntheticJamDB:
+    """
+    Builds all tables of `jamming.sql` as lists of row dicts, deterministically from `seed`.
+    """
+
+    def __init__(self, scale="small", seed=0, **sizes):
+        self.sizes = {**DEFAULT_SIZES, **SCALES[scale], **sizes}
+        self.rng = np.random.default_rng(seed)
+        self.tables = {}
+
+    def _choice(self, options, size, p=None):
+        return [options[idx] for idx in self.rng.choice(len(options), size=size, p=p)]
+
+    def build(self):
+        self._lookups()
+        self._people()
+        self._songs()
+        self._events()
+        self._performances()
+        return self.tables
+
+    def _lookups(self):
+        self.tables["LinkSource"] = [{"id": x, "rank": rank} for rank, x in enumerate(LINK_SOURCES)]
+        self.tables["Mode"] = [{"id": x, "mode": x} for x in MODES]
+        self.tables["Key"] = [
+            {"id": f"{root}_{mode}", "root": root, "mode_id": mode} for mode in MODES for root in ROOTS
+        ]
+        self.tables["Genre"] = [{"id": x, "genre": x.title()} for x in GENRES]
+        self.tables["Subgenre"] = [
+            {"id": sub, "subgenre": sub.replace("_", " ").title(), "genre_id": genre}
+            for genre, subs in GENRES.items() for sub in subs
+        ]
+        self.tables["Instrument"] = [{"id": x, "instrument": x.title()} for x in INSTRUMENTS]
+        self.tables["ContactType"] = [
+            {"id": x, "display_name": x.title(), "rank": rank, "private": private}
+            for rank, (x, private) in enumerate(CONTACT_TYPES)
+        ]
+        num_composers = max(self.sizes["songs"] // 10, 1)
+        self.tables["Composer"] = [
+            {"id": f"composer_{idx:06d}", "composer": f"Composer {idx}"} for idx in range(num_composers)
+        ]
+
+    def _people(self):
+        num_persons = self.sizes["persons"]
+        ids = [ME_ID, "unknown_host"] + [f"person_{idx:06d}" for idx in range(num_persons - 2)]
+        persons = []
+        for idx, person_id in enumerate(ids):
+            first = FIRST_NAMES[idx % len(FIRST_NAMES)]
+            last = LAST_NAMES[(idx // len(FIRST_NAMES)) % len(LAST_NAMES)]
+            persons.append(
+                {
+                    "id": person_id, "public_name": f"{first} {last[0]}. {idx}",
+                    "full_name": f"{first} {last} {idx}",
+                }
+            )
+        self.tables["Person"] = persons
+        # a few players are at nearly every jam.  I am added separately, see `_performances`
+        self.person_weights = zipf_weights(len(ids), rng=self.rng)
+        self.person_weights[0] = 0
+        self.person_weights /= self.person_weights.sum()
+
+        instrument_weights = zipf_weights(len(INSTRUMENTS), exponent=0.8)
+        person_instruments = []
+        for person_id in ids:
+            num = 1 + self.rng.binomial(2, 0.25)
+            instrument_ids = self.rng.choice(INSTRUMENTS, size=num, replace=False, p=instrument_weights)
+            for instrument_id in instrument_ids:
+                person_instruments.append(
+                    {
+                        "id": f"{person_id}:{instrument_id}", "person_id": person_id,
+                        "instrument_id": str(instrument_id),
+                    }
+                )
+        self.tables["PersonInstrument"] = person_instruments
+
+        contacts = []
+        for person_id in ids:
+            num = min(self.rng.poisson(1.2), len(CONTACT_TYPES))
+            for idx in self.rng.choice(len(CONTACT_TYPES), size=num, replace=False):
+                contact_type_id, private = CONTACT_TYPES[idx]
+                contacts.append(
+                    {
+                        "id": f"{person_id}:{contact_type_id}", "person_id": person_id,
+                        "contact_type_id": contact_type_id, "contact_info": "",
+                        "link": f"https://{contact_type_id}.example/{person_id}",
+                        "display_name": person_id, "private": private,
+                    }
+                )
+        self.tables["Contact"] = contacts
+
+        # pictures point at files that don't exist, the app then just links to them as is
+        self.tables["PersonPicture"] = [
+            {
+                "id": f"{person_id}:pic", "person_id": person_id, "source_id": "jpg",
+                "link": f"people/{person_id}/pic.jpg",
+            }
+            for person_id in ids[::2]
+        ]
+        self.tables["PersonPictureVariant"] = []
+
+    def _songs(self):
+        num_songs = self.sizes["songs"]
+        keys = [x["id"] for x in self.tables["Key"]]
+        subgenres = [x["id"] for x in self.tables["Subgenre"]]
+        composers = [x["id"] for x in self.tables["Composer"]]
+        composer_weights = zipf_weights(len(composers), rng=self.rng)
+        self.tables["Song"] = [
+            {
+                "id": f"song_{idx:06d}", "song": f"Song Title {idx}", "subgenre_id": subgenre,
+                "instrumental": instrumental, "key_id": key, "composer_id": composer,
+            }
+            for idx, (subgenre, instrumental, key, composer) in enumerate(
+                zip(
+                    self._choice(subgenres, num_songs),
+                    self._choice(["yes", "no"], num_songs),
+                    self._choice(keys, num_songs),
+                    self._choice(composers, num_songs, p=composer_weights),
+                )
+            )
+        ]
+        # a few standards get called at every jam
+        self.song_weights = zipf_weights(num_songs, exponent=1.0, rng=self.rng)
+
+        song_ids = [x["id"] for x in self.tables["Song"]]
+        link_rows = {"Chart": [], "RefRec": []}
+        for table_name, source_ids, per_song in [
+            ("Chart", ["web", "pdf", "ireal"], self.sizes["charts_per_song"]),
+            ("RefRec", ["youtube", "spotify"], self.sizes["ref_recs_per_song"]),
+        ]:
+            counts = self.rng.poisson(per_song, size=num_songs)
+            for song_id, count in zip(song_ids, counts):
+                for num, source_id in enumerate(self._choice(source_ids, count)):
+                    link_rows[table_name].append(
+                        {
+                            "id": f"{song_id}:{num}", "song_id": song_id, "source_id": source_id,
+                            "link": _fake_link(source_id, f"{table_name}_{song_id}_{num}"),
+                            "display_name": "",
+                        }
+                    )
+        for table_name, rows in link_rows.items():
+            self.tables[table_name] = _with_embeddable_links(rows)
+
+        instruments = [x["id"] for x in self.tables["Instrument"]]
+        num_learned = num_songs // 20
+        self.tables["SongLearn"] = [
+            {
+                "id": f"learn_{idx:06d}", "song_id": song_id, "instrument_id": instrument,
+                "date": "2020-01-01", "key_id": None,
+            }
+            for idx, (song_id, instrument) in enumerate(
+                zip(self._choice(song_ids, num_learned), self._choice(instruments, num_learned))
+            )
+        ]
+        self.tables["Setlist"] = [
+            {"id": f"setlist_{idx}", "setlist": f"Setlist {idx}", "description": ""} for idx in range(5)
+        ]
+        self.tables["SetlistSong"] = [
+            {
+                "id": f"setlist_{idx % 5}:{idx}", "setlist_id": f"setlist_{idx % 5}", "song_id": song_id,
+                "instrument_id": instrument, "key_id": None,
+            }
+            for idx, (song_id, instrument) in enumerate(
+                zip(self._choice(song_ids, 100, p=self.song_weights), self._choice(instruments, 100))
+            )
+        ]
+
+    def _events(self):
+        num_gens = self.sizes["event_gens"]
+        num_venues = max(num_gens // 2, 1)
+        self.tables["Venue"] = [
+            {
+                "id": f"venue_{idx:05d}", "venue": f"Venue {idx}", "address": f"{idx} Main St",
+                "city": "Springfield", "zip": f"{10000 + idx}", "state": "CA",
+                "web": f"https://venue{idx}.example",
+            }
+            for idx in range(num_venues)
+        ]
+        venues = [x["id"] for x in self.tables["Venue"]]
+        persons = [x["id"] for x in self.tables["Person"]]
+        genres = [x["id"] for x in self.tables["Genre"]]
+        self.tables["EventGen"] = [
+            {
+                "id": f"series_{idx:05d}", "name": f"Jam Series {idx}", "genre_id": genre,
+                "venue_id": venue, "date": f"{ordinal} {weekday}", "time": f"{time}pm", "host_id": host,
+            }
+            for idx, (genre, venue, ordinal, weekday, time, host) in enumerate(
+                zip(
+                    self._choice(genres, num_gens), self._choice(venues, num_gens),
+                    self._choice(ORDINALS, num_gens), self._choice(WEEKDAYS, num_gens),
+                    self._choice([6, 7, 8, 9], num_gens),
+                    self._choice(persons, num_gens, p=self.person_weights),
+                )
+            )
+        ]
+
+        # a few series have run for years, most only a few times
+        num_occs = self.sizes["event_occs"]
+        gens = self._choice(
+            [x["id"] for x in self.tables["EventGen"]], num_occs, p=zipf_weights(num_gens, rng=self.rng)
+        )
+        days = np.sort(self.rng.integers(0, 15 * 365, size=num_occs))
+        dates = np.datetime64("2010-01-01") + days
+        self.tables["EventOcc"] = [
+            {
+                "id": f"event_{idx:07d}", "name": f"{gen.replace('series', 'Jam')} #{idx}",
+                "event_gen_id": gen, "date": str(date),
+            }
+            for idx, (gen, date) in enumerate(zip(gens, dates))
+        ]
+
+    def _performances(self):
+        num_performs = self.sizes["song_performs"]
+        occs = [x["id"] for x in self.tables["EventOcc"]]
+        songs = [x["id"] for x in self.tables["Song"]]
+        keys = [x["id"] for x in self.tables["Key"]] + [None]
+        song_performs = [
+            {"id": f"perform_{idx:08d}", "event_occ_id": occ, "song_id": song, "key_id": key}
+            for idx, (occ, song, key) in enumerate(
+                zip(
+                    sorted(self._choice(occs, num_performs)),
+                    self._choice(songs, num_performs, p=self.song_weights),
+                    self._choice(keys, num_performs),
+                )
+            )
+        ]
+        self.tables["SongPerform"] = song_performs
+
+        # each player's instruments, sampled by how active the player is
+        person_instruments = {}
+        for row in self.tables["PersonInstrument"]:
+            person_instruments.setdefault(row["person_id"], []).append(row["id"])
+        persons = [x["id"] for x in self.tables["Person"]]
+        counts = 1 + self.rng.poisson(self.sizes["performers_per_song"] - 1, size=num_performs)
+        players = self.rng.choice(len(persons), size=int(counts.sum()), p=self.person_weights)
+        me_playing = self.rng.random(num_performs) < 0.6
+        instrument_picks = self.rng.random(len(players))
+
+        song_performers = []
+        start = 0
+        for perform, count, me in zip(song_performs, counts, me_playing):
+            chosen = set()
+            if me:
+                chosen.add(person_instruments[ME_ID][0])
+            for player, pick in zip(players[start:start + count], instrument_picks[start:start + count]):
+                options = person_instruments[persons[player]]
+                chosen.add(options[int(pick * len(options))])
+            start += count
+            for person_instrument_id in sorted(chosen):
+                song_performers.append(
+                    {
+                        "id": len(song_performers), "song_perform_id": perform["id"],
+                        "person_instrument_id": person_instrument_id,
+                    }
+                )
+        self.tables["SongPerformer"] = song_performers
+
+        with_video = self.rng.random(num_performs) < self.sizes["video_fraction"]
+        self.tables["PerformanceVideo"] = _with_embeddable_links(
+            [
+                {
+                    "id": f"video_{idx:08d}", "song_perform_id": perform["id"], "source_id": "youtube",
+                    "link": _fake_link("youtube", perform["id"]), "display_name": "",
+                }
+                for idx, perform in enumerate(x for x, video in zip(song_performs, with_video) if video)
+            ]
+        )
+
+
+def _fake_link(source_id, key):
+    if source_id == "youtube":
+        return f"https://youtu.be/{key}"
+    if source_id == "spotify":
+        return f"https://open.spotify.com/track/{key}"
+    if source_id == "ireal":
+        return f"irealb://{key}"
+    if source_id == "pdf":
+        return f"charts/{key}.pdf"
+    return f"https://charts.example/{key}"
+
+
+def _with_embeddable_links(rows):
+    if len(rows) == 0:
+        return rows
+    return add_embeddable_links(pd.DataFrame(rows)).to_dict(orient="records")
+
+
+def generate_jam_db(db_file, scale="small", seed=0, **sizes):
+    """
+    Create `db_file` from `jamming.sql`, and fill it with synthetic data at `scale` (one of
+    `SCALES`, any size can be overridden by keyword).  The same `seed` gives the same DB.
+    Returns the number of rows in each table.
+    """
+    db_file = Path(db_file)
+    if db_file.exists():
+        db_file.unlink()
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(SQL_FILE.read_text())
+
+    tables = SyntheticJamDB(scale, seed, **sizes).build()
+    db_handler = DBHandler.from_db_file(db_file)
+    # parents before children, so FKs are satisfied as rows go in
+    load_order = topological_order(fk_dependency_graph(db_handler, list(tables)))
+    with db_handler.Session.begin() as session:
+        for table_name in load_order:
+            rows = tables[table_name]
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                db_handler.insert(table_name, rows[start:start + INSERT_CHUNK_SIZE], session=session)
+    db_handler.engine.dispose()
+    return {table_name: len(tables[table_name]) for table_name in load_order}
@@ -0,0 +1,138 @@
+import logging
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+import sqlalchemy
+
+from .build_cache import digest
+from .transformations import cleanup_youtube_link
+
+DERIVED_THUMBNAILS_DIR = Path("derived") / "thumbnails"
+YOUTUBE_THUMBNAIL_URL = "https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+SPOTIFY_OEMBED_URL = "https://open.spotify.com/oembed"
+# Tables with links that get a thumbnail.  Only their links are ever fetched.
+THUMBNAIL_TABLES = ["PerformanceVideo", "RefRec"]
+MAX_THUMBNAIL_BYTES = 2 * 1024 * 1024
+# Failed fetches, e.g., of removed videos, are not retried for this long
+FAILURE_TTL = 24 * 60 * 60
+_CHUNK_SIZE = 64 * 1024
+
+
+def read_thumbnail_source(conn, table_name, row_id):
+    """
+    The `(source_id, link)` of the row of `table_name`, one of `THUMBNAIL_TABLES`, with `row_id`.
+    None if there is no such row.
+    """
+    if table_name not in THUMBNAIL_TABLES:
+        return None
+    row = conn.execute(
+        sqlalchemy.text(f"SELECT source_id, link FROM {table_name} WHERE id = :id"),
+        {"id": row_id}
+    ).first()
+    return None if row is None else (row.source_id, row.link)
+
+
+class ThumbnailCache:
+    """
+    Poster images for embeddable links, downloaded once and kept under `derived/thumbnails`.
+
+    YouTube thumbnails have a well known URL, Spotify ones are looked up with its oEmbed API.
+    Thumbnails are named by the digest of the link, so one that exists is never fetched again.
+    Failed fetches leave a `.failed` marker next to where the thumbnail would be, so they are
+    only retried once it is `failure_ttl` seconds old.  Only `image/*` responses of up to
+    `max_bytes` are kept.
+    """
+
+    def __init__(self, data_dir, http_session=None, timeout=5,
+                 youtube_thumbnail_url=YOUTUBE_THUMBNAIL_URL, spotify_oembed_url=SPOTIFY_OEMBED_URL,
+                 max_bytes=MAX_THUMBNAIL_BYTES, failure_ttl=FAILURE_TTL, logger=None):
+        self.data_dir = Path(data_dir)
+        self.http_session = http_session or requests.Session()
+        self.timeout = timeout
+        self.youtube_thumbnail_url = youtube_thumbnail_url
+        self.spotify_oembed_url = spotify_oembed_url
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+
+    def cache_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def thumbnail_link(self, source_id, link):
+        # where the thumbnail is (or would be) cached, relative to `data_dir`
+        key = digest(source_id.lower(), link)
+        return DERIVED_THUMBNAILS_DIR / key[:2] / f"{key}.jpg"
+
+    def _image_url(self, source_id, link):
+        source_id = source_id.lower()
+        if source_id == "youtube":
+            parts = urlsplit(cleanup_youtube_link(link))
+            if parts.netloc != "youtu.be":
+                return None
+            return self.youtube_thumbnail_url.format(video_id=parts.path.strip("/"))
+        if source_id == "spotify":
+            response = self.http_session.get(
+                self.spotify_oembed_url, params={"url": link}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            image_url = response.json().get("thumbnail_url")
+            if image_url is None:
+                raise ValueError("No thumbnail_url in the oEmbed response")
+            return image_url
+        return None
+
+    def _fetch_image(self, image_url):
+        with self.http_session.get(image_url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                raise ValueError(f"Not an image:  {content_type!r}")
+            content = bytearray()
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                content += chunk
+                if len(content) > self.max_bytes:
+                    raise ValueError(f"Larger than {self.max_bytes} bytes")
+            return bytes(content)
+
+    def get(self, source_id, link):
+        """
+        The cached thumbnail's link, relative to `data_dir`, fetching it first if need be.  None
+        if `link` has no thumbnail, or it could not be fetched.
+        """
+        thumbnail_link = self.thumbnail_link(source_id, link)
+        dest_file = self.data_dir / thumbnail_link
+        if dest_file.exists():
+            self.hits += 1
+            return thumbnail_link
+        failed_file = dest_file.with_suffix(".failed")
+        try:
+            if time.time() - failed_file.stat().st_mtime < self.failure_ttl:
+                self.hits += 1
+                return None
+        except FileNotFoundError:
+            pass
+
+        self.misses += 1
+        try:
+            image_url = self._image_url(source_id, link)
+            if image_url is None:
+                return None
+            content = self._fetch_image(image_url)
+        except (requests.RequestException, ValueError) as exc:
+            self.logger.warning("Could not fetch thumbnail for %s:  %s", link, exc)
+            failed_file.parent.mkdir(parents=True, exist_ok=True)
+            failed_file.touch()
+            return None
+
+        dest_file.parent.mkdir(parents=True, exist_ok=True)
+        # the same thumbnail may be requested concurrently, so write it atomically
+        tmp_file = dest_file.with_name(f"{dest_file.name}.{os.getpid()}.{id(content)}.tmp")
+        tmp_file.write_bytes(content)
+        os.replace(tmp_file, dest_file)
+        failed_file.unlink(missing_ok=True)
+        return thumbnail_link
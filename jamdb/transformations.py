@@ -1,45 +1,102 @@
 import copy
+import functools
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+import pandas as pd
 
-def id_from_name(name):
-    return name.lower().strip().replace(" ", "_")
+from .ids import format_id_as_str, id_from_name  # noqa: F401
 
+def hash_rows(df):
+    """
+    Content hash of each row of `df`, as 16 hex chars.
 
-def format_id_as_str(x):
-    # Some ids are strs that look like nums, and pandas will cast them to float.
-    # This undoes that.
-    try:
-        x = float(x)
-        x = f"{x:.0f}"
-    except ValueError:
-        pass
-    return x
-    
+    Hashing is done column-wise over the whole frame, and columns are sorted by name first, so
+    the hash does not depend on column order.  Only the values are hashed, not the column names.
 
-def cleanup_youtube_link(link):
-    def _youtube_to_youtu_be(link):
-        prefixes = ["https://www.youtube.com", "https://m.youtube.com"]
-        for prefix in prefixes:
-            if link.startswith(prefix):
-                link = link.replace(prefix, "https://youtu.be")
-        return link
-    link = _youtube_to_youtu_be(link)
+    These ids differ from the md5 ids the scripts used before, so `PersonPicture`, and the iReal
+    `Chart` and Spotify `RefRec` rows, get new ids once, on the first rebuild.  Nothing outside
+    the DB refers to them:  variants are rebuilt with their pictures, derivatives are named by
+    content, and link statuses are keyed by link.
+    """
+    if len(df) == 0:
+        return pd.Series([], index=df.index, dtype=object)
+    df = df[sorted(df.columns)]
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return hashes.map("{:016x}".format)
+
+
+def _melt_non_empty(df, id_col, value_cols, value_name):
+    # Melt `value_cols` into a single `value_name` column, dropping missing values, and keeping
+    # the rows ordered as in `df`, then as in `value_cols`.
+    if len(value_cols) == 0:
+        return pd.DataFrame(columns=[id_col, value_name])
+    melted = df[[id_col, *value_cols]].assign(_row=range(len(df))).melt(
+        id_vars=[id_col, "_row"], value_vars=value_cols, value_name=value_name
+    )
+    melted = melted.loc[melted[value_name].notna() & (melted[value_name] != "")]
+    # melt stacks column by column, so a stable sort on the row restores row-major order
+    melted = melted.sort_values("_row", kind="stable")
+    return melted[[id_col, value_name]].reset_index(drop=True)
+
+
+def song_performers_from_song_perform(song_perform, me_id):
+    """
+    SongPerformer rows from the SongPerform sheet.
+
+    `instrument_id` is the instrument I played (if any), `other_player_*` columns hold the
+    PersonInstrument ids of everyone else playing on the song.
+    """
+    player_cols = [x for x in song_perform.columns if x.startswith("other_player_")]
+    players = song_perform[["id", "instrument_id", *player_cols]].copy()
+    me_playing = players["instrument_id"].notna() & (players["instrument_id"] != "")
+    players["instrument_id"] = (me_id + ":" + players["instrument_id"].astype(str)).where(me_playing)
 
-    if "?" in link:
-        link, params = link.split("?", 1)
-        params = params.split("&")
+    players = _melt_non_empty(
+        players, "id", ["instrument_id", *player_cols], "person_instrument_id"
+    ).rename(columns={"id": "song_perform_id"})
+    players.insert(0, "id", range(len(players)))
+    return players
 
-        if link.endswith("/watch"):
-            link = link[:-len("watch")]
-            uri = [param[2:] for param in params if param.startswith("v=")][0]
-            link += uri
-        kept_params = [x for x in params if x.startswith("t=")]
-        kept_params = "&".join(kept_params)
-        if kept_params != "":
-            link += f"?{kept_params}"
-    return link
 
+def performance_videos_from_song_perform(song_perform, source_id="youtube"):
+    """
+    PerformanceVideo rows from the `video` (and any `video_*`) columns of the SongPerform sheet.
+    """
+    video_cols = [x for x in song_perform.columns if x == "video" or x.startswith("video_")]
+    videos = _melt_non_empty(song_perform, "id", video_cols, "link")
+    videos = videos.rename(columns={"id": "song_perform_id"})
+    videos.insert(0, "id", range(len(videos)))
+    videos.insert(2, "source_id", source_id)
+    return videos
+
+
+_YOUTUBE_VIDEO_ID = re.compile(r"[\w-]+")
+_YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "youtu.be"}
+# Tables with `source_id` and `link` columns, which also store the link's `embeddable_link`
+EMBEDDABLE_LINK_TABLES = ["Chart", "RefRec", "PerformanceVideo"]
+
+
+@functools.lru_cache(maxsize=None)
+def cleanup_youtube_link(link):
+    """
+    Shortest form of a YouTube link, `https://youtu.be/<video id>`, keeping only the `t` param.
+    Links to anything but a YouTube video are returned unchanged.
+    """
+    parts = urlsplit(link)
+    if parts.netloc.lower() not in _YOUTUBE_HOSTS:
+        return link
+    params = parse_qsl(parts.query)
+    video_id = parts.path.strip("/")
+    if parts.path.rstrip("/") == "/watch":
+        video_id = next((val for key, val in params if key == "v"), "")
+    if not _YOUTUBE_VIDEO_ID.fullmatch(video_id):
+        return link
+    kept_params = urlencode([(key, val) for key, val in params if key == "t"])
+    return urlunsplit(("https", "youtu.be", f"/{video_id}", kept_params, ""))
 
+
+@functools.lru_cache(maxsize=None)
 def create_embed_link(source, link):
     embed_link = ""
     if source.lower() == "youtube":
@@ -50,27 +107,70 @@ def create_embed_link(source, link):
 
 
 def _youtube_link_to_embed(link):
-    embed_pref = "https://youtube.com/embed/"
-    for prefix in ["https://youtu.be/", "https://youtube.com/"]:
-        if link.startswith(prefix):
-            embed_link = link.replace(prefix, embed_pref)
-            if "?" in embed_link:
-                embed_link, params = embed_link.split("?")
-                params = params.split("&")
-                for idx, param in enumerate(params):
-                    if param.startswith("t="):
-                        params[idx] = param.replace("t=", "start=")
-                embed_link = embed_link + "?" + "&".join(params)
-            return embed_link
-    return ""
+    parts = urlsplit(link)
+    if parts.netloc.lower() in _YOUTUBE_HOSTS and parts.path.startswith("/embed/"):
+        return link
+    parts = urlsplit(cleanup_youtube_link(link))
+    if parts.netloc != "youtu.be":
+        return ""
+    params = [("start" if key == "t" else key, val) for key, val in parse_qsl(parts.query)]
+    return urlunsplit(("https", "youtube.com", f"/embed{parts.path}", urlencode(params), ""))
 
 
 def _spotify_link_to_embed(link):
-    if "embed" in link:
-        embed_link = link
-    else:
-        pattern = "spotify.com/"
-        prefix, content = link.split(pattern)
-        prefix = f"{prefix}{pattern}embed/"
-        embed_link = f"{prefix}{content}"
-    return embed_link
+    parts = urlsplit(link)
+    if not parts.netloc.lower().endswith("spotify.com"):
+        return ""
+    if parts.path.startswith("/embed/"):
+        return link
+    return urlunsplit(parts._replace(path=f"/embed{parts.path}"))
+
+
+def add_embeddable_links(df):
+    """
+    `df` with an `embeddable_link` column, computed from its `source_id` and `link` columns.
+
+    This is done once, when rows are loaded, rather than every time the link is displayed.  Each
+    distinct link is only converted once.
+    """
+    return df.assign(
+        embeddable_link=[
+            create_embed_link(source, link) for source, link in zip(df["source_id"], df["link"])
+        ]
+    )
+
+
+def row_delta(existing, desired, key, managed_keys=(), keep_existing=()):
+    """
+    The rows to insert, update and delete to get from `existing` to `desired`, matched on `key`.
+
+    Rows of `existing` are only ever deleted if their key is in `managed_keys`, i.e., rows that
+    came from somewhere else are left alone.  The `keep_existing` columns, e.g., a primary key
+    other than `key`, are not compared, and updated rows keep their existing values.  Returns a
+    dict of `insert` and `update` DataFrames (with the columns of `desired`) and a `delete` list
+    of keys.
+    """
+    columns = list(desired.columns)
+    # columns `existing` lacks (e.g., left to a DB default) compare as missing
+    existing = existing.reindex(columns=columns)
+
+    merged = desired.merge(
+        existing, on=key, how="left", suffixes=("", "_existing"), indicator=True
+    )
+    is_new = merged["_merge"] == "left_only"
+    differs = pd.Series(False, index=merged.index)
+    for col in columns:
+        if col == key or col in keep_existing:
+            continue
+        new, old = merged[col], merged[f"{col}_existing"]
+        differs |= (new != old) & ~(new.isna() & old.isna())
+
+    update = merged.loc[~is_new & differs]
+    update = update.assign(**{col: update[f"{col}_existing"] for col in keep_existing})
+
+    is_stale = existing[key].isin(set(managed_keys)) & ~existing[key].isin(set(desired[key]))
+    return {
+        "insert": merged.loc[is_new, columns].reset_index(drop=True),
+        "update": update[columns].reset_index(drop=True),
+        "delete": existing.loc[is_stale, key].tolist(),
+    }
@@ -1,141 +1,141 @@
+import os
 import sys
 import copy
 import argparse
-import hashlib
 import json
+import multiprocessing
 import tqdm
 import PyPDF2
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from shutil import rmtree
 
 REPO_ROOT = Path("./").absolute()
 sys.path.append(str(REPO_ROOT))
 
+from jamdb.assets import build_asset_manifest
+from jamdb.build_cache import FileManifest, digest
 from jamdb.db import DBHandler
+from jamdb.documents import sync_documents
+from jamdb.ireal import parse_ireal_playlist_html
+from jamdb.matching import SongNameIndex, normalize_song_name
+from jamdb.run_report import RUN_REPORTS_DIR, RunReport, file_size
+from jamdb.transformations import add_embeddable_links, hash_rows, row_delta
 
 SRC_DATA_DIR = REPO_ROOT / "data" / "source_data"
+CHART_MANIFEST_FILE = "chart_manifest.json"
+CHART_COLUMNS = ["song_id", "source_id", "link", "display_name"]
+
+
+def build_ireal_song_index(jam_songs):
+    # normalized iReal name -> jam db song id.  If several songs claim the same iReal chart,
+    # the first one wins.
+    index = {}
+    for song_id, song in jam_songs.items():
+        for ireal in song.get("from_ireal", []):
+            index.setdefault(ireal["normalized_name"], song_id)
+    return index
+
+
+def _page_hash(page, ireal_song):
+    # The page's drawing instructions, plus any images / forms it draws
+    contents = page.get_contents()
+    parts = [b"" if contents is None else contents.get_data()]
+    xobjects = page.get("/Resources", {}).get("/XObject", {})
+    for name in sorted(xobjects):
+        parts.append(xobjects[name].get_object().get_data())
+    return digest(*parts, json.dumps(ireal_song, sort_keys=True))
+
+
+def _is_current(output_filestem, page_hash):
+    pdf_file = Path(f"{output_filestem}.pdf")
+    json_file = Path(f"{output_filestem}.json")
+    if not (pdf_file.exists() and json_file.exists()):
+        return False
+    try:
+        return json.loads(json_file.read_text()).get("page_hash") == page_hash
+    except json.JSONDecodeError:
+        return False
+
+
+def _write_chart_pages(pdf_file, jobs):
+    # Runs in a worker process, each worker opens its own reader
+    pdf_reader = PyPDF2.PdfReader(str(pdf_file))
+    counts = {"written": 0, "skipped": 0}
+    for page_num, output_filestem, ireal_song in jobs:
+        page = pdf_reader.pages[page_num]
+        page_hash = _page_hash(page, ireal_song)
+        if _is_current(output_filestem, page_hash):
+            counts["skipped"] += 1
+            continue
+
+        Path(output_filestem).parent.mkdir(parents=True, exist_ok=True)
+        pdf_writer = PyPDF2.PdfWriter()
+        pdf_writer.add_page(page)
+        with open(f"{output_filestem}.pdf", 'wb') as fh:
+            pdf_writer.write(fh)
+        with open(f"{output_filestem}.json", 'w') as fh:
+            json.dump({**ireal_song, "page_hash": page_hash}, fh)
+        counts["written"] += 1
+    return counts
+
+
+def prune_charts(charts_dir, keep_filestems):
+    # Everything in `charts_dir` is generated, so any file not from a current chart is stale
+    keep_files = {Path(f"{stem}{suffix}") for stem in keep_filestems for suffix in [".pdf", ".json"]}
+    removed = 0
+    if not charts_dir.exists():
+        return removed
+    for path in sorted(charts_dir.rglob("*"), reverse=True):
+        if path.is_file() and path not in keep_files:
+            path.unlink()
+            removed += 1
+        elif path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
+    return removed
+
+
+def write_charts(pdf_file, ireal_songs_list, jam_songs, charts_dir, max_workers=None):
+    """
+    Split `pdf_file` into one chart per matched song, under `charts_dir/<song id>/`.
 
-
-def row_to_hash(row):
-    return hashlib.md5(str(row.to_dict().values()).encode()).hexdigest()
-
-
-def normalize_song_name(song_name):
-    song_name = song_name.lower().strip()
-    for start in ["a ", "an ", "the "]:
-        if song_name.startswith(start):
-            song_name = song_name[len(start):]
-
-    puncts = list("[](){},.?!';:-+=") + ['"']
-    for punct in puncts:
-        song_name = song_name.replace(punct, "")
-    song_name = song_name.strip()
-    song_name = song_name.replace(" ", "_")
-    return song_name
-
-
-def parse_ireal_playlist_html(html_file):
-    # export playlist from iReal and save to disk to get the html file
-    songs = []
-    host = "irealb://"
-
-    if not isinstance(html_file, Path):
-        html_file = Path(html_file)
-
-    content = html_file.read_text()
-    content = content[content.find("<body"):]
-    content = content[:content.find("</body>")] + "</body>"
-    for br in ["<br>", "<br/>", "<br />"]:
-        content = content.replace(br, " ")
-    
-    content = content.strip()
-        
-    _, content = content.split("<h3>", 1)
-    a_href, content = content.split("</h3>")
-    _, a_href = a_href.split(host)
-    a_href = a_href.split('">')[0].strip()
-    a_hrefs = [f"{host}{href}" for href in a_href.split("===")]
-    # always appear to be 1 more than expected, and last is very small and not a song -- maybe playist name?    
-    a_hrefs = a_hrefs[:-1]    
-    
-    names = content.split("</p>")[0].split("<p>")[-1].strip()
-
-    if names.startswith("1. "):
-        names = names[3:]
-
-    names += f" {len(a_hrefs) + 1}. "
-
-    for idx, href in tqdm.tqdm(enumerate(a_hrefs)):
-        split_point = f" {idx + 2}. "
-        name, names = names.split(split_point)
-        name = name.strip()
-
-        for ex_name in ["Blues", "Modal"]:
-            if name.startswith(f"{ex_name} - "):
-                name = name.replace(f"{ex_name} - ", f"{ex_name} : ")
-        try:
-            song_name, composers = name.split(" - ", 1)
-        except ValueError as exc:
-            print(f"{name}; {exc}")
-            song_name = name.strip()
-            composers = ""
-        song_name = song_name.strip()
-        song_name = song_name.replace("(RBB)", "").strip()
-        if song_name.endswith(", The"):
-            song_name = ("The " + song_name[:-len(", The")]).strip()
-            
-        composers = composers.strip()
-        songs.append(
-            {
-                "song_name": song_name,
-                "composers": composers,
-                "i_real_href": href,
-                "dirty_name": name,
-                "normalized_name": normalize_song_name(song_name)
-            }
-        )
-    return songs
-
-
-def write_charts(pdf_file, ireal_songs_list, jam_songs, charts_dir):
+    Charts whose page and iReal data are unchanged are left as they are, and charts that are no
+    longer matched to any song are removed.
+    """
     charts_dir = Path(charts_dir)
-
-    with open(pdf_file, 'rb') as fh:
-        pdf_reader = PyPDF2.PdfReader(fh)
-        num_pages = len(pdf_reader.pages)
-        assert len(ireal_songs_list) == num_pages
-        
-        for page_num in tqdm.tqdm(range(num_pages)):
-            ireal_song = ireal_songs_list[page_num]
-            normalized_name = ireal_song["normalized_name"]
-
-            song_id = None
-            for id_, song in jam_songs.items():
-                for ireal in song.get("from_ireal", []):
-                    if normalized_name == ireal["normalized_name"]:
-                        song_id = id_
-                        break
-                if song_id is not None:
-                    break
-                # If we've already found it, stop looking
-
-            if song_id is None:
-                # if we haven't found it, then don't write pdfs
-                continue
-
-            ireal_song_name = ireal_song["normalized_name"]
-            song_dir = charts_dir / song_id
-            song_dir.mkdir(parents=True, exist_ok=True)
-            output_filestem = song_dir / f"{ireal_song_name}_ireal"
-            
-            pdf_writer = PyPDF2.PdfWriter()
-            pdf_writer.add_page(pdf_reader.pages[page_num])
-
-            with open(f"{output_filestem}.pdf", 'wb') as fh:
-                pdf_writer.write(fh)
-            with open(f"{output_filestem}.json", 'w') as fh:
-                json.dump(ireal_song, fh)
+    song_index = build_ireal_song_index(jam_songs)
+
+    num_pages = len(PyPDF2.PdfReader(str(pdf_file)).pages)
+    assert len(ireal_songs_list) == num_pages
+
+    jobs = []
+    for page_num, ireal_song in enumerate(ireal_songs_list):
+        song_id = song_index.get(ireal_song["normalized_name"])
+        if song_id is None:
+            # if we haven't found it, then don't write pdfs
+            continue
+        output_filestem = charts_dir / song_id / f"{ireal_song['normalized_name']}_ireal"
+        jobs.append((page_num, str(output_filestem), ireal_song))
+
+    # contiguous runs of pages per worker
+    max_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(jobs) // max_workers))
+    chunks = [jobs[idx:idx + chunk_size] for idx in range(0, len(jobs), chunk_size)]
+
+    counts = {"written": 0, "skipped": 0}
+    # spawned, not forked, as `sync_all` runs this in a thread, next to other threads
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+        futures = [pool.submit(_write_chart_pages, pdf_file, chunk) for chunk in chunks]
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
+            for key, val in future.result().items():
+                counts[key] += val
+    counts["removed"] = prune_charts(charts_dir, [Path(job[1]) for job in jobs])
+    print(
+        f"    Chart pages written: {counts['written']}, unchanged: {counts['skipped']}, "
+        f"removed: {counts['removed']}"
+    )
+    return counts
 
 
 def append_from_ireal(song, ireal_song):
@@ -146,19 +146,23 @@ def append_from_ireal(song, ireal_song):
         song["from_ireal"].append(copy.deepcopy(ireal_song))
 
 
-def create_charts_from_ireal(db_handler, source_dir, output_data_dir):
+def create_charts_from_ireal(db_handler, source_dir, output_data_dir, songs=None, run_report=None):
     """
     On recurring basis, 
     1. Go into iReal and create a playlist with ALL songs.
     2. Then **Share** and select "Save to Disk", this will save an html file, rename to `ireal_charts.html`
     3. The repeat, but second time, save as pdf, and name `ireal_charts.pdf`
-    4. This function will TRY to match db songs to the iReal songs, but matching won't be perfect.
-       Thus, we use `ireal_name_mapping.csv` for pairs that are not auto-matched.
+    4. This function will TRY to match db songs to the iReal songs, exactly and then fuzzily, but
+       matching won't be perfect.  Thus, we use `ireal_name_mapping.csv` for pairs that are not
+       auto-matched (pairs in the file take precedence over fuzzy matches).
     These 3 files all need to be placed in `source_dir`.
 
     When this job runs, it will report on which jam db songs don't have matching iReal.
     Review this report on recurring basis, both the append name matches when needed AND
     to inform which iReal charts need to be creaed.    
+
+    `songs` is the `Song` table to match against, read from the DB if not given.  The stages
+    are recorded in `run_report`, if given.
     """
 
     # TODO - gracefully fail if ireal charts are not provided
@@ -171,38 +175,71 @@ def create_charts_from_ireal(db_handler, source_dir, output_data_dir):
     name_mapping_file = source_dir / "ireal_name_mapping.csv"
 
     charts_dir = output_data_dir / "charts"
-    if charts_dir.exists():
-        print(f"Removing {charts_dir}")
-        rmtree(charts_dir)
-
-    
     reports_dir = output_data_dir / "reports"
 
 
-    songs_from_ireal_list = parse_ireal_playlist_html(html_playlist)
+    run_report = run_report or RunReport("create_charts_from_ireal")
+
+    with run_report.stage("parse_ireal_html", bytes_read=file_size(html_playlist)) as stage:
+        songs_from_ireal_list = parse_ireal_playlist_html(html_playlist)
+        stage.rows_out = len(songs_from_ireal_list)
     assert len({row["normalized_name"] for row in songs_from_ireal_list}) == len(songs_from_ireal_list)
     songs_from_ireal = {row["normalized_name"]: row for row in songs_from_ireal_list}
 
-    songs_in_jam_db = {
-        row["id"]: {
-            "song_name_in_jam_db": row["song"],
-            "normalized_name": normalize_song_name(row["song"])
+    with run_report.stage("match_songs", bytes_read=file_size(name_mapping_file)) as stage:
+        songs_in_jam_db = {
+            row["id"]: {
+                "song_name_in_jam_db": row["song"],
+                "normalized_name": normalize_song_name(row["song"])
+            }
+            for _, row in (db_handler.read_table("Song") if songs is None else songs)[["id", "song"]].iterrows()
         }
-        for _, row in db_handler.read_table("Song")[["id", "song"]].iterrows()
-    }
     
-    name_mapping = pd.read_csv(name_mapping_file).to_numpy().tolist()
+        name_mapping = pd.read_csv(name_mapping_file).to_numpy().tolist()
 
-    for song_id, song in songs_in_jam_db.items():
-        if song["normalized_name"] in songs_from_ireal:
-            name_mapping.append([song_id, song["normalized_name"]])
-    
-    for row in name_mapping:
-        song = songs_in_jam_db[row[0]]
-        i_real_song = songs_from_ireal[row[1]]
-        append_from_ireal(song, i_real_song)
+        for song_id, song in songs_in_jam_db.items():
+            if song["normalized_name"] in songs_from_ireal:
+                name_mapping.append([song_id, song["normalized_name"]])
 
-    write_charts(pdf_playlist, songs_from_ireal_list, songs_in_jam_db, charts_dir)
+        # Fuzzy match what is left, i.e., iReal charts not yet mapped, to songs without a chart
+        song_index = SongNameIndex(
+            {song_id: song["song_name_in_jam_db"] for song_id, song in songs_in_jam_db.items()}
+        )
+        mapped_song_ids = {row[0] for row in name_mapping}
+        mapped_ireal_names = {row[1] for row in name_mapping}
+        fuzzy_matches = []
+        for ireal_song in songs_from_ireal_list:
+            if ireal_song["normalized_name"] in mapped_ireal_names:
+                continue
+            match = song_index.match(ireal_song["song_name"])
+            if match is None or match[0] in mapped_song_ids:
+                continue
+            song_id, score = match
+            name_mapping.append([song_id, ireal_song["normalized_name"]])
+            mapped_song_ids.add(song_id)
+            fuzzy_matches.append(
+                [song_id, songs_in_jam_db[song_id]["song_name_in_jam_db"], ireal_song["song_name"], round(score, 3)]
+            )
+
+        unresolved_mappings = []
+        for row in name_mapping:
+            if row[0] not in songs_in_jam_db or row[1] not in songs_from_ireal:
+                # e.g., the song or the iReal chart was renamed since the row was added
+                unresolved_mappings.append(row)
+                continue
+            song = songs_in_jam_db[row[0]]
+            i_real_song = songs_from_ireal[row[1]]
+            append_from_ireal(song, i_real_song)
+        stage.rows_in = len(songs_in_jam_db)
+        stage.rows_out = sum(1 for song in songs_in_jam_db.values() if song.get("from_ireal"))
+        stage.details["fuzzy_matches"] = len(fuzzy_matches)
+        stage.details["unresolved_mappings"] = len(unresolved_mappings)
+
+    with run_report.stage("write_charts", bytes_read=file_size(pdf_playlist)) as stage:
+        counts = write_charts(pdf_playlist, songs_from_ireal_list, songs_in_jam_db, charts_dir)
+        stage.rows_in = len(songs_from_ireal_list)
+        stage.rows_out = counts["written"]
+        stage.details.update(counts)
 
     no_ireal = sorted(list({id_ for id_, song in songs_in_jam_db.items() if song.get("from_ireal", []) == []}))
     
@@ -216,38 +253,93 @@ def create_charts_from_ireal(db_handler, source_dir, output_data_dir):
     with open(no_ireal_file, "w") as fh:
         fh.write("\n".join(no_ireal))
 
+    fuzzy_matches_file = reports_dir / "ireal_fuzzy_matches.csv"
+    if len(fuzzy_matches) > 0:
+        print(f"\n{len(fuzzy_matches)} songs fuzzily matched to iReal charts.")
+        print(f"\tCheck {fuzzy_matches_file}")
+    pd.DataFrame(
+        fuzzy_matches, columns=["song_id", "song_name_in_jam_db", "ireal_song_name", "score"]
+    ).to_csv(fuzzy_matches_file, index=None)
+
+    unresolved_mappings_file = reports_dir / "ireal_unresolved_name_mappings.csv"
+    if len(unresolved_mappings) > 0:
+        print(f"\n{len(unresolved_mappings)} name mappings with no matching song or iReal chart.")
+        print(f"\tCheck {unresolved_mappings_file}")
+    pd.DataFrame(
+        unresolved_mappings, columns=["song_id", "ireal_normalized_name"]
+    ).to_csv(unresolved_mappings_file, index=None)
+
+
+def chart_from_file(data_dir, chart_file):
+    chart = {"song_id": chart_file.parent.name}
+    if chart_file.suffix == ".pdf":
+        chart["source_id"] = "pdf"
+        chart["link"] = str(chart_file.relative_to(data_dir))
+        chart["display_name"] = chart_file.stem
+    elif chart_file.suffix == ".json" and chart_file.stem.endswith("_ireal"):
+        data = json.loads(chart_file.read_text())
+        chart["source_id"] = "ireal"
+        chart["link"] = data["i_real_href"]
+        chart["display_name"] = f"{data['song_name']} (click to download into iReal)"
+    else:
+        print(f"Unkown chart format:  {chart_file}")
+        return None
+    return chart
+
+
+def plan_chart_sync(data_dir, existing_charts):
+    """
+    The delta of `Chart` rows to get from `existing_charts` to the charts in `data_dir / "charts"`.
 
-def process_charts(data_dir, charts_df):
-    ireal_charts = []
-    for song_dir in (data_dir / "charts").glob("*"):
-        for chart_file in song_dir.glob("*"):
-            chart = {"song_id": song_dir.stem}
-            if chart_file.suffix == ".pdf":
-                chart["source_id"] = "pdf"
-                chart["link"] = str(chart_file.relative_to(data_dir))
-                chart["display_name"] = chart_file.stem
-            elif chart_file.suffix == ".json" and chart_file.stem.endswith("_ireal"):
-                data = json.loads(chart_file.read_text())
-                chart["source_id"] = "ireal"
-                chart["link"] = data["i_real_href"]
-                chart["display_name"] = f"{data['song_name']} (click to download into iReal)"            
-            else:
-                print(f"Unkown chart format:  {chart_file}")
-                continue
-            ireal_charts.append(copy.deepcopy(chart))
-    ireal_charts = pd.DataFrame(ireal_charts)
-
-    ireal_charts["id"] = ireal_charts.apply(row_to_hash, axis=1)
-    print(f"    Original size of Charts df:  {charts_df.shape}")
-    print(f"    Size of iReal Charts:        {ireal_charts.shape}")
-    already_seen_charts = set(charts_df["id"])
-    charts_df = (
-        ireal_charts.loc[
-            ireal_charts["id"].apply(lambda x: x not in already_seen_charts)
-        ]
+    A manifest of per-file hashes (and the row each file gave) is kept, so only new or changed
+    files are parsed.  Rows are matched on `link`, and a row is deleted only if it came from a
+    chart file that is gone.  Returns the updated manifest too, save it once the delta is applied.
+    """
+    data_dir = Path(data_dir)
+    manifest = FileManifest(data_dir / CHART_MANIFEST_FILE)
+    previous_links = {row["link"] for row in manifest.derived().values() if row is not None}
+    changes = manifest.update(data_dir / "charts", lambda path: chart_from_file(data_dir, path))
+    print(
+        "    Chart files added: {}, changed: {}, removed: {}, unchanged: {}".format(
+            *[len(changes[x]) for x in ["added", "changed", "removed", "unchanged"]]
+        )
     )
-    print(f"    Number of NEW charts:        {charts_df.shape}")    
-    return charts_df
+
+    charts = pd.DataFrame(
+        [row for row in manifest.derived().values() if row is not None], columns=CHART_COLUMNS
+    )
+    charts.insert(0, "id", hash_rows(charts))
+    charts = add_embeddable_links(charts)
+    # ids are content hashes, so a changed chart gets a new one, keep the row's existing id
+    delta = row_delta(
+        existing_charts, charts, key="link", managed_keys=previous_links, keep_existing=["id"]
+    )
+    return manifest, delta
+
+
+def apply_chart_delta(db_handler, delta, session, table_name="Chart"):
+    db_handler.delete(table_name, delta["delete"], key="link", session=session)
+    db_handler.update(table_name, delta["update"].to_dict(orient="records"), key="link", session=session)
+    db_handler.insert(table_name, delta["insert"].to_dict(orient="records"), session=session)
+    counts = {action: len(delta[action]) for action in ["insert", "update", "delete"]}
+    print(f"    Chart rows inserted: {counts['insert']}, updated: {counts['update']}, deleted: {counts['delete']}")
+    return counts
+
+
+def sync_charts(db_handler, data_dir, table_name="Chart", run_report=None):
+    run_report = run_report or RunReport("sync_charts")
+    with run_report.stage("plan_chart_sync") as stage:
+        manifest, delta = plan_chart_sync(data_dir, db_handler.read_table(table_name))
+        stage.rows_out = sum(len(delta[action]) for action in ["insert", "update", "delete"])
+    with run_report.stage("apply_chart_delta") as stage:
+        with db_handler.Session.begin() as session:
+            counts = apply_chart_delta(db_handler, delta, session, table_name=table_name)
+        # only record the new state once the DB has it
+        manifest.save()
+        stage.rows_in = sum(counts.values())
+        stage.rows_out = counts["insert"] + counts["update"]
+        stage.details.update(counts)
+    return counts
 
 
 if __name__ == "__main__":
@@ -263,17 +355,22 @@ if __name__ == "__main__":
         db_file = data_dir / "jamming.db"
     db_file = Path(db_file)
     db_handler = DBHandler.from_db_file(db_file)
+    run_report = RunReport("charts_from_ireal_setlist", db_file=db_file)
 
     create_charts_from_ireal(
         db_handler=db_handler,
         source_dir=SRC_DATA_DIR,
-        output_data_dir=data_dir
+        output_data_dir=data_dir,
+        run_report=run_report
     )
-    table_name = "Chart"
+    sync_charts(db_handler, data_dir, run_report=run_report)
+    print("Chart table updated!")
+
+    with run_report.stage("asset_manifest") as stage:
+        stage.rows_out = len(build_asset_manifest(db_handler, data_dir))
+    print("Asset manifest updated!")
 
-    existing_charts = db_handler.read_table(table_name)
+    with run_report.stage("entity_docs") as stage:
+        stage.details["documents"] = sync_documents(db_file)
 
-    df = process_charts(data_dir, existing_charts)
-    db_handler.insert(table_name, df.to_dict(orient="records"))
-            
-    print(f"{table_name} table updated!")
+    run_report.write(data_dir / RUN_REPORTS_DIR)
@@ -0,0 +1,70 @@
+# Check the external links (charts, reference recordings, performance videos) in the DB.
+#
+# Results are cached in the DB's `_link_status` table, so a re-run only checks links whose last
+# check is older than `--ttl_hours` (or all of them, with `--force`).  Broken links are written to
+# `<data_dir>/reports/broken_links.csv`.
+
+import sys
+import argparse
+
+from pathlib import Path
+
+import pandas as pd
+
+REPO_ROOT = Path("./").absolute()
+sys.path.append(str(REPO_ROOT))
+
+from jamdb.db import DBHandler
+from jamdb.linkcheck import DEFAULT_TTL, LINK_TABLES, LinkChecker, broken_links
+
+
+def check_links(db_handler, output_data_dir, table_names=LINK_TABLES, force=False, **checker_kwargs):
+    checker = LinkChecker(db_handler, **checker_kwargs)
+    stats = checker.run(table_names, force=force)
+    print(
+        f"    Links checked: {stats['checked']}, still fresh: {stats['cached']}, "
+        f"broken: {stats['broken']}"
+    )
+
+    reports_dir = output_data_dir / "reports"
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    broken = pd.DataFrame(
+        broken_links(db_handler, table_names),
+        columns=["table_name", "id", "link", "status", "error", "checked_at"]
+    )
+    broken_links_file = reports_dir / "broken_links.csv"
+    broken.to_csv(broken_links_file, index=False)
+    print(f"    {len(broken)} rows with broken links.  See {broken_links_file}")
+    return stats
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='check links')
+    parser.add_argument('data_dir')
+    parser.add_argument('--db_file')
+    parser.add_argument('--table', action='append', dest='table_names', choices=LINK_TABLES)
+    parser.add_argument('--ttl_hours', type=float, default=DEFAULT_TTL / 3600)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--per_host', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--force', action='store_true', help="Re-check links still within the TTL")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_file = args.db_file
+    if db_file is None:
+        db_file = data_dir / "jamming.db"
+    db_file = Path(db_file)
+    db_handler = DBHandler.from_db_file(db_file)
+
+    check_links(
+        db_handler,
+        data_dir,
+        table_names=args.table_names or LINK_TABLES,
+        force=args.force,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        ttl=args.ttl_hours * 3600,
+        timeout=args.timeout
+    )
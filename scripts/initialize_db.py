@@ -7,12 +7,12 @@
 import sys
 import os
 import argparse
-import hashlib
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from shutil import copytree, rmtree
+from shutil import copyfile
 import sqlalchemy
-import eralchemy
 import pandas as pd
 
 from pandas_ods_reader import read_ods
@@ -20,8 +20,22 @@ from pandas_ods_reader import read_ods
 REPO_ROOT = Path("./").absolute()
 sys.path.append(str(REPO_ROOT))
 
+from jamdb.assets import build_asset_manifest
+from jamdb.build_cache import BuildCache, digest, file_digest, schema_digest, sync_tree
 from jamdb.db import DBHandler
-from jamdb.transformations import format_id_as_str
+from jamdb.documents import sync_documents
+from jamdb.entity_docs import ENTITY_DOC_TABLES
+from jamdb.images import make_person_picture_variants
+from jamdb.loading import LoadCheckpoint, LoadPlanner, format_load_report
+from jamdb.run_report import RUN_REPORTS_DIR, RunReport, file_size
+from jamdb.transformations import (
+    EMBEDDABLE_LINK_TABLES,
+    add_embeddable_links,
+    format_id_as_str,
+    hash_rows,
+    performance_videos_from_song_perform,
+    song_performers_from_song_perform,
+)
 from jamdb.globals import ME_ID
 
 SQL_FILE = Path("jamdb/jamming.sql")
@@ -29,10 +43,12 @@ DOCS_DIR = Path("docs")
 SRC_DATA_DIR = REPO_ROOT / "data" / "source_data"
 ODS_FILE = SRC_DATA_DIR / "public.ods"
 DATA_SUB_DIRS = ["people"]
-
-
-def row_to_hash(row):
-    return hashlib.md5(str(row.to_dict().values()).encode()).hexdigest()
+# These tables are not sheets in the ODS file, their rows are created while loading another table
+PRODUCED_BY = {
+    "PerformanceVideo": "SongPerform",
+    "PersonPictureVariant": "PersonPicture",
+    "SongPerformer": "SongPerform",
+}
 
 
 def _parse_sql_file(sql_file):
@@ -48,60 +64,25 @@ def _parse_sql_file(sql_file):
     return commands
 
 
-def _sorted_table_names():
-    # When inserting, need to insert in correct order, regarding FKs
-    # Here I assume the order of tabels in the sql file addresses the order
-    
-    sql_commands = _parse_sql_file(SQL_FILE)
-    table_names = [x.split(" ", 3)[2] for x in sql_commands if x.startswith("CREATE TABLE")]
-    table_names = [x for x in table_names if not x.startswith("_")]
-    
-    return table_names
-
-
 def create_tables(db_handler):
     with db_handler.Session.begin() as session:
         for command in _parse_sql_file(SQL_FILE):
             session.execute(sqlalchemy.text(command))
 
 
-def insert_for_song_performance(db_handler, song_perform, me_id=ME_ID):
-    song_performers = []
-    videos = []
-    
-    for _, song in song_perform.iterrows():
-        sp_id = song["id"]
-        if song["instrument_id"] is not None:
-            song_performers.append(
-                {
-                    "id": len(song_performers),
-                    "song_perform_id": sp_id, 
-                    "person_instrument_id": f"{me_id}:{song['instrument_id']}"
-                }
-            )
-        for key, val in song.items():
-            if key.startswith("other_player_") and val is not None:
-                song_performers.append(
-                    {
-                        "id": len(song_performers),                        
-                        "song_perform_id": sp_id, 
-                        "person_instrument_id": val
-                    }
-                )
-            if key == "video" and val is not None:
-                videos.append(
-                    {
-                        "id": len(videos),                        
-                        "song_perform_id": sp_id,
-                        "source_id": "youtube",
-                        "link": val
-                    }
-                )
+def insert_for_song_performance(db_handler, song_perform, me_id=ME_ID, session=None):
+    song_performers = song_performers_from_song_perform(song_perform, me_id)
+    videos = add_embeddable_links(performance_videos_from_song_perform(song_perform))
 
     song_perform = song_perform[["id", "event_occ_id", "song_id", "key_id"]]
-    db_handler.insert("SongPerform", song_perform.to_dict(orient="records"))
-    db_handler.insert("SongPerformer", song_performers)
-    db_handler.insert("PerformanceVideo", videos)
+    db_handler.insert("SongPerform", song_perform.to_dict(orient="records"), session=session)
+    db_handler.insert("SongPerformer", song_performers.to_dict(orient="records"), session=session)
+    db_handler.insert("PerformanceVideo", videos.to_dict(orient="records"), session=session)
+    return {
+        "SongPerform": len(song_perform),
+        "SongPerformer": len(song_performers),
+        "PerformanceVideo": len(videos)
+    }
 
 
 def process_person_picture(data_dir):
@@ -116,10 +97,45 @@ def process_person_picture(data_dir):
             person_pictures.append({"person_id": person_id, "link": link, "source_id": source_id})
 
     person_pictures = pd.DataFrame(person_pictures)
-    person_pictures["id"] = person_pictures.apply(row_to_hash, axis=1)
+    person_pictures["id"] = hash_rows(person_pictures)
     return person_pictures
 
 
+def extract_table(table_name, data_dir):
+    if table_name == "PersonPicture":
+        df = process_person_picture(data_dir)
+        return df, make_person_picture_variants(data_dir, df)
+
+    df = read_ods(ODS_FILE, table_name)
+
+    if table_name == "Venue":
+        df["zip"] = df["zip"].apply(format_id_as_str)
+
+    if isinstance(df["id"].iloc[0], (float, int)):
+        df["id"] = df["id"].apply(format_id_as_str)
+    return df
+
+
+def load_table(db_handler, table_name, df, session):
+    if table_name == "SongPerform":
+        return insert_for_song_performance(db_handler, df, session=session)
+    if table_name == "PersonPicture":
+        df, variants = df
+        db_handler.insert(table_name, df.to_dict(orient="records"), session=session)
+        db_handler.insert("PersonPictureVariant", variants.to_dict(orient="records"), session=session)
+        return {table_name: len(df), "PersonPictureVariant": len(variants)}
+    if table_name in EMBEDDABLE_LINK_TABLES:
+        df = add_embeddable_links(df)
+    db_handler.insert(table_name, df.to_dict(orient="records"), session=session)
+
+
+def render_erd(db_file, erd_file, exclude_tables):
+    # eralchemy is slow to import, and the ERD is only rebuilt when the schema changes
+    import eralchemy
+
+    eralchemy.render_er(f"sqlite:///{db_file}", str(erd_file), exclude_tables=exclude_tables)
+
+
 def write_data_model_md(db_handler, erd_file):
     erd_file = str(erd_file.relative_to(DOCS_DIR))
     tables = db_handler.read_table('_schema_tables').to_dict(orient="records")
@@ -163,57 +179,96 @@ if __name__ == "__main__":
         db_file = data_dir / "jamming.db"
     db_file = Path(db_file)
     force_rebuild = args.force_rebuild
+    checkpoint = LoadCheckpoint(db_file.with_name(f"{db_file.stem}.load_checkpoint.json"))
+    run_report = RunReport("initialize_db", db_file=db_file, force_rebuild=force_rebuild)
+
+    build_cache_file = data_dir / "build_cache.json"
 
     if force_rebuild:
         if db_file.exists():
             os.remove(db_file)
-        for sub_dir in DATA_SUB_DIRS:
-            dir_ = data_dir / sub_dir
-            print(dir_)
-            if dir_.exists():
-                print(f"Removing {dir_}")
-                rmtree(dir_)
-
-    if db_file.exists():
-        print(f"{db_file=} already exists.")
-    else:
-        db_handler = DBHandler.from_db_file(db_file)
+        if build_cache_file.exists():
+            os.remove(build_cache_file)
+        checkpoint.clear()
 
+    with run_report.stage("sync_data_dirs") as stage:
         for sub_dir in DATA_SUB_DIRS:
             src_dir = SRC_DATA_DIR / sub_dir
             dest_dir = data_dir / sub_dir
-            print(f"Copy {src_dir} over to {dest_dir}")
-            copytree(src_dir, dest_dir)
-
-        print("Creating tables")
-        create_tables(db_handler)
-
-        for table_name in _sorted_table_names():
-            print(f"Inserting into {table_name}")
-            if table_name in ["PerformanceVideo", "SongPerformer"]:
-                continue
-
-            if table_name == "PersonPicture":
-                df = process_person_picture(data_dir)
-            else:
-                df = read_ods(ODS_FILE, table_name)
-
-            if table_name == "Venue":
-                df["zip"] = df["zip"].apply(format_id_as_str)
-            
-            if isinstance(df["id"].iloc[0], (float, int)):
-                df["id"] = df["id"].apply(format_id_as_str)
-
-            if table_name == "SongPerform":
-                insert_for_song_performance(db_handler, df)
-            else:
-                db_handler.insert(table_name, df.to_dict(orient="records"))
-            
+            print(f"Syncing {src_dir} over to {dest_dir}")
+            sync_stats = sync_tree(src_dir, dest_dir)
+            print(f"    {sync_stats}")
+            stage.details[sub_dir] = sync_stats
+
+    db_exists = db_file.exists()
+    db_handler = DBHandler.from_db_file(db_file)
+    if not db_exists and checkpoint.exists():
+        # the DB the checkpoint was for is gone, e.g., deleted after a failed load
+        print(f"Discarding {checkpoint}, {db_file} does not exist")
+        checkpoint.clear()
+
+    if db_exists and not checkpoint.exists():
+        print(f"{db_file=} already exists.")
+    else:
+        if not checkpoint.exists():
+            # before creating the tables, so a DB left half built is always resumed
+            checkpoint.start()
+        if checkpoint.completed():
+            print(f"Resuming load from {checkpoint}")
+        else:
+            # nothing loaded yet, so (re)create the tables, e.g., if the last run died doing so
+            print("Creating tables")
+            with run_report.stage("create_tables", bytes_read=file_size(SQL_FILE)):
+                create_tables(db_handler)
+
+        planner = LoadPlanner(
+            db_handler,
+            extract=partial(extract_table, data_dir=data_dir),
+            load=load_table,
+            produced_by=PRODUCED_BY,
+            checkpoint=checkpoint,
+            # parsing ODS sheets is CPU bound, so use processes rather than threads
+            executor_cls=ProcessPoolExecutor
+        )
+        print("Inserting into " + ", ".join(planner.order()))
+        with run_report.stage("load_tables", bytes_read=file_size(ODS_FILE)) as stage:
+            load_stats = planner.run()
+            stage.rows_out = sum(sum(row["rows"].values()) for row in load_stats)
+            stage.details["tables"] = load_stats
+        checkpoint.clear()
+
+        print(format_load_report(load_stats))
         print("DB created!")
 
-    exclude_tables=["_schema_tables", "_schema_columns"]
-    eralchemy.render_er(f"sqlite:///{db_file}", str(data_dir / "erd.png"), exclude_tables=exclude_tables)
-    erd_file = DOCS_DIR / "images/erd.png"
-    eralchemy.render_er(f"sqlite:///{db_file}", str(erd_file), exclude_tables=exclude_tables)
-
-    write_data_model_md(db_handler, erd_file)
+    print("Building asset manifest")
+    with run_report.stage("asset_manifest") as stage:
+        stage.rows_out = len(build_asset_manifest(db_handler, data_dir))
+
+    print("Building documents")
+    with run_report.stage("entity_docs") as stage:
+        stage.details["documents"] = sync_documents(db_file)
+
+    # Derived artifacts only depend on the schema, so skip them unless the schema changed
+    print("Building derived artifacts")
+    with run_report.stage("derived_artifacts"):
+        build_cache = BuildCache(build_cache_file)
+        schema_key = schema_digest(db_handler)
+
+        exclude_tables=["_schema_tables", "_schema_columns", "_link_status", *ENTITY_DOC_TABLES]
+        data_erd_file = data_dir / "erd.png"
+        build_cache.build(
+            data_erd_file,
+            digest(schema_key, *exclude_tables),
+            lambda: render_erd(db_file, data_erd_file, exclude_tables)
+        )
+        erd_file = DOCS_DIR / "images/erd.png"
+        build_cache.build(
+            erd_file, file_digest(data_erd_file), lambda: copyfile(data_erd_file, erd_file)
+        )
+        build_cache.build(
+            DOCS_DIR / "data_model.md",
+            digest(schema_key, str(erd_file)),
+            lambda: write_data_model_md(db_handler, erd_file)
+        )
+
+    run_report.write(data_dir / RUN_REPORTS_DIR)
@@ -0,0 +1,123 @@
+# Load test the web app with a weighted mix of its pages and GraphQL queries, e.g.,
+#
+#     python scripts/load_test.py data/app_data/synthetic --serve --concurrency 8 --duration 60
+#
+# Detail pages and queries are sent for random ids from the DB.  Point `--url` at a running app
+# (e.g., gunicorn with some number of workers and threads), or use `--serve` to run the app
+# in-process.  Throughput and p50/p95/p99 latency are reported per route.
+
+import sys
+import argparse
+import json
+import logging
+import threading
+
+from pathlib import Path
+
+REPO_ROOT = Path("./").absolute()
+sys.path.append(str(REPO_ROOT))
+
+from app import queries
+from jamdb.globals import ME_ID
+from jamdb.loadtest import DEFAULT_WEIGHTS, LoadTest, build_mix, format_report, random_ids
+
+OVERVIEW_ROUTES = {
+    "index": "/",
+    "overview_event_occs": "/overview-event-occs/",
+    "overview_event_series": "/overview-event-series/",
+    "overview_players": "/overview-players/",
+    "overview_songs": "/overview-songs/",
+    "overview_performance_videos": "/overview-performance_videos/",
+    "overview_performed_songs": "/overview-performed-songs/",
+}
+DETAIL_ROUTES = {
+    "detail_event_occ": ("/detail-event-occ/{id}", "event_occ"),
+    "detail_event_series": ("/detail-event-series/{id}", "event_gen"),
+    "detail_performed_song": ("/detail-performed-song/{id}", "song_perform"),
+    "detail_song": ("/detail-song/{id}", "song"),
+    "detail_player": ("/detail-player/{id}", "person"),
+    "detail_venue": ("/detail-venue/{id}", "venue"),
+}
+# Queries in `app.queries` -> the kind of id they take, if any.  The paged overview queries are
+# left out, the overview pages run them.
+GRAPHQL_QUERIES = {
+    "INDEX": None,
+    "OVERVIEW_EVENT_OCCS": None,
+    "OVERVIEW_EVENT_SERIES": None,
+    "OVERVIEW_PLAYERS": None,
+    "OVERVIEW_SONGS": None,
+    "DETAIL_EVENT_OCC": "event_occ",
+    "DETAIL_EVENT_SERIES": "event_gen",
+    "DETAIL_PERFORMED_SONG": "song_perform",
+    "DETAIL_SONG": "song",
+    "DETAIL_PLAYER": "person",
+    "DETAIL_VENUE": "venue",
+}
+
+
+def serve_app(db_file):
+    # run the app in a background thread, on a free port.  Returns its URL.
+    from werkzeug.serving import make_server
+    from app import init_app
+
+    # one line per request would drown the report
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, init_app(db_file=db_file), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def parse_weight(text):
+    name, _, weight = text.partition("=")
+    return name, float(weight)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='load test')
+    parser.add_argument('data_dir')
+    parser.add_argument('--db_file')
+    parser.add_argument('--url', default="http://127.0.0.1:5000")
+    parser.add_argument('--serve', action='store_true', help="Run the app in-process instead")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, dest='num_requests')
+    parser.add_argument('--duration', type=float, help="Seconds, default 30 unless --requests")
+    parser.add_argument('--warmup', type=int, default=0, help="Requests sent, but not counted")
+    parser.add_argument('--num_ids', type=int, default=50, help="Random ids per detail page")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--weight', action='append', type=parse_weight, default=[],
+        help=f"NAME=WEIGHT, by route (e.g., detail_song, graphql:INDEX) or {list(DEFAULT_WEIGHTS)}"
+    )
+    parser.add_argument('--output', help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_file = args.db_file
+    if db_file is None:
+        db_file = data_dir / "jamming.db"
+    db_file = Path(db_file)
+    duration = args.duration
+    if duration is None and args.num_requests is None:
+        duration = 30
+
+    mix = build_mix(
+        random_ids(db_file, args.num_ids, args.seed),
+        overview_routes=OVERVIEW_ROUTES,
+        detail_routes=DETAIL_ROUTES,
+        graphql_queries={
+            name: (getattr(queries, name), kind) for name, kind in GRAPHQL_QUERIES.items()
+        },
+        graphql_variables={"otherPersonId": ME_ID},
+        weights=dict(args.weight)
+    )
+    url = serve_app(db_file) if args.serve else args.url
+    print(f"    Replaying {len(mix)} distinct requests against {url}")
+
+    report = LoadTest(
+        url, mix, concurrency=args.concurrency, num_requests=args.num_requests, duration=duration,
+        warmup=args.warmup, seed=args.seed
+    ).run()
+    print(format_report(report))
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(report, indent=2))
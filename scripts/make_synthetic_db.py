@@ -0,0 +1,47 @@
+# Create a synthetic jam DB for scale testing, e.g.,
+#
+#     python scripts/make_synthetic_db.py data/app_data/synthetic --scale large
+#
+# Point the app or the benchmarks at the resulting `jamming.db` to measure them at that size.
+
+import sys
+import argparse
+import time
+
+from pathlib import Path
+
+REPO_ROOT = Path("./").absolute()
+sys.path.append(str(REPO_ROOT))
+
+from jamdb.synthetic import DEFAULT_SIZES, SCALES, generate_jam_db
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='make synthetic db')
+    parser.add_argument('data_dir')
+    parser.add_argument('--db_file')
+    parser.add_argument('--scale', choices=list(SCALES), default="small")
+    parser.add_argument('--seed', type=int, default=0)
+    for size in [*SCALES["small"], *DEFAULT_SIZES]:
+        parser.add_argument(
+            f'--{size}', type=type(DEFAULT_SIZES.get(size, 0)), help="Override the scale's size"
+        )
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_file = args.db_file
+    if db_file is None:
+        db_file = data_dir / "jamming.db"
+    db_file = Path(db_file)
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+
+    sizes = {
+        size: getattr(args, size) for size in [*SCALES["small"], *DEFAULT_SIZES]
+        if getattr(args, size) is not None
+    }
+    start = time.perf_counter()
+    counts = generate_jam_db(db_file, scale=args.scale, seed=args.seed, **sizes)
+    for table_name, count in counts.items():
+        print(f"    {table_name:<24} {count:>10}")
+    print(f"Synthetic DB written to {db_file} in {time.perf_counter() - start:.1f}s")
@@ -3,7 +3,6 @@ import io
 import argparse
 import pandas as pd
 import sys
-import hashlib
 import os
 import copy
 import tqdm
@@ -14,28 +13,15 @@ from spotipy.oauth2 import SpotifyOAuth
 REPO_ROOT = Path("./").absolute()
 sys.path.append(str(REPO_ROOT))
 from jamdb.db import DBHandler
+from jamdb.documents import sync_documents
+from jamdb.matching import SongNameIndex, normalize_song_name, strip_version_suffix
+from jamdb.run_report import RUN_REPORTS_DIR, RunReport, file_size
+from jamdb.spotify import SpotifyTrackCache, make_requests_session
+from jamdb.transformations import add_embeddable_links, hash_rows
 
 SRC_DATA_DIR = REPO_ROOT / "data" / "source_data"
-PLAYLIST_ID = "12euvBPoe0YGjQaC6OwtVf"
-
-
-def row_to_hash(row):
-    return hashlib.md5(str(row.to_dict().values()).encode()).hexdigest()
-
-    
-def normalize_song_name(song_name):
-    song_name = song_name.lower().strip()
-    for start in ["a ", "an ", "the "]:
-        if song_name.startswith(start):
-            song_name = song_name[len(start):]
-
-    song_name = song_name.split("-")[0].strip()
-    puncts = list("[](){},.?!';:-+=") + ['"']
-    for punct in puncts:
-        song_name = song_name.replace(punct, "")
-    song_name = song_name.strip()
-    song_name = song_name.replace(" ", "_")
-    return song_name
+PLAYLIST_IDS = ["12euvBPoe0YGjQaC6OwtVf"]
+SPOTIFY_CACHE_FILE = SRC_DATA_DIR / "spotify_cache.db"
 
 
 def create_spotipy_conn():
@@ -56,50 +42,25 @@ def create_spotipy_conn():
         redirect_uri=spotify_client_uri,
         scope=scope
     )
-    spotipy_conn = spotipy.Spotify(auth_manager=spotipy_auth_manager)
+    spotipy_conn = spotipy.Spotify(
+        auth_manager=spotipy_auth_manager, requests_session=make_requests_session()
+    )
     return spotipy_conn
 
 
-def get_tracks_for_playlist(spotipy_conn, playlist_uri):
-    print("Downloading track info from Spotify...")
-    tracks = []
-    batch_size = 50
-    offset = 0
-    keep_going = True
-
-    while keep_going:
-        if offset % 200 == 0:
-            print(offset)
-        result = spotipy_conn.playlist_tracks(
-            playlist_id=playlist_uri,
-            limit=batch_size,
-            offset=offset
-        )
-        offset += batch_size
-        tracks.extend(result["items"])
-        total = result["total"]
-
-        if result["next"] is None:
-            keep_going = False
-        if offset >= result["total"]:
-            keep_going = False
-
-    return tracks
-
-
 def simplify_tracks(tracks):
     return [
         {
             "source_id": "spotify",
-            "link": track["track"]["external_urls"]["spotify"],
-            "song_name_spotify": track["track"]["name"],
-            "normalized_name": normalize_song_name(track["track"]["name"])
+            "link": track["link"],
+            "song_name_spotify": track["name"],
+            "normalized_name": normalize_song_name(strip_version_suffix(track["name"]))
         }
         for track in tracks
     ]
 
 
-def get_name_mapping(name_mapping_file, db_handler, songs_from_spotify, output_data_dir):
+def get_name_mapping(name_mapping_file, db_handler, songs_from_spotify, output_data_dir, songs=None):
     reports_dir = output_data_dir / "reports"
     reports_dir.mkdir(parents=True, exist_ok=True)
     
@@ -109,26 +70,45 @@ def get_name_mapping(name_mapping_file, db_handler, songs_from_spotify, output_d
             "song_name_in_jam_db": row["song"],
             "normalized_name": normalize_song_name(row["song"])
         }
-        for _, row in db_handler.read_table("Song").iterrows()
+        for _, row in (db_handler.read_table("Song") if songs is None else songs).iterrows()
     ]
     
     assert len({row["normalized_name"] for row in songs_in_jam_db}) == len(songs_in_jam_db)
+    song_index = SongNameIndex({row["id"]: row["song_name_in_jam_db"] for row in songs_in_jam_db})
     songs_in_jam_db = {row["normalized_name"]: row for row in songs_in_jam_db}
     
     name_mapping = pd.read_csv(name_mapping_file).to_numpy().tolist()
     already_seen = {row[2] for row in name_mapping}
 
     in_spotify_no_jamdb_match = []
+    fuzzy_matches = []
     for song in songs_from_spotify:
         if song["link"] in already_seen:
             continue
         if song["normalized_name"] in songs_in_jam_db:
             db_song = songs_in_jam_db[song["normalized_name"]]
             song_id = db_song["id"]
-            name_mapping.append([song_id, song["normalized_name"], song["link"]])
-            already_seen.update([song["link"]])
         else:
-            in_spotify_no_jamdb_match.append(["", song["normalized_name"], song["link"]])
+            match = song_index.match(
+                strip_version_suffix(song["song_name_spotify"])
+            )
+            if match is None:
+                in_spotify_no_jamdb_match.append(["", song["normalized_name"], song["link"]])
+                continue
+            song_id, score = match
+            fuzzy_matches.append([song_id, song["song_name_spotify"], song["link"], round(score, 3)])
+        name_mapping.append([song_id, song["normalized_name"], song["link"]])
+        already_seen.update([song["link"]])
+
+    # === Report on fuzzy matches, to review ======================================
+    fuzzy_matches_file = reports_dir / "spotify_fuzzy_matches.csv"
+    if len(fuzzy_matches) > 0:
+        print(f"\n{len(fuzzy_matches)} songs in spotify playlist fuzzily matched to jamdb.")
+        print(f"\tCheck {fuzzy_matches_file}")
+    pd.DataFrame(
+        fuzzy_matches, columns=["song_id", "song_name_spotify", "link", "score"]
+    ).to_csv(fuzzy_matches_file, index=None)
+    # ============================================================================
 
     # === Report on songs in spotify playlist but no jamdb match =================
     in_spotify_no_jamdb_match = pd.DataFrame(
@@ -164,59 +144,45 @@ def get_name_mapping(name_mapping_file, db_handler, songs_from_spotify, output_d
     return name_mapping
 
 
-def get_tracks_from_spotify(playlist_id):
-
-    def write_spotify_payload(playlist_id, snapshot_id, simplified_tracks, payload_file):
-        payload = {
-            "playlist_id": playlist_id,
-            "snapshot_id": snapshot_id,
-            "tracks": simplified_tracks,
-        }
-        with open(payload_file, "w") as fh:
-            json.dump(payload, fh)
-
-    payload_file = SRC_DATA_DIR / "tmp_previous_spotify_playlist.json"    
-
+def get_tracks_from_spotify(playlist_ids, cache_file=SPOTIFY_CACHE_FILE):
+    """
+    Tracks of all `playlist_ids`, deduped by link.  Track info is cached in `cache_file`, so only
+    playlists that changed, and only their new tracks, are downloaded from Spotify.
+    """
+    print("Syncing track info from Spotify...")
+    cache = SpotifyTrackCache(cache_file)
     spotipy_conn = create_spotipy_conn()
-    new_snapshot_id = spotipy_conn.playlist(playlist_id)["snapshot_id"]
-
-    snapshot_id = new_snapshot_id
-    songs_from_spotify = []
-    try:
-        with open(payload_file, "r") as fh:
-            payload = json.load(fh)
-            songs_from_spotify = payload["tracks"]
-            snapshot_id = payload["snapshot_id"]
-    except FileNotFoundError:
-        pass
-
-    if snapshot_id != new_snapshot_id or len(songs_from_spotify) == 0:
-        if snapshot_id != new_snapshot_id:
-            print("    Spotify snapshot id has updated, will download track info afresh from Spotify.")
-        elif len(songs_from_spotify) == 0:
-            print("    Cached spotify track info not found, will download track info afresh from Spotify.")
-
-        tracks = get_tracks_for_playlist(spotipy_conn, playlist_id)
-        songs_from_spotify = simplify_tracks(tracks)
-
-        write_spotify_payload(playlist_id, new_snapshot_id, songs_from_spotify, payload_file)
-    else:
-        print("No changes to playlist detected, will use cached version.")
-
-    return songs_from_spotify
-
 
-def get_new_ref_recs(db_handler, table_name, output_data_dir):
-
-    songs_from_spotify = get_tracks_from_spotify(PLAYLIST_ID)
-    
-    current_ref_recs = db_handler.read_table(table_name).query("source_id == 'spotify'")["link"].tolist()
+    tracks = {}
+    for playlist_id in playlist_ids:
+        for track in cache.sync_playlist(spotipy_conn, playlist_id):
+            tracks.setdefault(track["link"], track)
+    return simplify_tracks(tracks.values())
+
+
+def get_new_ref_recs(db_handler, table_name, output_data_dir, playlist_ids=PLAYLIST_IDS, songs=None,
+                     current_ref_recs=None, run_report=None):
+    # `songs` and `current_ref_recs` are the `Song` and `table_name` tables, read from the DB if
+    # not given.  The stages are recorded in `run_report`, if given.
+    run_report = run_report or RunReport("get_new_ref_recs")
+    with run_report.stage("fetch_spotify_tracks", rows_in=len(playlist_ids)) as stage:
+        songs_from_spotify = get_tracks_from_spotify(playlist_ids)
+        stage.rows_out = len(songs_from_spotify)
+
+    if current_ref_recs is None:
+        current_ref_recs = db_handler.read_table(table_name)
+    current_ref_recs = current_ref_recs.query("source_id == 'spotify'")["link"].tolist()
     # check should be unnecessary as DB has a uniqueness constraint on link
     assert len(current_ref_recs) == len(set(current_ref_recs))
     current_ref_recs = set(current_ref_recs)
 
     name_mapping_file = SRC_DATA_DIR / "spotify_ref_rec_name_mapping.csv"
-    name_mapping = get_name_mapping(name_mapping_file, db_handler, songs_from_spotify, output_data_dir)
+    with run_report.stage("match_songs", bytes_read=file_size(name_mapping_file)) as stage:
+        name_mapping = get_name_mapping(
+            name_mapping_file, db_handler, songs_from_spotify, output_data_dir, songs=songs
+        )
+        stage.rows_in = len(songs_from_spotify)
+        stage.rows_out = len(name_mapping)
         
     new_ref_recs = []
     for song in songs_from_spotify:    
@@ -237,8 +203,9 @@ def get_new_ref_recs(db_handler, table_name, output_data_dir):
             }
         )
     
-    new_ref_recs = pd.DataFrame(new_ref_recs)
-    new_ref_recs["id"] = new_ref_recs.apply(row_to_hash, axis=1)
+    new_ref_recs = pd.DataFrame(new_ref_recs, columns=["song_id", "source_id", "link"])
+    new_ref_recs["id"] = hash_rows(new_ref_recs)
+    new_ref_recs = add_embeddable_links(new_ref_recs)
     return new_ref_recs
 
 
@@ -247,6 +214,10 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='insert for spotify ref recs')
     parser.add_argument('data_dir')
     parser.add_argument('--db_file')
+    parser.add_argument(
+        '--playlist_id', action='append', dest='playlist_ids',
+        help=f"Spotify playlist to import from, may be repeated.  Defaults to {PLAYLIST_IDS}"
+    )
     args = parser.parse_args()
     
     table_name = "RefRec"
@@ -257,12 +228,23 @@ if __name__ == "__main__":
         db_file = data_dir / "jamming.db"
     db_file = Path(db_file)
     db_handler = DBHandler.from_db_file(db_file)
+    run_report = RunReport("refrecs_from_spotify", db_file=db_file)
     
-    new_ref_recs = get_new_ref_recs(db_handler, table_name, output_data_dir=data_dir)
+    new_ref_recs = get_new_ref_recs(
+        db_handler, table_name, output_data_dir=data_dir, playlist_ids=args.playlist_ids or PLAYLIST_IDS,
+        run_report=run_report
+    )
+
+
+    with run_report.stage("insert_ref_recs", rows_in=len(new_ref_recs)) as stage:
+        if len(new_ref_recs) > 0:
+            db_handler.insert(table_name, new_ref_recs.to_dict(orient="records"))        
+            print(f"{table_name} table updated with new data")
+        else:
+            print(f"No new data detected for {table_name}, nothing to do!")
+        stage.rows_out = len(new_ref_recs)
 
+    with run_report.stage("entity_docs") as stage:
+        stage.details["documents"] = sync_documents(db_file)
 
-    if len(new_ref_recs) > 0:
-        db_handler.insert(table_name, new_ref_recs.to_dict(orient="records"))        
-        print(f"{table_name} table updated with new data")
-    else:
-        print(f"No new data detected for {table_name}, nothing to do!")
+    run_report.write(data_dir / RUN_REPORTS_DIR)
@@ -0,0 +1,208 @@
+# Rebuild the DB from every source in one go:  the ODS file, the iReal charts and Spotify.
+#
+# The source-side work (parsing the ODS, splitting / matching the iReal charts, fetching from
+# Spotify) runs concurrently, against one snapshot of the `Song` sheet.  The DB writes are then
+# done in one transaction, into a fresh DB file that replaces the current one only on success.
+
+import sys
+import os
+import argparse
+import multiprocessing
+import time
+
+import sqlalchemy
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path("./").absolute()
+sys.path.append(str(REPO_ROOT))
+
+from jamdb.assets import build_asset_manifest
+from jamdb.build_cache import sync_tree
+from jamdb.db import DBHandler
+from jamdb.documents import sync_documents
+from jamdb.entity_docs import ENTITY_DOC_TABLES
+from jamdb.linkcheck import LINK_STATUS_TABLE, write_link_status
+from jamdb.loading import LoadPlanner, format_load_report
+
+import charts_from_ireal_setlist as ireal_charts
+import initialize_db
+import refrecs_from_spotify as spotify_refrecs
+
+SOURCES = ["ireal", "spotify"]
+SNAPSHOT_TABLES = ["Song", "Chart", "RefRec"]
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, stage, fnc, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fnc(*args, **kwargs)
+        finally:
+            self.timings[stage] = time.perf_counter() - start
+
+    def report(self, total_seconds):
+        lines = [f"{'stage':<20} {'seconds':>10}"]
+        lines.extend(f"{stage:<20} {seconds:>10.3f}" for stage, seconds in self.timings.items())
+        lines.append(f"{'end to end':<20} {total_seconds:>10.3f}")
+        return "\n".join(lines)
+
+
+def extract_ods(table_names, data_dir):
+    # Parsing ODS sheets is CPU bound, so use processes rather than threads.  This runs next to the
+    # iReal and Spotify threads, so spawn the processes:  forking while those threads hold locks
+    # (HTTP sessions, sqlite) can deadlock the children.
+    for sub_dir in initialize_db.DATA_SUB_DIRS:
+        sync_tree(initialize_db.SRC_DATA_DIR / sub_dir, data_dir / sub_dir)
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            table_name: pool.submit(initialize_db.extract_table, table_name, data_dir)
+            for table_name in table_names
+        }
+        return {table_name: future.result() for table_name, future in futures.items()}
+
+
+def prepare_ireal(songs, existing_charts, data_dir):
+    ireal_charts.create_charts_from_ireal(
+        db_handler=None, source_dir=ireal_charts.SRC_DATA_DIR, output_data_dir=data_dir, songs=songs
+    )
+    return ireal_charts.plan_chart_sync(data_dir, existing_charts)
+
+
+def prepare_spotify(songs, existing_ref_recs, data_dir, playlist_ids):
+    return spotify_refrecs.get_new_ref_recs(
+        db_handler=None, table_name="RefRec", output_data_dir=data_dir, playlist_ids=playlist_ids,
+        songs=songs, current_ref_recs=existing_ref_recs
+    )
+
+
+def previous_link_status(db_file):
+    # link checks are slow, so keep the results from the DB being replaced
+    if not db_file.exists():
+        return []
+    db_handler = DBHandler.from_db_file(db_file)
+    try:
+        if LINK_STATUS_TABLE not in db_handler.tables():
+            return []
+        with db_handler.Session.begin() as session:
+            rows = session.execute(sqlalchemy.text(f"SELECT * FROM {LINK_STATUS_TABLE}"))
+            return [dict(row._mapping) for row in rows]
+    finally:
+        db_handler.engine.dispose()
+
+
+def previous_entity_docs(db_file):
+    # so only the documents of entities that changed are rebuilt, see `jamdb.entity_docs`
+    if not db_file.exists():
+        return {}
+    db_handler = DBHandler.from_db_file(db_file)
+    try:
+        tables = {}
+        with db_handler.Session.begin() as session:
+            for table_name in ENTITY_DOC_TABLES:
+                if table_name in db_handler.tables():
+                    rows = session.execute(sqlalchemy.text(f"SELECT * FROM {table_name}"))
+                    tables[table_name] = [dict(row._mapping) for row in rows]
+        return tables
+    finally:
+        db_handler.engine.dispose()
+
+
+def sync_all(data_dir, db_file, sources=SOURCES, playlist_ids=spotify_refrecs.PLAYLIST_IDS):
+    timer = StageTimer()
+    start = time.perf_counter()
+
+    tmp_db_file = db_file.with_name(f"{db_file.name}.tmp")
+    if tmp_db_file.exists():
+        os.remove(tmp_db_file)
+    db_handler = DBHandler.from_db_file(tmp_db_file)
+    initialize_db.create_tables(db_handler)
+    planner = LoadPlanner(
+        db_handler, extract=None, load=initialize_db.load_table, produced_by=initialize_db.PRODUCED_BY
+    )
+
+    # Every source matches against the ODS `Song` sheet, so read it first and share it.  The
+    # fresh DB will only hold the ODS `Chart` and `RefRec` rows, so the other sources add to those.
+    snapshot = timer.run(
+        "snapshot",
+        lambda: {x: initialize_db.extract_table(x, data_dir) for x in SNAPSHOT_TABLES}
+    )
+    ods_tables = [table_name for table_name in planner.order() if table_name not in snapshot]
+
+    with ThreadPoolExecutor() as pool:
+        ods_future = pool.submit(timer.run, "ods extract", extract_ods, ods_tables, data_dir)
+        futures = {}
+        if "ireal" in sources:
+            futures["ireal"] = pool.submit(
+                timer.run, "ireal", prepare_ireal, snapshot["Song"], snapshot["Chart"], data_dir
+            )
+        if "spotify" in sources:
+            futures["spotify"] = pool.submit(
+                timer.run, "spotify", prepare_spotify, snapshot["Song"], snapshot["RefRec"],
+                data_dir, playlist_ids
+            )
+        extracted = {**snapshot, **ods_future.result()}
+        results = {source: future.result() for source, future in futures.items()}
+
+    def write():
+        planner.extract = extracted.__getitem__
+        with db_handler.Session.begin() as session:
+            load_stats = planner.run(session=session)
+            if "ireal" in results:
+                _, chart_delta = results["ireal"]
+                ireal_charts.apply_chart_delta(db_handler, chart_delta, session)
+            if "spotify" in results:
+                ref_recs = results["spotify"]
+                db_handler.insert("RefRec", ref_recs.to_dict(orient="records"), session=session)
+                print(f"    RefRec rows inserted: {len(ref_recs)}")
+            write_link_status(session, previous_link_status(db_file))
+            for table_name, rows in previous_entity_docs(db_file).items():
+                db_handler.insert(table_name, rows, session=session)
+        return load_stats
+
+    load_stats = timer.run("db write", write)
+    db_handler.engine.dispose()
+    # before the swap, so the new DB comes with its documents
+    timer.run("entity docs", sync_documents, tmp_db_file)
+    os.replace(tmp_db_file, db_file)
+    if "ireal" in results:
+        chart_manifest, _ = results["ireal"]
+        chart_manifest.save()
+
+    db_handler = DBHandler.from_db_file(db_file)
+    timer.run("asset manifest", build_asset_manifest, db_handler, data_dir)
+
+    print(format_load_report(load_stats))
+    print(timer.report(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(prog='sync_all')
+    parser.add_argument('data_dir')
+    parser.add_argument('--db_file')
+    parser.add_argument('--skip', action='append', choices=SOURCES, default=[])
+    parser.add_argument(
+        '--playlist_id', action='append', dest='playlist_ids',
+        help=f"Spotify playlist to import from, may be repeated.  Defaults to {spotify_refrecs.PLAYLIST_IDS}"
+    )
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    db_file = args.db_file
+    if db_file is None:
+        db_file = data_dir / "jamming.db"
+    db_file = Path(db_file)
+
+    sync_all(
+        data_dir,
+        db_file,
+        sources=[x for x in SOURCES if x not in args.skip],
+        playlist_ids=args.playlist_ids or spotify_refrecs.PLAYLIST_IDS
+    )
+    print("DB synced!")
@@ -6,7 +6,7 @@ setup(
     description="Database and queries for keeping track of what I've played, where I played it, who I played it with.",
     author="paul koester",
     author_email="paulhkoester@gmail",
-    packages=find_packages(exclude=("tests", "docs")),
+    packages=find_packages(exclude=("tests", "docs", "benchmarks")),
     test_suite="tests",
     #include_package_data=True,
     #package_data={"": ["data/*.csv", "data/*.json", "data/*.txt", "data/*.png"]},
@@ -0,0 +1,17 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from jamdb.db import DBHandler
+
+SQL_FILE = Path(__file__).parents[1] / "jamdb" / "jamming.sql"
+
+
+@pytest.fixture
+def empty_db_handler(tmp_path):
+    # A DB with the full schema, but no data outside of the `_schema_*` tables
+    db_file = tmp_path / "jamming.db"
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(SQL_FILE.read_text())
+    return DBHandler.from_db_file(db_file)
@@ -0,0 +1,253 @@
+"""
+Local HTTP stand-ins for external services, so code that talks to them can be tested offline.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import spotipy
+
+
+def make_track(idx, playlist_id="playlist"):
+    track_id = f"{playlist_id}{idx:06d}"
+    return {
+        "added_at": "2024-01-01T00:00:00Z",
+        "track": {
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": f"Song {idx}",
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        },
+    }
+
+
+class SpotifyStub:
+    """
+    Serves `GET /v1/playlists/<id>` and `GET /v1/playlists/<id>/tracks` (or `/items`) from
+    `playlists`, a dict of playlist id to {"snapshot_id": ..., "tracks": [...]}, and
+    `GET /v1/tracks?ids=...` for any track in those playlists.  `fields` are ignored, i.e., the
+    full objects are always returned.
+
+    `failures` is a list of HTTP statuses; each request pops the next one (if any) and fails with
+    it instead of answering.  `latency` seconds are added to every response.
+    """
+
+    max_page_size = 100
+
+    def __init__(self, playlists=None, failures=(), latency=0.0, retry_after=None):
+        self.playlists = playlists or {}
+        self.failures = list(failures)
+        self.latency = latency
+        self.retry_after = retry_after
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def spotipy_conn(self, **kwargs):
+        conn = spotipy.Spotify(auth="stub-token", **kwargs)
+        conn.prefix = f"{self.url}/v1/"
+        return conn
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def _respond(self, path, query):
+        with self._lock:
+            self.requests.append((path, query))
+            failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            headers = {} if self.retry_after is None else {"Retry-After": str(self.retry_after)}
+            return failure, {"error": {"status": failure, "message": "stub failure"}}, headers
+
+        if re.fullmatch(r"/v1/tracks/?", path):
+            tracks = {
+                item["track"]["id"]: item["track"]
+                for playlist in self.playlists.values() for item in playlist["tracks"]
+            }
+            ids = query["ids"][0].split(",")
+            return 200, {"tracks": [tracks.get(track_id) for track_id in ids]}, {}
+
+        match = re.fullmatch(r"/v1/playlists/([^/]+)(/tracks|/items)?", path)
+        if match is None or match.group(1) not in self.playlists:
+            return 404, {"error": {"status": 404, "message": "not found"}}, {}
+        playlist = self.playlists[match.group(1)]
+        if match.group(2) is None:
+            return 200, {"id": match.group(1), "snapshot_id": playlist["snapshot_id"]}, {}
+
+        limit = min(int(query.get("limit", ["100"])[0]), self.max_page_size)
+        offset = int(query.get("offset", ["0"])[0])
+        total = len(playlist["tracks"])
+        body = {
+            "items": playlist["tracks"][offset:offset + limit],
+            "limit": limit,
+            "offset": offset,
+            "total": total,
+            "next": None if offset + limit >= total else f"{self.url}{path}?offset={offset + limit}&limit={limit}",
+        }
+        return 200, body, {}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, body, headers = stub._respond(parsed.path, parse_qs(parsed.query))
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, val in headers.items():
+                    self.send_header(key, val)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class LinkStub:
+    """
+    A site with a few kinds of links, for the link checker.
+
+    * `/ok/<x>` is fine, has an ETag, and answers a matching `If-None-Match` with 304
+    * `/missing/<x>` is 404
+    * `/nohead/<x>` is fine, but answers HEAD with 405
+
+    Every response takes `latency` seconds.  The most requests seen in flight at once, per `Host`
+    header, are recorded in `max_in_flight`.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.max_in_flight = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, path, host="127.0.0.1"):
+        return f"http://{host}:{self.port}{path}"
+
+    __enter__ = SpotifyStub.__enter__
+    __exit__ = SpotifyStub.__exit__
+
+    def _respond(self, method, path, headers):
+        host = headers.get("Host")
+        with self._lock:
+            self.requests.append((method, path, dict(headers)))
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            self.max_in_flight[host] = max(self.max_in_flight.get(host, 0), self._in_flight[host])
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            etag = f'"{path}"'
+            if path.startswith("/ok/"):
+                if headers.get("If-None-Match") == etag:
+                    return 304, {"ETag": etag}
+                return 200, {"ETag": etag}
+            if path.startswith("/nohead/"):
+                return (405 if method == "HEAD" else 200), {}
+            return 404, {}
+        finally:
+            with self._lock:
+                self._in_flight[host] -= 1
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                status, headers = stub._respond(method, self.path, self.headers)
+                body = b"" if method == "HEAD" or status == 304 else b"stub"
+                self.send_response(status)
+                for key, val in headers.items():
+                    self.send_header(key, val)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_HEAD(self):
+                self._handle("HEAD")
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class ThumbnailStub:
+    """
+    Serves YouTube style thumbnails at `/vi/<video id>/hqdefault.jpg`, and a Spotify style oEmbed
+    API at `/oembed?url=<link>`, whose `thumbnail_url` is `/images/<last part of link>.jpg`.
+    Video ids / links containing "missing" are 404, those containing "notimage" are HTML.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = None
+
+    url = SpotifyStub.url
+    __enter__ = SpotifyStub.__enter__
+    __exit__ = SpotifyStub.__exit__
+
+    def _respond(self, path, query):
+        self.requests.append(path)
+        if "missing" in path or "missing" in query.get("url", [""])[0]:
+            return 404, "text/plain", b"not found"
+        if "notimage" in path:
+            return 200, "text/html", b"<html></html>"
+        if path == "/oembed":
+            name = query["url"][0].rstrip("/").rsplit("/", 1)[-1]
+            body = {"thumbnail_url": f"{self.url}/images/{name}.jpg"}
+            return 200, "application/json", json.dumps(body).encode()
+        return 200, "image/jpeg", f"image for {path}".encode()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, content_type, payload = stub._respond(parsed.path, parse_qs(parsed.query))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,27 @@
+from jamdb.assets import AssetManifest, build_asset_manifest, ASSET_MANIFEST_FILE
+
+
+def test_asset_manifest(empty_db_handler, tmp_path):
+    db_handler = empty_db_handler
+    db_handler.insert("LinkSource", [{"id": "pdf", "rank": 0}, {"id": "web", "rank": 1}])
+    db_handler.insert("Song", [{"id": "blue_monk", "song": "Blue Monk"}])
+    db_handler.insert(
+        "Chart",
+        [
+            {"id": "1", "song_id": "blue_monk", "source_id": "pdf", "link": "charts/blue_monk.pdf"},
+            {"id": "2", "song_id": "blue_monk", "source_id": "web", "link": "https://x.com/a"},
+        ]
+    )
+    (tmp_path / "charts").mkdir()
+    (tmp_path / "charts" / "blue_monk.pdf").write_bytes(b"version 1")
+
+    manifest = build_asset_manifest(db_handler, tmp_path)
+    assert list(manifest) == ["charts/blue_monk.pdf"]
+
+    reader = AssetManifest(tmp_path / ASSET_MANIFEST_FILE)
+    first = reader.fingerprint("charts/blue_monk.pdf")
+    assert reader.fingerprint("https://x.com/a") is None
+
+    (tmp_path / "charts" / "blue_monk.pdf").write_bytes(b"version 2")
+    build_asset_manifest(db_handler, tmp_path)
+    assert reader.fingerprint("charts/blue_monk.pdf") != first
@@ -0,0 +1,70 @@
+from jamdb.build_cache import BuildCache, FileManifest, sync_tree
+
+
+def test_build_cache(tmp_path):
+    artifact = tmp_path / "artifact.txt"
+    builds = []
+
+    def build():
+        builds.append(1)
+        artifact.write_text("built")
+
+    cache = BuildCache(tmp_path / "cache.json")
+    assert cache.build(artifact, "key1", build)
+    assert not cache.build(artifact, "key1", build)
+    # reloaded from disk
+    assert not BuildCache(tmp_path / "cache.json").build(artifact, "key1", build)
+    assert cache.build(artifact, "key2", build)
+    # artifact modified outside of the cache
+    artifact.write_text("tampered")
+    assert cache.build(artifact, "key2", build)
+    assert len(builds) == 3
+
+
+def test_sync_tree(tmp_path):
+    src = tmp_path / "src"
+    dest = tmp_path / "dest"
+    (src / "a").mkdir(parents=True)
+    (src / "a" / "pic.jpg").write_bytes(b"123")
+    (src / "b.png").write_bytes(b"456")
+
+    assert sync_tree(src, dest) == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+    assert (dest / "a" / "pic.jpg").read_bytes() == b"123"
+
+    (src / "b.png").unlink()
+    assert sync_tree(src, dest) == {"added": 0, "updated": 0, "removed": 1, "unchanged": 1}
+    assert not (dest / "b.png").exists()
+
+    (src / "a" / "pic.jpg").unlink()
+    (src / "a" / "pic.jpg").write_bytes(b"789")
+    assert sync_tree(src, dest, hardlink=False)["updated"] == 1
+    assert (dest / "a" / "pic.jpg").read_bytes() == b"789"
+
+
+def test_file_manifest(tmp_path):
+    directory = tmp_path / "charts"
+    (directory / "a").mkdir(parents=True)
+    (directory / "a" / "x.json").write_text("1")
+    (directory / "b.json").write_text("2")
+    derived = []
+
+    def derive(path):
+        derived.append(path.name)
+        return {"content": path.read_text()}
+
+    manifest = FileManifest(tmp_path / "manifest.json")
+    assert manifest.update(directory, derive)["added"] == ["a/x.json", "b.json"]
+    manifest.save()
+
+    manifest = FileManifest(tmp_path / "manifest.json")
+    (directory / "b.json").unlink()
+    (directory / "a" / "x.json").write_text("3")
+    (directory / "c.json").write_text("4")
+    changes = manifest.update(directory, derive)
+
+    assert changes == {"added": ["c.json"], "changed": ["a/x.json"], "removed": ["b.json"], "unchanged": []}
+    assert manifest.derived() == {"a/x.json": {"content": "3"}, "c.json": {"content": "4"}}
+    # rewritten with the same content, so not derived again
+    (directory / "c.json").write_text("4")
+    assert manifest.update(directory, derive)["unchanged"] == ["a/x.json", "c.json"]
+    assert derived == ["x.json", "b.json", "x.json", "c.json"]
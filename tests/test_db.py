@@ -0,0 +1,46 @@
+import pytest
+
+from jamdb.db_error_handling import DBError, FKConstraintError
+
+MODES = [{"id": "major", "mode": "major"}, {"id": "minor", "mode": "minor"}]
+
+
+def test_update_and_delete(empty_db_handler):
+    empty_db_handler.insert("Mode", MODES)
+    empty_db_handler.update("Mode", [{"id": "minor", "mode": "aeolian"}])
+    assert empty_db_handler.read_table("Mode").to_dict(orient="records") == [
+        {"id": "major", "mode": "major"}, {"id": "minor", "mode": "aeolian"}
+    ]
+
+    empty_db_handler.update("Mode", [{"id": "ionian", "mode": "major"}], key="mode")
+    empty_db_handler.delete("Mode", ["aeolian"], key="mode")
+    assert empty_db_handler.read_table("Mode").to_dict(orient="records") == [
+        {"id": "ionian", "mode": "major"}
+    ]
+
+
+def test_update_in_session_rolls_back(empty_db_handler):
+    empty_db_handler.insert("Mode", MODES)
+    with pytest.raises(DBError):
+        with empty_db_handler.Session.begin() as session:
+            empty_db_handler.delete("Mode", ["major"], session=session)
+            empty_db_handler.update("Mode", [{"id": "minor", "mode": None}], session=session)
+    assert len(empty_db_handler.read_table("Mode")) == 2
+
+
+def test_delete_referred_row(empty_db_handler):
+    empty_db_handler.insert("Mode", MODES)
+    empty_db_handler.insert("Key", [{"id": "C", "root": "C", "mode_id": "major"}])
+    with pytest.raises(FKConstraintError) as exc_info:
+        empty_db_handler.delete("Mode", ["major", "minor"])
+    message = str(exc_info.value)
+    assert "'table': 'Mode'" in message
+    assert "'deleted_keys': ['major']" in message
+    assert "'referred_by_table': 'Key'" in message
+    assert "'referred_by_columns': ['mode_id']" in message
+    assert len(empty_db_handler.read_table("Mode")) == 2
+
+
+def test_py_lower(empty_db_handler):
+    with empty_db_handler.engine.connect() as con:
+        assert con.execute("SELECT py_lower('Ärger'), py_lower(NULL)").fetchone() == ("ärger", None)
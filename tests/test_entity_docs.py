@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+from jamdb.documents import DOC_KINDS, sync_documents
+from jamdb.entity_docs import ENTITY_DOC_TABLE, EntityDocStore
+from jamdb.graphene import GrapheneSQLSession
+from jamdb.loadtest import random_ids
+from jamdb.object_graph import ObjectGraphStore
+from jamdb.sqlstats import track_sql
+from jamdb.synthetic import generate_jam_db
+
+
+def _read_docs(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return {(kind, id_): doc for kind, id_, doc in conn.execute(
+            f"SELECT kind, id, doc FROM {ENTITY_DOC_TABLE}"
+        )}
+
+
+def test_tracked_object_graph(empty_db_handler):
+    empty_db_handler.insert("Composer", [{"id": "c0", "composer": "Composer 0"}])
+    empty_db_handler.insert("Song", [{"id": "s0", "song": "Song 0", "composer_id": "c0"}])
+    store = ObjectGraphStore(empty_db_handler.engine, empty_db_handler.model_classes(), track=True)
+    graph = store.current()
+
+    name, deps = graph.tracked(lambda: graph.get("Song", "s0").composer.composer)
+    assert name == "Composer 0"
+    assert deps == {("Song", "s0"), ("Composer", "c0")}
+    _, deps = graph.tracked(lambda: [graph.get("Song", "x"), graph.rows("Composer")])
+    assert deps == {("Song", "x"), ("Composer", None)}
+
+
+def test_documents_match_queries(tmp_path):
+    db_file = tmp_path / "jamming.db"
+    generate_jam_db(db_file, scale="tiny", seed=0, song_performs=200)
+    stats = sync_documents(db_file)
+    with sqlite3.connect(db_file) as conn:
+        num_entities = sum(
+            conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            for table_name, _ in DOC_KINDS.values() if table_name is not None
+        )
+    # plus the index
+    assert stats["built"] == num_entities + 1
+
+    sql_session = GrapheneSQLSession.from_sqlite_file(db_file)
+    doc_store = EntityDocStore(db_file)
+    ids = random_ids(db_file, num_ids=3)
+    for kind, (_, build) in DOC_KINDS.items():
+        for id_ in ids.get(kind, [""]):
+            expected = json.loads(json.dumps(build(sql_session, id_)))
+            # one lookup
+            with track_sql() as sql_stats:
+                assert doc_store.get(kind, id_) == expected
+            assert sql_stats.statements == 1
+    assert doc_store.get("song", "x") is None
+    assert doc_store.cache_stats()["misses"] == 1
+
+
+def test_sync_documents_incremental(tmp_path):
+    db_file = tmp_path / "jamming.db"
+    generate_jam_db(db_file, scale="tiny", seed=0, song_performs=200)
+    first = sync_documents(db_file)
+    docs = _read_docs(db_file)
+    assert sync_documents(db_file) == {
+        "built": 0, "unchanged": first["built"], "deleted": 0, "rows_changed": 0
+    }
+
+    with sqlite3.connect(db_file) as conn:
+        song_id, = conn.execute("SELECT song_id FROM SongPerform LIMIT 1").fetchone()
+        conn.execute("UPDATE Song SET song = 'Renamed' WHERE id = ?", (song_id,))
+        conn.execute(
+            "INSERT INTO Venue (id, venue, address, city, zip, state, web) "
+            "VALUES ('v_new', 'New Venue', '1 Main St', 'Town', '12345', 'CA', '')"
+        )
+    stats = sync_documents(db_file)
+    assert (stats["rows_changed"], stats["deleted"]) == (2, 0)
+    # the song, its performances and their events, the players, the new venue and the index
+    assert 0 < stats["built"] < first["built"] / 2
+
+    new_docs = _read_docs(db_file)
+    assert "Renamed" in new_docs[("song", song_id)]
+    assert "New Venue" in new_docs[("venue", "v_new")]
+    changed = {key for key in docs if new_docs[key] != docs[key]}
+    assert changed == {
+        key for key in docs if "Renamed" in new_docs[key] or key[0] == "index"
+    }
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("DELETE FROM Venue WHERE id = 'v_new'")
+    # only the index lists the venue
+    assert sync_documents(db_file) == {
+        "built": 1, "unchanged": first["built"] - 1, "deleted": 1, "rows_changed": 1
+    }
+    assert ("venue", "v_new") not in _read_docs(db_file)
+
+    # the same documents as built from scratch
+    new_docs = _read_docs(db_file)
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(f"DELETE FROM {ENTITY_DOC_TABLE}")
+    sync_documents(db_file)
+    assert _read_docs(db_file) == new_docs
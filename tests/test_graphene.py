@@ -0,0 +1,16 @@
+from jamdb.graphene import GrapheneSQLSession
+
+
+def test_plural_query_by_ids(empty_db_handler):
+    empty_db_handler.insert("Song", [{"id": x, "song": x.title()} for x in ["a", "b", "c"]])
+    gql_session = GrapheneSQLSession.from_sqlite_file(empty_db_handler.engine.url.database)
+
+    result = gql_session.execute("{ songs { id } }")
+    assert sorted(x["id"] for x in result.data["songs"]) == ["a", "b", "c"]
+
+    # rows come back in the order of `ids`, unknown ids are skipped
+    result = gql_session.execute(
+        "query getSongs ($ids: [ID]) { songs (ids: $ids) { id, song } }",
+        variables={"ids": ["c", "x", "a"]}
+    )
+    assert result.data["songs"] == [{"id": "c", "song": "C"}, {"id": "a", "song": "A"}]
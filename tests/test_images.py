@@ -0,0 +1,25 @@
+import pandas as pd
+from PIL import Image
+
+from jamdb.images import make_person_picture_variants
+
+
+def test_make_person_picture_variants(tmp_path):
+    (tmp_path / "people" / "jane").mkdir(parents=True)
+    Image.new("RGBA", (1600, 1200)).save(tmp_path / "people" / "jane" / "pic.png")
+    pictures = pd.DataFrame([{"id": "abc", "person_id": "jane", "link": "people/jane/pic.png"}])
+
+    variants = make_person_picture_variants(tmp_path, pictures, max_workers=1)
+
+    assert variants[["id", "variant", "width", "height"]].to_dict(orient="records") == [
+        {"id": "abc:thumb", "variant": "thumb", "width": 160, "height": 120},
+        {"id": "abc:web", "variant": "web", "width": 800, "height": 600},
+    ]
+    for link in variants["link"]:
+        assert (tmp_path / link).exists()
+
+    # derivatives are content addressed, so re-running renders nothing new
+    mtimes = [(tmp_path / link).stat().st_mtime_ns for link in variants["link"]]
+    again = make_person_picture_variants(tmp_path, pictures, max_workers=1)
+    assert again["link"].tolist() == variants["link"].tolist()
+    assert [(tmp_path / link).stat().st_mtime_ns for link in again["link"]] == mtimes
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).parents[1]
+# Only needed by the ingestion scripts, so the web workers should not pay for importing them
+INGESTION_ONLY = ["pandas", "numpy", "eralchemy", "PyPDF2", "spotipy", "requests"]
+
+
+@pytest.mark.parametrize("module", ["app", "jamdb.graphene", "jamdb.db"])
+def test_serving_path_imports(module):
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(x for x in {INGESTION_ONLY} if x in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+# Only needed to serve, so the ingestion scripts should not import the app
+SERVING_ONLY = ["flask", "flask_graphql"]
+
+
+@pytest.mark.parametrize("module", ["jamdb.documents", "jamdb.entity_docs"])
+def test_ingestion_path_imports(module):
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(x for x in {SERVING_ONLY} if x in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
@@ -0,0 +1,64 @@
+import pytest
+
+from jamdb.ireal import parse_ireal_playlist_html
+from jamdb.matching import normalize_song_name
+
+
+def make_playlist_html(songs, br="<br>"):
+    hrefs = "===".join(
+        f"{name.replace(' ', '%20')}={composer.replace(' ', '%20')}=Medium%20Swing=C=n=[T44C%20|F7%20]"
+        for name, composer in songs
+    )
+    names = br.join(f"{idx + 1}. {name} - {composer}" for idx, (name, composer) in enumerate(songs))
+    return (
+        "<html><head><title>Jazz</title></head>\n<body>\n"
+        f'<h3><a href="irealb://{hrefs}===Jazz Playlist">Jazz Playlist</a></h3>'
+        f"<p>{names}</p><p>Made with iReal Pro</p></body></html>"
+    )
+
+
+SONGS = [
+    ("Blue Monk", "Monk Thelonious"),
+    ("Blues - Bb", "Trad"),
+    ("Girl From Ipanema, The", "Jobim Antonio-Carlos"),
+    ("Opus No. 2. Reprise (RBB)", "Someone"),
+    ("Take The A Train", "Strayhorn Billy"),
+]
+
+
+@pytest.mark.parametrize("br", ["<br>", "<br/>", "<br />"])
+def test_parse_ireal_playlist_html(tmp_path, br):
+    html_file = tmp_path / "ireal_charts.html"
+    html_file.write_text(make_playlist_html(SONGS, br=br))
+
+    songs = parse_ireal_playlist_html(html_file)
+
+    assert [song["song_name"] for song in songs] == [
+        "Blue Monk", "Blues : Bb", "The Girl From Ipanema", "Opus No. 2. Reprise", "Take The A Train"
+    ]
+    assert songs[1]["composers"] == "Trad"
+    assert songs[2]["composers"] == "Jobim Antonio-Carlos"
+    assert songs[0]["i_real_href"].startswith("irealb://Blue%20Monk=")
+    assert songs[-1]["i_real_href"].endswith("[T44C%20|F7%20]")
+    assert songs[2]["normalized_name"] == normalize_song_name("The Girl From Ipanema")
+
+
+def test_parse_ireal_playlist_html_across_chunks(tmp_path):
+    songs = [(f"Song {idx}", f"Composer {idx}") for idx in range(300)]
+    html_file = tmp_path / "ireal_charts.html"
+    html_file.write_text(make_playlist_html(songs))
+    expected = parse_ireal_playlist_html(html_file)
+
+    # tiny chunks, so tokens are split over chunk boundaries
+    actual = parse_ireal_playlist_html(html_file, chunk_size=7)
+
+    assert actual == expected
+    assert [song["song_name"] for song in actual] == [name for name, _ in songs]
+
+
+def test_parse_ireal_playlist_html_mismatch(tmp_path):
+    html = make_playlist_html(SONGS).replace("===Take%20The", "XXXTake%20The")
+    html_file = tmp_path / "ireal_charts.html"
+    html_file.write_text(html)
+    with pytest.raises(ValueError):
+        parse_ireal_playlist_html(html_file)
@@ -0,0 +1,127 @@
+import json
+import sys
+from pathlib import Path
+
+import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, NameObject
+
+# the ingestion entry points live in scripts/, which is not a package
+sys.path.append(str(Path(__file__).parents[1] / "scripts"))
+
+from charts_from_ireal_setlist import (  # noqa: E402
+    _is_current,
+    _write_chart_pages,
+    build_ireal_song_index,
+    prune_charts,
+    write_charts,
+)
+
+
+def _ireal_song(normalized_name):
+    return {
+        "song_name": normalized_name, "composers": "", "i_real_href": f"irealb://{normalized_name}",
+        "dirty_name": normalized_name, "normalized_name": normalized_name,
+    }
+
+
+def _write_pdf(pdf_file, page_contents):
+    # a page per chart, each drawing its own line, so pages differ
+    pdf_writer = PyPDF2.PdfWriter()
+    for contents in page_contents:
+        pdf_writer.add_blank_page(width=100, height=100)
+        stream = DecodedStreamObject()
+        stream.set_data(contents)
+        pdf_writer.pages[-1][NameObject("/Contents")] = pdf_writer._add_object(stream)
+    with open(pdf_file, "wb") as fh:
+        pdf_writer.write(fh)
+    return pdf_file
+
+
+def test_build_ireal_song_index():
+    jam_songs = {
+        "s1": {"from_ireal": [_ireal_song("blue_monk"), _ireal_song("blue_monk_2")]},
+        "s2": {"from_ireal": [_ireal_song("blue_monk")]},
+        "s3": {},
+    }
+    # the first song claiming a chart wins
+    assert build_ireal_song_index(jam_songs) == {"blue_monk": "s1", "blue_monk_2": "s1"}
+
+
+def test_write_chart_pages(tmp_path):
+    songs = [_ireal_song("autumn_leaves"), _ireal_song("blue_monk")]
+    jobs = [
+        (page_num, str(tmp_path / "charts" / f"s{page_num}" / song["normalized_name"]), song)
+        for page_num, song in enumerate(songs)
+    ]
+    pdf_file = _write_pdf(tmp_path / "ireal_charts.pdf", [b"0 0 m 10 10 l S", b"0 0 m 20 20 l S"])
+
+    assert _write_chart_pages(pdf_file, jobs) == {"written": 2, "skipped": 0}
+    for _, stem, song in jobs:
+        written = PyPDF2.PdfReader(f"{stem}.pdf")
+        assert len(written.pages) == 1
+        written_song = json.loads(Path(f"{stem}.json").read_text())
+        assert written_song["normalized_name"] == song["normalized_name"]
+
+    # unchanged pages are skipped
+    assert _write_chart_pages(pdf_file, jobs) == {"written": 0, "skipped": 2}
+
+    # changed pages are rewritten, be it the page or its iReal data
+    _write_pdf(pdf_file, [b"0 0 m 10 10 l S", b"0 0 m 30 30 l S"])
+    assert _write_chart_pages(pdf_file, jobs) == {"written": 1, "skipped": 1}
+    page = PyPDF2.PdfReader(f"{jobs[1][1]}.pdf").pages[0]
+    assert page.get_contents().get_data() == b"0 0 m 30 30 l S"
+    jobs[0][2]["composers"] = "Joseph Kosma"
+    assert _write_chart_pages(pdf_file, jobs) == {"written": 1, "skipped": 1}
+
+
+def test_is_current(tmp_path):
+    stem = tmp_path / "blue_monk"
+    assert not _is_current(stem, "abc")
+    Path(f"{stem}.pdf").write_bytes(b"")
+    Path(f"{stem}.json").write_text(json.dumps({"page_hash": "abc"}))
+    assert _is_current(stem, "abc")
+    assert not _is_current(stem, "def")
+    Path(f"{stem}.json").write_text("{")
+    assert not _is_current(stem, "abc")
+    Path(f"{stem}.json").write_text(json.dumps({"page_hash": "abc"}))
+    Path(f"{stem}.pdf").unlink()
+    assert not _is_current(stem, "abc")
+
+
+def test_prune_charts(tmp_path):
+    charts_dir = tmp_path / "charts"
+    assert prune_charts(charts_dir, []) == 0
+
+    for stem in ["s1/autumn_leaves_ireal", "s2/blue_monk_ireal"]:
+        (charts_dir / stem).parent.mkdir(parents=True, exist_ok=True)
+        for suffix in [".pdf", ".json"]:
+            (charts_dir / f"{stem}{suffix}").write_text("")
+    (charts_dir / "s1" / "stray.txt").write_text("")
+
+    assert prune_charts(charts_dir, [charts_dir / "s1" / "autumn_leaves_ireal"]) == 3
+    assert sorted(path.relative_to(charts_dir).as_posix() for path in charts_dir.rglob("*")) == [
+        "s1", "s1/autumn_leaves_ireal.json", "s1/autumn_leaves_ireal.pdf"
+    ]
+
+
+def test_write_charts(tmp_path):
+    songs = [_ireal_song("autumn_leaves"), _ireal_song("blue_monk"), _ireal_song("giant_steps")]
+    pdf_file = _write_pdf(
+        tmp_path / "ireal_charts.pdf", [b"0 0 m 10 10 l S", b"0 0 m 20 20 l S", b"0 0 m 30 30 l S"]
+    )
+    charts_dir = tmp_path / "charts"
+    jam_songs = {"s1": {"from_ireal": [songs[0]]}, "s2": {"from_ireal": [songs[1]]}}
+
+    counts = write_charts(pdf_file, songs, jam_songs, charts_dir, max_workers=1)
+    assert counts == {"written": 2, "skipped": 0, "removed": 0}
+    # not matched to any song, so not written
+    assert not list(charts_dir.rglob("giant_steps*"))
+
+    counts = write_charts(pdf_file, songs, jam_songs, charts_dir, max_workers=1)
+    assert counts == {"written": 0, "skipped": 2, "removed": 0}
+
+    # charts no longer matched are pruned
+    del jam_songs["s2"]
+    counts = write_charts(pdf_file, songs, jam_songs, charts_dir, max_workers=1)
+    assert counts == {"written": 0, "skipped": 1, "removed": 2}
+    assert not (charts_dir / "s2").exists()
@@ -0,0 +1,108 @@
+import requests
+
+from jamdb.graphene import GrapheneSQLSession
+from jamdb.linkcheck import LINK_STATUS_TABLE, LinkChecker, broken_links, check_link, iter_links
+from jamdb.sqlstats import track_sql
+from tests.stub_servers import LinkStub
+
+
+def _insert_links(db_handler, chart_links, ref_rec_links):
+    db_handler.insert("LinkSource", [{"id": "web", "rank": 1}])
+    db_handler.insert("Song", [{"id": "blue_monk", "song": "Blue Monk"}])
+    db_handler.insert(
+        "Chart",
+        [
+            {"id": f"c{idx}", "song_id": "blue_monk", "source_id": "web", "link": link}
+            for idx, link in enumerate(chart_links)
+        ]
+    )
+    db_handler.insert(
+        "RefRec",
+        [
+            {"id": f"r{idx}", "song_id": "blue_monk", "source_id": "web", "link": link}
+            for idx, link in enumerate(ref_rec_links)
+        ]
+    )
+
+
+def test_iter_links(empty_db_handler):
+    _insert_links(
+        empty_db_handler, ["http://a/1", "charts/x.pdf", "https://b/2"], ["http://c/3", "irealb://x"]
+    )
+    chunks = list(iter_links(empty_db_handler, chunk_size=2))
+    assert chunks == [["http://a/1", "http://c/3"], ["https://b/2"]]
+
+
+def test_link_checker(empty_db_handler):
+    with LinkStub(latency=0.05) as stub:
+        ok_links = [stub.url(f"/ok/{idx}", host) for idx in range(8) for host in ["127.0.0.1", "localhost"]]
+        _insert_links(
+            empty_db_handler,
+            ok_links + [stub.url("/nohead/1")],
+            [stub.url("/missing/1"), "http://127.0.0.1:9/refused"]
+        )
+        checker = LinkChecker(empty_db_handler, concurrency=8, per_host=2, timeout=2)
+
+        stats = checker.run(chunk_size=5)
+        assert stats == {"checked": 19, "cached": 0, "broken": 2}
+        assert all(x <= 2 for x in stub.max_in_flight.values())
+        assert max(stub.max_in_flight.values()) == 2
+
+        broken = {row["link"]: row for row in broken_links(empty_db_handler)}
+        assert set(broken) == {stub.url("/missing/1"), "http://127.0.0.1:9/refused"}
+        assert broken[stub.url("/missing/1")]["status"] == 404
+        assert "ConnectionError" in broken["http://127.0.0.1:9/refused"]["error"]
+
+        # within the TTL, nothing is checked again
+        num_requests = len(stub.requests)
+        assert checker.run()["cached"] == 19
+        assert len(stub.requests) == num_requests
+
+        # past it, links are re-checked, conditionally
+        checker.ttl = 0
+        assert checker.run()["broken"] == 2
+        conditional = [x for x in stub.requests[num_requests:] if "If-None-Match" in x[2]]
+        assert len(conditional) == 16
+
+
+def test_link_checker_busy_host(empty_db_handler):
+    with LinkStub(latency=0.1) as stub:
+        # most links on one host, sorted before the other host's
+        busy_links = [stub.url(f"/ok/{idx}") for idx in range(12)]
+        other_links = [stub.url(f"/ok/other{idx}", "localhost") for idx in range(2)]
+        _insert_links(empty_db_handler, busy_links + other_links, [])
+        checker = LinkChecker(empty_db_handler, concurrency=4, per_host=2, timeout=2)
+
+        assert checker.run()["checked"] == 14
+        # links waiting on the busy host leave the other global slots to other hosts, so those
+        # are checked in the first round, rather than after the busy host's
+        first_round = [headers["Host"] for _, _, headers in stub.requests[:4]]
+        assert sum(1 for host in first_round if host.startswith("localhost")) == 2
+
+
+def test_check_link_not_modified():
+    with LinkStub() as stub:
+        link = stub.url("/ok/1")
+        first = check_link(requests.Session(), link)
+        second = check_link(requests.Session(), link, previous=first)
+    assert first["ok"] and first["status"] == 200 and first["etag"] == '"/ok/1"'
+    assert second["ok"] and second["status"] == 200
+    assert second["checked_at"] >= first["checked_at"]
+
+
+def test_link_status_in_graphql(empty_db_handler):
+    with LinkStub() as stub:
+        _insert_links(empty_db_handler, [stub.url("/ok/1"), stub.url("/missing/1")], [])
+        LinkChecker(empty_db_handler).run()
+    gql_session = GrapheneSQLSession.from_sqlite_file(empty_db_handler.engine.url.database)
+    with track_sql() as stats:
+        result = gql_session.execute("{ charts { id linkStatus { status ok } } }")
+    assert result.errors is None
+    # one query for the statuses of all charts
+    assert sum(
+        count for statement, count in stats._by_statement.items() if LINK_STATUS_TABLE in statement
+    ) == 1
+    assert {chart["id"]: chart["linkStatus"] for chart in result.data["charts"]} == {
+        "c0": {"status": 200, "ok": True},
+        "c1": {"status": 404, "ok": False},
+    }
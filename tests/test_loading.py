@@ -0,0 +1,60 @@
+import pytest
+
+from jamdb.loading import LoadCheckpoint, LoadPlanner, fk_dependency_graph, topological_order
+
+PRODUCED_BY = {"PerformanceVideo": "SongPerform", "SongPerformer": "SongPerform"}
+
+ROWS = {
+    "Mode": [{"id": "major", "mode": "major"}, {"id": "minor", "mode": "minor"}],
+    "Key": [{"id": "D_minor", "root": "D", "mode_id": "minor"}],
+}
+
+
+def test_fk_order(empty_db_handler):
+    table_names = [x for x in empty_db_handler.tables() if not x.startswith("_")]
+    graph = fk_dependency_graph(empty_db_handler, table_names, PRODUCED_BY)
+    order = topological_order(graph)
+
+    assert "SongPerformer" not in order
+    assert "PerformanceVideo" not in order
+    for table_name, depends_on in graph.items():
+        for referred in depends_on:
+            assert order.index(referred) < order.index(table_name)
+    # SongPerform inherits the FK to PersonInstrument via SongPerformer
+    assert "PersonInstrument" in graph["SongPerform"]
+
+
+def test_resume_from_checkpoint(empty_db_handler, tmp_path):
+    checkpoint = LoadCheckpoint(tmp_path / "checkpoint.json")
+    extracted = []
+
+    def extract(table_name):
+        extracted.append(table_name)
+        return ROWS[table_name]
+
+    def failing_load(db_handler, table_name, rows, session):
+        if table_name == "Key":
+            raise RuntimeError("boom")
+        db_handler.insert(table_name, rows, session=session)
+
+    def load(db_handler, table_name, rows, session):
+        db_handler.insert(table_name, rows, session=session)
+
+    planner = LoadPlanner(
+        empty_db_handler, extract, failing_load, table_names=["Key", "Mode"], checkpoint=checkpoint
+    )
+    assert planner.order() == ["Mode", "Key"]
+    with pytest.raises(RuntimeError):
+        planner.run()
+    assert list(checkpoint.completed()) == ["Mode"]
+
+    extracted.clear()
+    planner.load = load
+    stats = planner.run()
+
+    assert extracted == ["Key"]
+    assert [(row["table"], row["rows"], row["resumed"]) for row in stats] == [
+        ("Mode", {"Mode": 2}, True),
+        ("Key", {"Key": 1}, False),
+    ]
+    assert len(empty_db_handler.read_table("Key")) == 1
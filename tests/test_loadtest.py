@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from flask import Flask, abort, request
+from werkzeug.serving import make_server
+
+from jamdb.loadtest import LoadTest, build_mix, percentile, random_ids
+
+
+@pytest.fixture
+def app_url():
+    app = Flask(__name__)
+    app.add_url_rule("/overview/", "overview", lambda: "overview")
+
+    @app.route("/detail/<string:id>")
+    def detail(id):
+        if id == "missing":
+            abort(404)
+        return id
+
+    @app.route("/graphql", methods=["POST"])
+    def graphql():
+        return {"data": request.get_json()["variables"]}
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    thread.join()
+
+
+def test_percentile():
+    vals = list(range(1, 101))
+    assert [percentile(vals, pct) for pct in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_random_ids(empty_db_handler):
+    empty_db_handler.insert("Song", [{"id": f"s{x}", "song": f"Song {x}"} for x in range(10)])
+    ids = random_ids(empty_db_handler.engine.url.database, num_ids=4, seed=1)
+    assert len(ids["song"]) == 4
+    assert set(ids["song"]) <= {f"s{x}" for x in range(10)}
+    assert ids["venue"] == []
+    assert random_ids(empty_db_handler.engine.url.database, num_ids=4, seed=1) == ids
+
+
+def test_build_mix():
+    mix = build_mix(
+        {"song": ["a", "b"], "venue": []},
+        overview_routes={"overview": "/overview/"},
+        detail_routes={
+            "detail_song": ("/detail/{id}", "song"), "detail_venue": ("/detail/{id}", "venue")
+        },
+        graphql_queries={"SONG": ("query { x }", "song")},
+        graphql_variables={"other": 1},
+        weights={"graphql": 0, "detail_song": 3}
+    )
+    assert [(x["name"], x["path"], x["weight"]) for x in mix] == [
+        ("overview", "/overview/", 1.0),
+        ("detail_song", "/detail/a", 1.5),
+        ("detail_song", "/detail/b", 1.5),
+    ]
+
+    mix = build_mix({"song": ["a"]}, graphql_queries={"SONG": ("query { x }", "song")},
+                    graphql_variables={"other": 1})
+    assert mix == [{
+        "name": "graphql:SONG", "method": "POST", "path": "/graphql", "weight": 0.5,
+        "json": {"query": "query { x }", "variables": {"other": 1, "id": "a"}}
+    }]
+
+
+def test_load_test(app_url):
+    mix = build_mix(
+        {"song": ["a", "missing"]},
+        overview_routes={"overview": "/overview/"},
+        detail_routes={"detail": ("/detail/{id}", "song")},
+        graphql_queries={"SONG": ("query { x }", "song")},
+    )
+    report = LoadTest(app_url, mix, concurrency=3, num_requests=60, warmup=5).run()
+
+    assert report["total"]["requests"] == 60
+    assert set(report["routes"]) == {"overview", "detail", "graphql:SONG"}
+    assert sum(route["requests"] for route in report["routes"].values()) == 60
+    # about half the detail pages are missing
+    assert 0 < report["routes"]["detail"]["errors"] < report["routes"]["detail"]["requests"]
+    assert report["routes"]["overview"]["errors"] == 0
+    total = report["total"]
+    assert total["p50"] <= total["p95"] <= total["p99"]
+    assert total["throughput"] > 0
+
+
+def test_load_test_unreachable():
+    mix = build_mix({}, overview_routes={"overview": "/overview/"})
+    report = LoadTest("http://127.0.0.1:9", mix, concurrency=2, num_requests=4, timeout=1).run()
+    assert report["total"]["errors"] == 4
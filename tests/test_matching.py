@@ -0,0 +1,43 @@
+from jamdb.matching import SongNameIndex, normalize_song_name, strip_version_suffix
+
+SONGS = {
+    "autumn_leaves": "Autumn Leaves",
+    "blue_monk": "Blue Monk",
+    "blue_bossa": "Blue Bossa",
+    "bye_bye_blackbird": "Bye-Bye Blackbird",
+    "girl_from_ipanema": "The Girl From Ipanema",
+    "take_the_a_train": "Take The A Train",
+}
+
+
+def test_normalize_song_name():
+    assert normalize_song_name("The Girl From Ipanema") == "girl_from_ipanema"
+    spotify_name = "Autumn Leaves - Remastered 2009"
+    assert normalize_song_name(strip_version_suffix(spotify_name)) == "autumn_leaves"
+    # distinct iReal charts stay distinct
+    assert normalize_song_name("Blues - Bb") != normalize_song_name("Blues - F")
+    assert normalize_song_name("Bye-Bye  Blackbird") == "byebye_blackbird"
+    assert normalize_song_name("  Don't Get Around Much (Anymore)?") == "dont_get_around_much_anymore"
+
+
+def test_lookup():
+    index = SongNameIndex(SONGS)
+
+    assert index.lookup(strip_version_suffix("Blue Monk - Live"), k=1) == [("blue_monk", 1.0)]
+    assert index.exact("the blue monk") == ["blue_monk"]
+
+    matches = index.lookup("Blue Monkk", k=3)
+    assert matches[0][0] == "blue_monk"
+    assert matches[1][0] == "blue_bossa"
+    assert matches[0][1] > matches[1][1]
+    assert index.lookup("zzzz") == []
+
+
+def test_match():
+    index = SongNameIndex(SONGS)
+
+    assert index.match("Girl From Ipanema (Garota de Ipanema)") is None
+    assert index.match("Take the 'A' Train")[0] == "take_the_a_train"
+    assert index.match("Bye Bye Blackbird")[0] == "bye_bye_blackbird"
+    # close to two songs, so not confident
+    assert index.match("Blue", min_score=0.3) is None
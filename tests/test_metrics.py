@@ -0,0 +1,62 @@
+from flask import Flask
+
+from app.instrumentation import graphql_middleware, init_metrics
+from jamdb.graphene import GrapheneSQLSession
+from jamdb.metrics import Histogram, MetricsRegistry, ResolverTimingMiddleware
+
+
+class _FakeCache:
+    def cache_stats(self):
+        return {"hits": 3, "misses": 1}
+
+
+def test_histogram():
+    histogram = Histogram("latency", "Latency", ["route"], buckets=(0.1, 1))
+    for value in [0.05, 0.5, 0.5, 5]:
+        histogram.observe(value, "a")
+    assert histogram.samples(["a"]) == (4, 6.05)
+    assert histogram.render() == [
+        'latency_bucket{route="a",le="0.1"} 1',
+        'latency_bucket{route="a",le="1"} 3',
+        'latency_bucket{route="a",le="+Inf"} 4',
+        'latency_sum{route="a"} 6.05',
+        'latency_count{route="a"} 4',
+    ]
+
+
+def test_resolver_timing_middleware(empty_db_handler):
+    empty_db_handler.insert("Song", [{"id": x, "song": x.title()} for x in ["a", "b", "c"]])
+    registry = MetricsRegistry()
+    middleware = ResolverTimingMiddleware(registry)
+    gql_session = GrapheneSQLSession.from_sqlite_file(
+        empty_db_handler.engine.url.database, middleware=[middleware]
+    )
+
+    result = gql_session.execute("{ songs { id song } }")
+    assert result.errors is None
+    assert middleware.histogram.samples(["Query.songs"])[0] == 1
+    assert middleware.histogram.samples(["SongGQL.song"])[0] == 3
+    assert "# TYPE jamdb_resolver_seconds histogram" in registry.render()
+
+
+def test_metrics_endpoint():
+    app = init_metrics(Flask(__name__))
+    app.extensions["jamdb_fake_cache"] = _FakeCache()
+    app.add_url_rule("/hello", "hello", lambda: "hello")
+    assert graphql_middleware(app) is not None
+
+    client = app.test_client()
+    client.get("/hello")
+    client.get("/hello")
+    metrics = client.get("/metrics").get_data(as_text=True).splitlines()
+    assert 'jamdb_request_seconds_count{endpoint="hello",method="GET",status="200"} 2' in metrics
+    assert 'jamdb_cache_requests_total{cache="fake_cache",result="hits"} 3' in metrics
+    assert 'jamdb_cache_hit_ratio{cache="fake_cache"} 0.75' in metrics
+
+
+def test_metrics_disabled():
+    flask_app = Flask(__name__)
+    flask_app.config["METRICS"] = False
+    app = init_metrics(flask_app)
+    assert graphql_middleware(app) is None
+    assert app.test_client().get("/metrics").status_code == 404
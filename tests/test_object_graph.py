@@ -0,0 +1,86 @@
+import json
+import os
+
+from app import queries
+from jamdb.globals import ME_ID
+from jamdb.graphene import GrapheneSQLSession
+from jamdb.loadtest import random_ids
+from jamdb.object_graph import ObjectGraphStore
+from jamdb.sqlstats import track_sql
+from jamdb.synthetic import generate_jam_db
+
+# query name -> the kind of its `id`, see `jamdb.loadtest.ID_TABLES`
+QUERIES = {
+    "INDEX": None,
+    "OVERVIEW_EVENT_OCCS": None,
+    "OVERVIEW_PLAYERS": None,
+    "OVERVIEW_SONGS": None,
+    "DETAIL_EVENT_OCC": "event_occ",
+    "DETAIL_PERFORMED_SONG": "song_perform",
+    "DETAIL_SONG": "song",
+    "DETAIL_PLAYER": "person",
+    "DETAIL_VENUE": "venue",
+}
+
+
+def _insert_songs(db_handler):
+    db_handler.insert("Composer", [{"id": f"c{x}", "composer": f"Composer {x}"} for x in range(2)])
+    db_handler.insert(
+        "Song", [{"id": f"s{x}", "song": f"Song {x}", "composer_id": f"c{x % 2}"} for x in range(3)]
+    )
+
+
+def test_object_graph(empty_db_handler):
+    _insert_songs(empty_db_handler)
+    store = ObjectGraphStore(empty_db_handler.engine, empty_db_handler.model_classes())
+    graph = store.current()
+
+    song = graph.get("Song", "s2")
+    assert (song.id, song.song) == ("s2", "Song 2")
+    assert song.composer is graph.get("Composer", "c0")
+    assert [x.id for x in song.composer.song_collection] == ["s0", "s2"]
+    assert graph.get("Song", "x") is None
+    assert [x.id for x in graph.rows("Song", ids=["s1", "x", "s0"])] == ["s1", "s0"]
+    # records are compact, without a `__dict__`
+    assert not hasattr(song, "__dict__")
+
+
+def test_object_graph_store_swaps_on_change(empty_db_handler):
+    _insert_songs(empty_db_handler)
+    store = ObjectGraphStore(empty_db_handler.engine, empty_db_handler.model_classes())
+    graph = store.current()
+    assert store.current() is graph
+    assert store.cache_stats() == {"hits": 1, "misses": 1}
+
+    empty_db_handler.insert("Song", [{"id": "s3", "song": "Song 3", "composer_id": "c1"}])
+    # the change might land in the same mtime tick, as far as the file system can tell
+    os.utime(store.db_file, ns=(0, 0))
+    new_graph = store.current()
+    assert new_graph is not graph
+    assert [x.id for x in new_graph.get("Composer", "c1").song_collection] == ["s1", "s3"]
+    # the old graph is left as it was, for queries still using it
+    assert [x.id for x in graph.get("Composer", "c1").song_collection] == ["s1"]
+
+
+def test_object_graph_matches_sql(tmp_path):
+    db_file = tmp_path / "jamming.db"
+    generate_jam_db(db_file, scale="tiny", seed=0, song_performs=200)
+    sql_session = GrapheneSQLSession.from_sqlite_file(db_file)
+    graph_session = GrapheneSQLSession.from_sqlite_file(db_file, object_graph=True)
+    ids = random_ids(db_file, num_ids=3)
+    # one statement per table, once
+    with track_sql() as stats:
+        graph_session.graph_store.current()
+    assert stats.statements == len(graph_session.graph_store.model_classes)
+
+    for query_name, kind in QUERIES.items():
+        for id_ in [None] if kind is None else ids[kind]:
+            variables = {"id": id_, "otherPersonId": ME_ID}
+            expected = sql_session.execute(getattr(queries, query_name), variables=variables)
+            assert expected.errors is None
+            with track_sql() as stats:
+                result = graph_session.execute(getattr(queries, query_name), variables=variables)
+            assert result.errors is None
+            # same data, in the same order, without any SQL
+            assert json.dumps(result.data, default=str) == json.dumps(expected.data, default=str)
+            assert stats.statements == 0
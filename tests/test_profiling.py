@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask, render_template_string
+
+from app.instrumentation import PROFILE_HEADER, init_profiling
+from jamdb.profiling import SamplingProfiler, classify
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_classify():
+    view = [("wsgi_app", "flask/app.py", 1), ("detail_song", "app/routes.py", 1)]
+    execute = view + [("execute", "graphql/execution/executor.py", 1)]
+    assert classify(view) == "python"
+    assert classify(execute) == "graphql_execute"
+    assert classify(execute + [("parse", "graphql/language/parser.py", 1)]) == "graphql_parse"
+    assert classify(execute + [("resolve_players", "jamdb/graphene.py", 1)]) == "graphql_execute"
+    assert classify(execute + [("instances", "sqlalchemy/orm/loading.py", 1)]) == "orm"
+    assert classify(view + [("root", "templates/detail_song.html", 1)]) == "jinja"
+    # flask_graphql is not graphql
+    assert classify([("dispatch_request", "flask_graphql/graphqlview.py", 1)]) == "other"
+
+
+def test_sampling_profiler(tmp_path):
+    with SamplingProfiler(interval=0.001) as profiler:
+        _busy(0.1)
+    assert profiler.num_samples > 0
+    # samples are weighted by time, so they account for (nearly) all of it
+    assert 0.05 < sum(profiler.samples.values()) <= profiler.wall_time
+    assert any(frame[0] == "_busy" for stack in profiler.samples for frame in stack)
+
+    summary_file = profiler.write(tmp_path, "busy", path="/busy")
+    summary = json.loads(summary_file.read_text())
+    assert summary["path"] == "/busy"
+    assert summary["phases"] == profiler.phases()
+
+    speedscope = json.loads((tmp_path / "busy.speedscope.json").read_text())
+    frames = speedscope["shared"]["frames"]
+    profile = speedscope["profiles"][0]
+    assert len(profile["samples"]) == len(profile["weights"]) == len(profiler.samples)
+    assert all(0 <= idx < len(frames) for sample in profile["samples"] for idx in sample)
+
+    collapsed = (tmp_path / "busy.collapsed").read_text().splitlines()
+    assert len(collapsed) == len(profiler.samples)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+
+
+def test_profiling_hook(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config.update(PROFILE_DIR=tmp_path / "profiles", PROFILE_INTERVAL=0.001)
+    app = init_profiling(flask_app)
+
+    @app.route("/busy")
+    def busy():
+        _busy(0.05)
+        return render_template_string("{{ x }}", x="done")
+
+    client = app.test_client()
+    # off, unless enabled in the config
+    response = client.get("/busy", headers={PROFILE_HEADER: "1"})
+    assert "X-Profile" not in response.headers
+    assert not (tmp_path / "profiles").exists()
+
+    app.config["PROFILING"] = True
+    response = client.get("/busy")
+    assert "X-Profile" not in response.headers
+
+    response = client.get("/busy", headers={PROFILE_HEADER: "1"})
+    assert response.get_data(as_text=True) == "done"
+    name = response.headers["X-Profile"]
+    assert "-busy-" in name
+    assert "total;dur=" in response.headers["Server-Timing"]
+    summary = json.loads((tmp_path / "profiles" / f"{name}.json").read_text())
+    assert summary["endpoint"] == "busy"
+    # the busy loop is in a test, so it counts as "other"
+    assert summary["phases"]["other"] > 0.025
+
+
+def test_profiling_hook_stops_on_error(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        TESTING=True, PROFILING=True, PROFILE_DIR=tmp_path / "profiles", PROFILE_INTERVAL=0.001
+    )
+    app = init_profiling(flask_app)
+
+    @app.route("/fail")
+    def fail():
+        raise RuntimeError("fail")
+
+    client = app.test_client()
+    with pytest.raises(RuntimeError):
+        client.get("/fail", headers={PROFILE_HEADER: "1"})
+    assert not any(thread.name == "jamdb-profiler" for thread in threading.enumerate())
@@ -0,0 +1,67 @@
+import json
+import time
+
+import pytest
+
+from jamdb.run_report import RunReport, file_size, format_run_report
+
+
+def test_run_report_stages(empty_db_handler, tmp_path):
+    source_file = tmp_path / "source.csv"
+    source_file.write_text("x" * 1000)
+    run_report = RunReport("ingest", db_file="jamming.db")
+
+    with run_report.stage("read", bytes_read=file_size(source_file, tmp_path / "missing")) as stage:
+        time.sleep(0.01)
+        stage.rows_out = 3
+    with run_report.stage("load", rows_in=3) as stage:
+        empty_db_handler.insert("Composer", [{"id": f"c{x}", "composer": f"C {x}"} for x in range(3)])
+        empty_db_handler.read_table("Composer")
+        stage.rows_out = 3
+        stage.details["tables"] = {"Composer": 3}
+
+    read, load = run_report.stages
+    assert read.bytes_read == 1000
+    assert read.wall_time >= 0.01
+    assert read.db_statements == 0
+    assert load.db_statements > 0
+    assert 0 < load.db_write_time <= load.db_time <= load.wall_time
+    assert load.peak_rss_mb is None or load.peak_rss_mb > 0
+
+    report = run_report.to_dict()
+    assert report["metadata"] == {"db_file": "jamming.db"}
+    assert [stage["name"] for stage in report["stages"]] == ["read", "load"]
+    assert report["stages"][1]["details"] == {"tables": {"Composer": 3}}
+
+
+def test_run_report_error():
+    run_report = RunReport("ingest")
+    with pytest.raises(ValueError):
+        with run_report.stage("parse"):
+            raise ValueError("bad row")
+    assert run_report.stages[0].error == "ValueError: bad row"
+    assert run_report.stages[0].wall_time is not None
+    assert "FAILED" in format_run_report(run_report.to_dict())
+
+
+def test_write_run_report(tmp_path, capsys):
+    first = RunReport("ingest")
+    with first.stage("load"):
+        pass
+    first_file = first.write(tmp_path)
+    assert json.loads(first_file.read_text())["stages"][0]["name"] == "load"
+    assert "vs prev" in capsys.readouterr().out
+
+    second = RunReport("ingest")
+    # a second later, so the reports do not share a file name
+    second.started_at = first.started_at.replace(second=(first.started_at.second + 1) % 60)
+    with second.stage("load"):
+        time.sleep(0.01)
+    assert second.previous_report_file(tmp_path) == first_file
+    second.write(tmp_path)
+    assert len(list(tmp_path.glob("ingest_*.json"))) == 2
+
+    load_line = capsys.readouterr().out.splitlines()[2]
+    assert load_line.split()[0] == "load"
+    # compared to the first run
+    assert load_line.split()[2].startswith("+")
@@ -0,0 +1,93 @@
+import pytest
+from spotipy import SpotifyException
+
+from jamdb.spotify import (
+    SpotifyTrackCache,
+    call_with_retry,
+    fetch_playlist_tracks,
+    make_requests_session,
+)
+from tests.stub_servers import SpotifyStub, make_track
+
+PLAYLIST = {"snapshot_id": "snap1", "tracks": [make_track(idx) for idx in range(1234)]}
+
+
+def test_fetch_playlist_tracks():
+    with SpotifyStub({"pl": PLAYLIST}) as stub:
+        conn = stub.spotipy_conn(requests_session=make_requests_session())
+        tracks = fetch_playlist_tracks(conn, "pl")
+
+    assert tracks == PLAYLIST["tracks"]
+    # 1 page to learn the total, then the other 12 at full page size
+    assert len(stub.requests) == 13
+    assert {query["limit"][0] for _, query in stub.requests} == {"100"}
+
+
+def test_fetch_playlist_tracks_retries():
+    sleeps = []
+    with SpotifyStub({"pl": PLAYLIST}, failures=[429, 503, 500], retry_after=2) as stub:
+        conn = stub.spotipy_conn(requests_session=make_requests_session())
+        tracks = fetch_playlist_tracks(conn, "pl", sleep=sleeps.append)
+
+    assert tracks == PLAYLIST["tracks"]
+    assert len(stub.requests) == 13 + 3
+    assert len(sleeps) == 3
+    # Retry-After is respected
+    assert all(delay >= 2 for delay in sleeps)
+
+
+def test_call_with_retry_gives_up():
+    calls = []
+
+    def fail(status):
+        calls.append(status)
+        raise SpotifyException(status, -1, "nope")
+
+    with pytest.raises(SpotifyException):
+        call_with_retry(lambda: fail(503), max_retries=2, sleep=lambda x: None)
+    assert len(calls) == 3
+
+    # client errors are not retried
+    with pytest.raises(SpotifyException):
+        call_with_retry(lambda: fail(404), sleep=lambda x: None)
+    assert len(calls) == 4
+
+
+def test_spotify_track_cache(tmp_path):
+    shared = [make_track(idx, "shared") for idx in range(150)]
+    playlists = {
+        "pl1": {"snapshot_id": "a1", "tracks": shared + [make_track(idx, "one") for idx in range(10)]},
+        "pl2": {"snapshot_id": "b1", "tracks": shared[::-1]},
+    }
+    cache = SpotifyTrackCache(tmp_path / "spotify_cache.db")
+
+    def fetched_ids(stub):
+        return [
+            track_id for path, query in stub.requests if path.startswith("/v1/tracks")
+            for track_id in query["ids"][0].split(",")
+        ]
+
+    with SpotifyStub(playlists) as stub:
+        conn = stub.spotipy_conn(requests_session=make_requests_session())
+        tracks = cache.sync_playlist(conn, "pl1")
+        assert [x["uri"] for x in tracks] == [x["track"]["uri"] for x in playlists["pl1"]["tracks"]]
+        assert len(fetched_ids(stub)) == 160
+
+        # the tracks pl2 shares with pl1 are already cached
+        tracks = cache.sync_playlist(conn, "pl2")
+        assert tracks[0]["name"] == "Song 149"
+        assert len(fetched_ids(stub)) == 160
+
+        # same snapshot, so just the one request for the snapshot id
+        num_requests = len(stub.requests)
+        cache.sync_playlist(conn, "pl1")
+        assert len(stub.requests) == num_requests + 1
+
+        # one track added
+        playlists["pl1"] = {"snapshot_id": "a2", "tracks": playlists["pl1"]["tracks"] + [make_track(0, "new")]}
+        tracks = cache.sync_playlist(conn, "pl1")
+        assert fetched_ids(stub)[160:] == ["new000000"]
+        assert tracks[-1]["link"] == "https://open.spotify.com/track/new000000"
+
+    # persisted
+    assert SpotifyTrackCache(tmp_path / "spotify_cache.db").snapshot_id("pl1") == "a2"
@@ -0,0 +1,75 @@
+from flask import Flask
+from flask_graphql import GraphQLView
+
+from app.instrumentation import SQL_STATS_HEADER, init_sql_stats
+from jamdb.graphene import GrapheneSQLSession
+from jamdb.sqlstats import current_sql_stats, track_sql
+
+SONGS_QUERY = "{ songs { id composer { composer } } }"
+
+
+def _gql_session(db_handler):
+    db_handler.insert("Composer", [{"id": f"c{x}", "composer": f"Composer {x}"} for x in range(3)])
+    db_handler.insert(
+        "Song", [{"id": f"s{x}", "song": f"Song {x}", "composer_id": f"c{x}"} for x in range(3)]
+    )
+    return GrapheneSQLSession.from_sqlite_file(db_handler.engine.url.database)
+
+
+def test_track_sql(empty_db_handler):
+    gql_session = _gql_session(empty_db_handler)
+    assert current_sql_stats() is None
+
+    with track_sql() as stats:
+        assert current_sql_stats() is stats
+        gql_session.execute(SONGS_QUERY)
+        # the songs, then one lazy load per composer
+        assert stats.statements == 4
+        assert stats.rows == 6
+        assert stats.duplicates == 0
+        assert stats.top_statements()[0]["count"] == 3
+        assert stats.writes == 0
+
+        # the same statements with the same parameters, again
+        gql_session.execute(SONGS_QUERY)
+        assert stats.statements == 8
+        assert stats.rows == 12
+        assert stats.duplicates == 4
+    assert current_sql_stats() is None
+
+    # nothing is recorded outside of `track_sql`
+    gql_session.execute(SONGS_QUERY)
+    assert stats.statements == 8
+
+    with track_sql() as stats:
+        empty_db_handler.insert("Composer", [{"id": "c3", "composer": "Composer 3"}])
+    assert stats.writes == 1
+    # and its commit
+    assert stats.commits == 1
+    assert 0 < stats.write_time <= stats.db_time
+
+
+def test_sql_stats_in_graphql_extensions(empty_db_handler):
+    gql_session = _gql_session(empty_db_handler)
+    app = init_sql_stats(Flask(__name__))
+    app.add_url_rule(
+        "/graphql",
+        view_func=GraphQLView.as_view(
+            "graphql", schema=gql_session.schema, get_context=lambda: {"session": gql_session.session}
+        ),
+        methods=["POST"]
+    )
+    client = app.test_client()
+
+    body = client.post("/graphql", json={"query": SONGS_QUERY}).get_json()
+    assert len(body["data"]["songs"]) == 3
+    assert "extensions" not in body
+
+    body = client.post(
+        "/graphql", json={"query": SONGS_QUERY}, headers={SQL_STATS_HEADER: "1"}
+    ).get_json()
+    assert len(body["data"]["songs"]) == 3
+    # stats are per request
+    sql_stats = body["extensions"]["sql"]
+    assert (sql_stats["statements"], sql_stats["rows"], sql_stats["duplicates"]) == (4, 6, 0)
+    assert sql_stats["topStatements"][0]["count"] == 3
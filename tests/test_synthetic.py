@@ -0,0 +1,35 @@
+import sqlite3
+from collections import Counter
+
+from jamdb.globals import ME_ID
+from jamdb.synthetic import SyntheticJamDB, generate_jam_db
+
+
+def test_generate_jam_db(tmp_path):
+    db_file = tmp_path / "jamming.db"
+    counts = generate_jam_db(db_file, scale="tiny", seed=1, song_performs=300)
+    assert counts["SongPerform"] == 300
+    assert counts["SongPerformer"] > 300
+
+    with sqlite3.connect(db_file) as conn:
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        for table_name in counts:
+            actual = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            assert actual == counts[table_name]
+        # I play on most songs
+        num_mine = conn.execute(
+            "SELECT COUNT(*) FROM SongPerformer WHERE person_instrument_id LIKE ?", (f"{ME_ID}:%",)
+        ).fetchone()[0]
+        assert num_mine > 0.5 * counts["SongPerform"]
+
+
+def test_synthetic_is_seeded_and_skewed():
+    tables = SyntheticJamDB("tiny", seed=3).build()
+    assert tables == SyntheticJamDB("tiny", seed=3).build()
+    assert tables["SongPerform"] != SyntheticJamDB("tiny", seed=4).build()["SongPerform"]
+
+    # the most popular song / series get far more than their share
+    song_counts = Counter(x["song_id"] for x in tables["SongPerform"])
+    assert song_counts.most_common(1)[0][1] > 10 * len(tables["SongPerform"]) / len(tables["Song"])
+    series_counts = Counter(x["event_gen_id"] for x in tables["EventOcc"])
+    assert series_counts.most_common(1)[0][1] > 2 * len(tables["EventOcc"]) / len(tables["EventGen"])
@@ -0,0 +1,69 @@
+from jamdb.thumbnails import ThumbnailCache, read_thumbnail_source
+from tests.stub_servers import ThumbnailStub
+
+
+def _thumbnail_cache(stub, data_dir, **kwargs):
+    return ThumbnailCache(
+        data_dir,
+        youtube_thumbnail_url=f"{stub.url}/vi/{{video_id}}/hqdefault.jpg",
+        spotify_oembed_url=f"{stub.url}/oembed",
+        **kwargs
+    )
+
+
+def test_thumbnail_cache(tmp_path):
+    with ThumbnailStub() as stub:
+        cache = _thumbnail_cache(stub, tmp_path)
+
+        youtube = cache.get("youtube", "https://www.youtube.com/watch?v=abc&t=5")
+        assert (tmp_path / youtube).read_bytes() == b"image for /vi/abc/hqdefault.jpg"
+        spotify = cache.get("Spotify", "https://open.spotify.com/track/xyz")
+        assert (tmp_path / spotify).read_bytes() == b"image for /images/xyz.jpg"
+        assert stub.requests == ["/vi/abc/hqdefault.jpg", "/oembed", "/images/xyz.jpg"]
+
+        # cached from now on
+        assert cache.get("youtube", "https://www.youtube.com/watch?v=abc&t=5") == youtube
+        assert len(stub.requests) == 3
+        assert cache.cache_stats() == {"hits": 1, "misses": 2}
+
+
+def test_thumbnail_cache_unavailable(tmp_path):
+    with ThumbnailStub() as stub:
+        cache = _thumbnail_cache(stub, tmp_path)
+        assert cache.get("pdf", "charts/abc.pdf") is None
+        assert cache.get("youtube", "https://example.com/abc") is None
+        assert cache.get("youtube", "https://youtu.be/missing") is None
+        assert cache.get("spotify", "https://open.spotify.com/track/missing") is None
+        assert stub.requests == ["/vi/missing/hqdefault.jpg", "/oembed"]
+        # failures are remembered, until they are `failure_ttl` old
+        assert cache.get("youtube", "https://youtu.be/missing") is None
+        assert len(stub.requests) == 2
+        assert cache.cache_stats() == {"hits": 1, "misses": 4}
+        cache.failure_ttl = 0
+        assert cache.get("youtube", "https://youtu.be/missing") is None
+        assert stub.requests[2:] == ["/vi/missing/hqdefault.jpg"]
+    assert not list((tmp_path / "derived").rglob("*.jpg"))
+
+
+def test_thumbnail_cache_rejects(tmp_path):
+    with ThumbnailStub() as stub:
+        cache = _thumbnail_cache(stub, tmp_path)
+        assert cache.get("youtube", "https://youtu.be/notimage") is None
+        small_cache = _thumbnail_cache(stub, tmp_path, max_bytes=5)
+        assert small_cache.get("youtube", "https://youtu.be/abc") is None
+    assert not list((tmp_path / "derived").rglob("*.jpg"))
+
+
+def test_read_thumbnail_source(empty_db_handler):
+    empty_db_handler.insert("LinkSource", [{"id": "youtube", "rank": 1}])
+    empty_db_handler.insert("Composer", [{"id": "c0", "composer": "Composer 0"}])
+    empty_db_handler.insert("Song", [{"id": "s0", "song": "Song 0", "composer_id": "c0"}])
+    empty_db_handler.insert(
+        "RefRec",
+        [{"id": "r0", "song_id": "s0", "source_id": "youtube", "link": "https://youtu.be/abc"}]
+    )
+    with empty_db_handler.engine.connect() as conn:
+        assert read_thumbnail_source(conn, "RefRec", "r0") == ("youtube", "https://youtu.be/abc")
+        assert read_thumbnail_source(conn, "RefRec", "r1") is None
+        # only tables with thumbnails
+        assert read_thumbnail_source(conn, "Song", "s0") is None
@@ -0,0 +1,123 @@
+import pandas as pd
+
+from jamdb.transformations import (
+    add_embeddable_links,
+    cleanup_youtube_link,
+    create_embed_link,
+    hash_rows,
+    performance_videos_from_song_perform,
+    row_delta,
+    song_performers_from_song_perform,
+)
+
+SONG_PERFORM = pd.DataFrame(
+    [
+        {
+            "id": "sp1", "instrument_id": "mando", "other_player_1": "jane:bass",
+            "other_player_2": None, "video": "https://youtu.be/a"
+        },
+        {
+            "id": "sp2", "instrument_id": None, "other_player_1": "jane:sax",
+            "other_player_2": "joe:drums", "video": None
+        },
+    ]
+)
+
+
+def test_song_performers_from_song_perform():
+    actual = song_performers_from_song_perform(SONG_PERFORM, "me").to_dict(orient="records")
+    expected = [
+        {"id": 0, "song_perform_id": "sp1", "person_instrument_id": "me:mando"},
+        {"id": 1, "song_perform_id": "sp1", "person_instrument_id": "jane:bass"},
+        {"id": 2, "song_perform_id": "sp2", "person_instrument_id": "jane:sax"},
+        {"id": 3, "song_perform_id": "sp2", "person_instrument_id": "joe:drums"},
+    ]
+    assert actual == expected
+
+
+def test_performance_videos_from_song_perform():
+    actual = performance_videos_from_song_perform(SONG_PERFORM).to_dict(orient="records")
+    expected = [
+        {"id": 0, "song_perform_id": "sp1", "source_id": "youtube", "link": "https://youtu.be/a"}
+    ]
+    assert actual == expected
+
+
+def test_cleanup_youtube_link():
+    assert cleanup_youtube_link("https://www.youtube.com/watch?v=abc&t=5&si=x") == "https://youtu.be/abc?t=5"
+    assert cleanup_youtube_link("https://m.youtube.com/watch?v=abc") == "https://youtu.be/abc"
+    assert cleanup_youtube_link("https://youtu.be/abc?si=x") == "https://youtu.be/abc"
+    assert cleanup_youtube_link("https://www.youtube.com/@someone") == "https://www.youtube.com/@someone"
+    assert cleanup_youtube_link("https://www.youtube.com/playlist/abc") == "https://www.youtube.com/playlist/abc"
+    assert cleanup_youtube_link("https://example.com/watch?v=abc") == "https://example.com/watch?v=abc"
+
+
+def test_create_embed_link():
+    cases = [
+        ("youtube", "https://youtu.be/abc?t=30", "https://youtube.com/embed/abc?start=30"),
+        ("YouTube", "https://www.youtube.com/watch?v=abc", "https://youtube.com/embed/abc"),
+        ("youtube", "https://youtube.com/embed/abc", "https://youtube.com/embed/abc"),
+        ("youtube", "https://example.com/abc", ""),
+        ("spotify", "https://open.spotify.com/track/123?si=x", "https://open.spotify.com/embed/track/123?si=x"),
+        ("spotify", "https://open.spotify.com/embed/track/123", "https://open.spotify.com/embed/track/123"),
+        ("spotify", "https://example.com/track/123", ""),
+        ("ireal", "irealb://abc", ""),
+    ]
+    for source, link, expected in cases:
+        assert create_embed_link(source, link) == expected
+
+
+def test_add_embeddable_links():
+    df = pd.DataFrame(
+        {"source_id": ["youtube", "pdf"], "link": ["https://youtu.be/abc", "charts/abc.pdf"]}
+    )
+    actual = add_embeddable_links(df)
+    assert actual["embeddable_link"].tolist() == ["https://youtube.com/embed/abc", ""]
+    assert "embeddable_link" not in df.columns
+
+
+def test_hash_rows():
+    df = pd.DataFrame({"a": ["x", "y", "x"], "b": [1, 2, 1]})
+    hashes = hash_rows(df)
+
+    assert hashes[0] == hashes[2]
+    assert hashes[0] != hashes[1]
+    assert all(len(x) == 16 for x in hashes)
+    # independent of column order
+    assert hashes.tolist() == hash_rows(df[["b", "a"]]).tolist()
+
+
+def test_row_delta():
+    existing = pd.DataFrame(
+        [
+            {"id": "1", "link": "a", "name": "A"},
+            {"id": "2", "link": "b", "name": "B"},
+            {"id": "3", "link": "c", "name": None},
+            {"id": "4", "link": "d", "name": "D"},
+            {"id": "5", "link": "e", "name": "E"},
+        ]
+    )
+    desired = pd.DataFrame(
+        [
+            {"id": "1", "link": "a", "name": "A"},
+            {"id": "2", "link": "b", "name": "B2"},
+            {"id": "3", "link": "c", "name": None},
+            {"id": "6", "link": "f", "name": "F"},
+        ]
+    )
+    delta = row_delta(existing, desired, key="link", managed_keys=["a", "d"])
+
+    assert delta["insert"].to_dict(orient="records") == [{"id": "6", "link": "f", "name": "F"}]
+    assert delta["update"].to_dict(orient="records") == [{"id": "2", "link": "b", "name": "B2"}]
+    # "e" is not managed, so it is left alone
+    assert delta["delete"] == ["d"]
+
+    delta = row_delta(pd.DataFrame(), desired, key="link")
+    assert len(delta["insert"]) == 4
+
+    # ids that change with the content are left as they are
+    desired.loc[1, "id"] = "2b"
+    delta = row_delta(existing, desired, key="link", keep_existing=["id"])
+    assert delta["update"].to_dict(orient="records") == [{"id": "2", "link": "b", "name": "B2"}]
+    desired.loc[1, "name"] = "B"
+    assert len(row_delta(existing, desired, key="link", keep_existing=["id"])["update"]) == 0